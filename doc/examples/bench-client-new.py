@@ -0,0 +1,45 @@
+#! /usr/bin/python
+#
+# Measure the number of entity objects that Client.new() creates per
+# second for some common entity types.
+#
+# This compares the creation of the Suds instance by the Suds factory,
+# as done by python-icat up to 0.11.0, with cloning a prototype, as
+# done now.
+#
+
+from __future__ import print_function
+import time
+import logging
+import icat
+import icat.config
+
+logging.basicConfig(level=logging.INFO)
+
+config = icat.config.Config(needlogin=False)
+config.add_variable('number', ("-n", "--number"), 
+                    dict(help="number of objects to create of each type"),
+                    default=10000, type=int)
+conf = config.getconfig()
+
+client = icat.Client(conf.url, **conf.client_kwargs)
+
+def factory_create(instancetype):
+    Class = client.typemap[instancetype]
+    instance = client.factory.create(instancetype)
+    for r in (Class.InstRel | Class.InstMRel):
+        delattr(instance, r)
+    return Class(client, instance)
+
+def rate(create, instancetype):
+    start = time.time()
+    for i in range(conf.number):
+        create(instancetype)
+    return conf.number / (time.time() - start)
+
+print("%-20s %12s %12s %8s" % ("type", "factory/s", "prototype/s", "speedup"))
+for t in ("datafile", "dataset", "datafileParameter", "datasetParameter", 
+          "investigation", "investigationUser", "sample", "user"):
+    old = rate(factory_create, t)
+    new = rate(client.new, t)
+    print("%-20s %12.0f %12.0f %8.1f" % (t, old, new, new / old))
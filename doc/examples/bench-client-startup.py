@@ -0,0 +1,53 @@
+#! /usr/bin/python
+#
+# Compare the time needed to construct a client with and without a
+# warm persistent cache.
+#
+# The cold start uses an empty cache directory each time, so the
+# client needs to download and parse the WSDL and to query the API
+# version from the server.  The warm start reuses the same cache
+# directory, so that this information is taken from the cache.
+#
+
+from __future__ import print_function
+import shutil
+import tempfile
+import time
+import logging
+import icat
+import icat.config
+
+logging.basicConfig(level=logging.INFO)
+#logging.getLogger('suds.client').setLevel(logging.DEBUG)
+
+config = icat.config.Config(needlogin=False)
+config.add_variable('repeat', ("-n", "--repeat"), 
+                    dict(help="number of clients to construct"),
+                    default=10, type=int)
+conf = config.getconfig()
+
+def construct(cachedir):
+    kwargs = dict(conf.client_kwargs, cacheDir=cachedir)
+    start = time.time()
+    client = icat.Client(conf.url, **kwargs)
+    return time.time() - start
+
+def report(label, times):
+    print("%-6s: %d clients, mean %.3f s, min %.3f s, max %.3f s" 
+          % (label, len(times), sum(times)/len(times), min(times), max(times)))
+
+cachedir = tempfile.mkdtemp(prefix="icat-bench-")
+try:
+    cold = []
+    for i in range(conf.repeat):
+        shutil.rmtree(cachedir)
+        cold.append(construct(cachedir))
+    warm = []
+    for i in range(conf.repeat):
+        warm.append(construct(cachedir))
+finally:
+    shutil.rmtree(cachedir, ignore_errors=True)
+
+report("cold", cold)
+report("warm", warm)
+print("speedup: %.1f" % ((sum(cold)/len(cold)) / (sum(warm)/len(warm))))
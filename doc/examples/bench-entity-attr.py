@@ -0,0 +1,46 @@
+#! /usr/bin/python
+#
+# Measure the throughput of attribute access on entity objects.
+#
+# The entity objects are created directly around Suds instances, so
+# this does not need an ICAT server.  The access to related objects
+# is not measured, because it needs a client.
+#
+
+from __future__ import print_function
+import argparse
+import timeit
+from suds.sudsobject import Factory
+import icat.entities
+
+argparser = argparse.ArgumentParser()
+argparser.add_argument("-n", "--number",
+                       help="number of accesses in each measurement",
+                       type=int, default=1000000)
+argparser.add_argument("-r", "--repeat",
+                       help="number of measurements, the best is taken",
+                       type=int, default=3)
+args = argparser.parse_args()
+
+dataset = icat.entities.Dataset(None, Factory.object('dataset', dict(id=1)))
+datafile = icat.entities.Datafile(None, Factory.object('datafile', dict(
+    id=42, name="foo.dat", fileSize=1024, createId="root",
+    dataset=dataset.instance)))
+group = icat.entities.UserGroup(None, Factory.object('userGroup', dict(
+    id=3, grouping=Factory.object('grouping', dict(id=4)))))
+
+benchmarks = [
+    ("get attribute", "datafile.name"),
+    ("get meta attribute", "datafile.createId"),
+    ("get unset attribute", "datafile.description"),
+    ("set attribute", "datafile.fileSize = 2048"),
+    ("set relation", "datafile.dataset = dataset"),
+    ("delete attribute", "del datafile.checksum"),
+    ("set alias", "group.grouping = group.instance.grouping"),
+]
+setup = "from __main__ import datafile, dataset, group"
+
+for label, stmt in benchmarks:
+    timer = timeit.Timer(stmt, setup=setup)
+    t = min(timer.repeat(number=args.number, repeat=args.repeat))
+    print("%-20s: %8.0f ops/s" % (label, args.number / t))
@@ -0,0 +1,76 @@
+#! /usr/bin/python
+#
+# Compare the memory needed to hold many datafile objects, either
+# having their attributes in Suds instances or in compact records.
+#
+# Each mode is run in a separate process and the growth of the peak
+# resident set size of that process is reported.  The objects are
+# created directly, so this does not need an ICAT server.
+#
+
+from __future__ import print_function
+import argparse
+import datetime
+import resource
+import subprocess
+import sys
+from suds.sudsobject import Factory
+import icat.entities
+from icat.client import TypeMap47
+from icat.compact import recordClass
+
+argparser = argparse.ArgumentParser()
+argparser.add_argument("-n", "--number",
+                       help="number of datafile objects",
+                       type=int, default=1000000)
+argparser.add_argument("--mode", choices=["suds", "compact"],
+                       help="run only this mode and report the result "
+                       "in bytes")
+args = argparser.parse_args()
+
+def maxrss():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def attributes(i):
+    t = datetime.datetime(2016, 6, 1, 10, 0, 0)
+    return dict(id=i, name="file_%07d.dat" % i,
+                location="data/%04d/file_%07d.dat" % (i // 1000, i),
+                fileSize=1024 + i, checksum="%08x" % i,
+                datafileCreateTime=t, createId="root", createTime=t,
+                modId="root", modTime=t)
+
+def suds_datafile(i, dataset):
+    instance = Factory.object('datafile', attributes(i))
+    instance.dataset = dataset
+    return instance
+
+def compact_datafile(i, dataset):
+    instance = recordClass(TypeMap47, 'datafile')()
+    for a, v in attributes(i).items():
+        setattr(instance, a, v)
+    instance.dataset = dataset
+    return instance
+
+if args.mode:
+    if args.mode == "suds":
+        datafile = suds_datafile
+        dataset = Factory.object('dataset', dict(id=1, name="ds"))
+    else:
+        datafile = compact_datafile
+        dataset = recordClass(TypeMap47, 'dataset')()
+        dataset.id = 1
+        dataset.name = "ds"
+    start = maxrss()
+    objs = [ icat.entities.Datafile(None, datafile(i, dataset))
+             for i in range(args.number) ]
+    print(maxrss() - start)
+else:
+    result = {}
+    for mode in ("suds", "compact"):
+        cmd = [sys.executable, sys.argv[0], "-n", str(args.number),
+               "--mode", mode]
+        result[mode] = int(subprocess.check_output(cmd))
+        print("%-8s: %8.1f MiB, %5d bytes per object"
+              % (mode, result[mode] / 2.0**20, result[mode] // args.number))
+    print("ratio: %.1f" % (float(result["suds"]) / result["compact"]))
@@ -0,0 +1,78 @@
+#! /usr/bin/python
+#
+# Measure the number of queries that can be built and rendered per
+# second.
+#
+# This compares building the queries with the attribute path cache
+# disabled, as done by python-icat up to 0.11.0, with the cache
+# enabled, as done now.  Furthermore, rendering the same query
+# repeatedly is compared with and without the cached string
+# representation, and building and rendering a query with binding
+# values to a template prepared once.
+#
+
+from __future__ import print_function
+import time
+import logging
+import icat
+import icat.config
+from icat.query import Query
+
+logging.basicConfig(level=logging.INFO)
+
+config = icat.config.Config(needlogin=False)
+config.add_variable('number', ("-n", "--number"), 
+                    dict(help="number of queries to build"),
+                    default=2000, type=int)
+conf = config.getconfig()
+
+client = icat.Client(conf.url, **conf.client_kwargs)
+
+def build(i):
+    query = Query(client, "Datafile", 
+                  order=["dataset.investigation.name", "dataset.name", "name"],
+                  conditions={
+                      "dataset.investigation.id": "= %d" % i,
+                      "dataset.name": "LIKE 'raw%'",
+                      "datafileFormat.name": "= 'NeXus'",
+                  },
+                  includes=["dataset.investigation", "datafileFormat"])
+    return str(query)
+
+def rate(fct):
+    start = time.time()
+    for i in range(conf.number):
+        fct(i)
+    return conf.number / (time.time() - start)
+
+# Warm up the entity info cache, we do not want to measure the calls
+# to the server.
+build(0)
+
+client.attrPathCache = None
+old = rate(build)
+client.attrPathCache = {}
+new = rate(build)
+print("%-20s %12s %12s %8s" % ("", "uncached/s", "cached/s", "speedup"))
+print("%-20s %12.0f %12.0f %8.1f" % ("build and render", old, new, new / old))
+
+query = Query(client, "Datafile", 
+              order=["dataset.investigation.name", "dataset.name", "name"],
+              conditions={"dataset.investigation.id": "= 42"},
+              includes=["dataset.investigation", "datafileFormat"])
+old = rate(lambda i: query._render())
+new = rate(lambda i: str(query))
+print("%-20s %12.0f %12.0f %8.1f" % ("render", old, new, new / old))
+
+template = Query(client, "Datafile", 
+                 order=["dataset.investigation.name", "dataset.name", "name"],
+                 conditions={
+                     "dataset.investigation.id": "= :inv",
+                     "dataset.name": "LIKE :ds",
+                     "datafileFormat.name": "= :format",
+                 },
+                 includes=["dataset.investigation", "datafileFormat"]
+                 ).prepare(inv="id", ds="string", format="string")
+old = rate(build)
+new = rate(lambda i: template.bind(inv=i, ds="raw%", format="NeXus"))
+print("%-20s %12.0f %12.0f %8.1f" % ("prepared template", old, new, new / old))
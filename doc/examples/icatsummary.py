@@ -7,6 +7,7 @@
 from __future__ import print_function
 import icat
 import icat.config
+from icat.query import Query
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -28,7 +29,11 @@ for entityname in client.getEntityNames():
     if entityname == "Log":
         continue
     try:
-        res = client.search("SELECT COUNT(e) FROM %s e" % entityname)[0]
+        if client.apiversion < '4.3':
+            query = "SELECT COUNT(e) FROM %s e" % entityname
+        else:
+            query = Query(client, entityname, aggregate="COUNT")
+        res = client.search(query)[0]
     except icat.exception.ICATPrivilegesError:
         # ICAT 4.2.* raises a PrivilegesError if there are entities
         # matching the search but the user has no read permission to
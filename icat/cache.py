@@ -0,0 +1,277 @@
+"""Persistent caching of information retrieved from the ICAT server.
+
+**Note**: This module is mostly intended for the internal use in
+python-icat.  Most users will not need to use it directly or even care
+about it.  It is activated by passing the `cacheDir` keyword argument
+to the constructor of :class:`icat.client.Client`.
+"""
+
+import os
+import os.path
+import time
+import json
+import hashlib
+import logging
+import pickle
+import suds.cache
+import suds.plugin
+import suds.sudsobject
+
+__all__ = ['ClientCache']
+
+
+log = logging.getLogger(__name__)
+
+CacheVersion = 1
+"""Version of the layout of the cache directory.  It must be
+incremented on any incompatible change of the content stored in the
+cache.
+"""
+
+
+def _sudsToJson(obj):
+    """Convert Suds objects into a structure that may be serialized
+    as JSON.  The Suds class names are kept in a ``__class__`` key.
+    """
+    if isinstance(obj, suds.sudsobject.Object):
+        d = { '__class__': obj.__class__.__name__ }
+        for k, v in obj:
+            d[k] = _sudsToJson(v)
+        return d
+    elif isinstance(obj, list):
+        return [ _sudsToJson(v) for v in obj ]
+    else:
+        return obj
+
+def _jsonToSuds(obj):
+    """Reverse :func:`_sudsToJson`.
+    """
+    if isinstance(obj, dict):
+        d = dict((str(k), _jsonToSuds(v)) for k, v in obj.items() 
+                 if k != '__class__')
+        return suds.sudsobject.Factory.object(str(obj['__class__']), d)
+    elif isinstance(obj, list):
+        return [ _jsonToSuds(v) for v in obj ]
+    else:
+        return obj
+
+
+class WSDLDigest(suds.plugin.DocumentPlugin):
+    """A Suds plugin that calculates a digest over all WSDL and XSD
+    documents that Suds loads from the ICAT server.
+    """
+
+    def __init__(self):
+        self.sha = hashlib.sha256()
+
+    def loaded(self, context):
+        self.sha.update(context.url.encode('utf-8'))
+        self.sha.update(context.document)
+
+    def hexdigest(self):
+        return self.sha.hexdigest()
+
+
+class WSDLCache(suds.cache.Cache):
+    """A Suds object cache for the parsed WSDL definitions.
+
+    This is intended to be used in Suds with `cachingpolicy` set to
+    1.  Suds will then pass the complete parsed WSDL schema to
+    :meth:`put` after having downloaded it from the server and will
+    try to get it back from :meth:`get` on subsequent starts.  The
+    pickled schema is stored in a file named after the digest of the
+    WSDL documents.
+    """
+
+    def __init__(self, clientcache):
+        self.clientcache = clientcache
+        self.digest = WSDLDigest()
+
+    def _fname(self, digest):
+        return os.path.join(self.clientcache.dir, "wsdl-%s.px" % digest)
+
+    def get(self, id):
+        digest = self.clientcache.get('wsdlDigest')
+        if not digest:
+            return None
+        fname = self._fname(digest)
+        try:
+            with open(fname, 'rb') as f:
+                obj = pickle.load(f)
+            log.debug("Read WSDL definitions from %s", fname)
+            return obj
+        except Exception:
+            self.purge(id)
+            return None
+
+    def put(self, id, object):
+        digest = self.digest.hexdigest()
+        fname = self._fname(digest)
+        try:
+            self.clientcache.mkdir()
+            with open(fname, 'wb') as f:
+                pickle.dump(object, f, 2)
+        except Exception as e:
+            log.warning("Cannot write %s: %s", fname, e)
+            return object
+        # Any other information we kept about this service may be
+        # stale if the WSDL changed.
+        self.clientcache.reset(wsdlDigest=digest)
+        return object
+
+    def purge(self, id):
+        digest = self.clientcache.get('wsdlDigest')
+        if digest:
+            try:
+                os.remove(self._fname(digest))
+            except OSError:
+                pass
+        self.clientcache.reset()
+
+    def clear(self):
+        self.purge(None)
+
+
+class ClientCache(object):
+    """A persistent on-disk cache for an ICAT client.
+
+    The cache keeps the parsed WSDL schema and the API version of an
+    ICAT service, such that creating a client for this service
+    subsequently does neither need to download and parse the WSDL nor
+    to query the version from the server.  It may also keep the entity
+    info for all entity types, see
+    :meth:`icat.client.Client.prefetchEntityInfo`.  Each service gets its own
+    subdirectory in the cache directory, named after a digest of the
+    service URL.  The metadata about the service are kept in a file
+    ``meta.json`` in this subdirectory.  All cached information
+    expires after a configurable duration.
+
+    :param cachedir: the cache directory.
+    :type cachedir: :class:`str`
+    :param url: the URL of the ICAT service.
+    :type url: :class:`str`
+    :param days: the duration in days after that the cached
+        information expires.
+    :type days: :class:`float`
+    """
+
+    def __init__(self, cachedir, url, days=1):
+        super(ClientCache, self).__init__()
+        self.url = url
+        urlkey = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        self.dir = os.path.join(os.path.expanduser(cachedir),
+                                "v%d" % CacheVersion, urlkey)
+        self.duration = days * 86400
+        self.wsdlcache = WSDLCache(self)
+        self.meta = self._readmeta()
+
+    def _metafile(self):
+        return os.path.join(self.dir, "meta.json")
+
+    def _readmeta(self):
+        try:
+            with open(self._metafile(), 'rt') as f:
+                meta = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        if meta.get('url') != self.url:
+            return {}
+        if time.time() - meta.get('timestamp', 0) > self.duration:
+            log.debug("Cached information on %s expired.", self.url)
+            return {}
+        return meta
+
+    def _writemeta(self):
+        try:
+            self.mkdir()
+            with open(self._metafile(), 'wt') as f:
+                json.dump(self.meta, f)
+        except (IOError, OSError) as e:
+            log.warning("Cannot write %s: %s", self._metafile(), e)
+
+    def mkdir(self):
+        """Create the cache directory if it does not exist yet.
+        """
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir)
+
+    def get(self, key, default=None):
+        """Get a value from the cached metadata.
+        """
+        return self.meta.get(key, default)
+
+    def set(self, key, value):
+        """Set a value in the cached metadata and write it to disk.
+        """
+        self.meta[key] = value
+        self._writemeta()
+
+    def reset(self, **kwargs):
+        """Discard all cached metadata and set a new start timestamp.
+        The keyword arguments are set as initial metadata.
+        """
+        self.meta = dict(url=self.url, timestamp=time.time())
+        self.meta.update(kwargs)
+        self._writemeta()
+
+    def _entityinfofile(self):
+        return os.path.join(self.dir, "entityinfo.json")
+
+    def getEntityInfo(self, apiversion):
+        """Get the cached entity info.
+
+        :param apiversion: the API version of the ICAT server.
+        :type apiversion: :class:`str`
+        :return: a mapping of entity names to the entity info objects
+            as returned by :meth:`icat.client.Client.getEntityInfo` or
+            :const:`None` if no entity info for this version is cached.
+        :rtype: :class:`dict`
+        """
+        if self.get('entityInfoVersion') != apiversion:
+            return None
+        try:
+            with open(self._entityinfofile(), 'rt') as f:
+                data = json.load(f)
+            if data['apiversion'] != apiversion:
+                return None
+            info = dict((str(k), _jsonToSuds(v)) 
+                        for k, v in data['entityInfo'].items())
+        except (IOError, OSError, ValueError, KeyError) as e:
+            log.debug("Cannot read %s: %s", self._entityinfofile(), e)
+            return None
+        log.debug("Read entity info from %s", self._entityinfofile())
+        return info
+
+    def setEntityInfo(self, apiversion, info):
+        """Store the entity info in the cache.
+
+        :param apiversion: the API version of the ICAT server.
+        :type apiversion: :class:`str`
+        :param info: a mapping of entity names to the entity info
+            objects.
+        :type info: :class:`dict`
+        """
+        data = { 'apiversion': apiversion, 
+                 'entityInfo': dict((k, _sudsToJson(v)) 
+                                    for k, v in info.items()) }
+        try:
+            self.mkdir()
+            with open(self._entityinfofile(), 'wt') as f:
+                json.dump(data, f)
+        except (IOError, OSError) as e:
+            log.warning("Cannot write %s: %s", self._entityinfofile(), e)
+            return
+        self.set('entityInfoVersion', apiversion)
+
+    def sudsOptions(self, plugins=()):
+        """Return the keyword arguments to pass to
+        :class:`suds.client.Client` to use this cache.
+
+        :param plugins: Suds plugins that the client has been
+            configured with.  The plugin needed by the cache will be
+            appended to this list.
+        :type plugins: :class:`list`
+        """
+        plugins = list(plugins) + [self.wsdlcache.digest]
+        return { 'cache': self.wsdlcache, 'cachingpolicy': 1, 
+                 'plugins': plugins }
@@ -0,0 +1,297 @@
+"""Control the chunk size in chunked searches.
+
+This module provides the classes that may be passed as `chunksize`
+argument to :meth:`icat.client.Client.searchChunked`.  An
+:class:`icat.chunking.AdaptiveChunkSize` adjusts the number of items
+retrieved in each search call to the observed response times and
+payload sizes.  Both classes keep statistics on the search calls done
+for each query.
+"""
+
+import re
+import threading
+import logging
+import suds.plugin
+from icat.exception import ICATValidationError
+
+__all__ = ['queryShape', 'ChunkStats', 'ChunkSize', 'AdaptiveChunkSize']
+
+
+log = logging.getLogger(__name__)
+
+_literal = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+def queryShape(query):
+    """Return the query with all string and numeric literals replaced
+    by a placeholder.
+
+    >>> queryShape("SELECT o FROM Dataset o WHERE o.investigation.id = 42 "
+    ...            "AND o.name LIKE 'e2%'")
+    'SELECT o FROM Dataset o WHERE o.investigation.id = ? AND o.name LIKE ?'
+    """
+    return _literal.sub('?', query)
+
+
+class ReplySize(suds.plugin.MessagePlugin):
+    """A Suds plugin that records the size of the last SOAP reply
+    received.
+
+    The size is recorded per thread, so that the same plugin instance
+    may be shared by clients used concurrently in different threads.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def received(self, context):
+        self.local.size = len(context.reply)
+
+    def set(self, size):
+        """Record the size in bytes of a reply in the current thread.
+
+        This is used for replies not passing through the Suds
+        plugins, such as those read by :func:`icat.stream.iterCall`.
+        Set it to :const:`None` to forget the size of the last reply.
+        """
+        self.local.size = size
+
+    def get(self):
+        """Return the size in bytes of the last SOAP reply received in
+        the current thread or :const:`None` if not known.
+        """
+        return getattr(self.local, 'size', None)
+
+
+class ChunkStats(object):
+    """Statistics on the search calls done for one query.
+
+    .. attribute:: calls
+
+        number of search calls that returned a result.
+
+    .. attribute:: items
+
+        total number of items retrieved.
+
+    .. attribute:: seconds
+
+        total time spent in the search calls.
+
+    .. attribute:: bytes
+
+        total size of the SOAP replies, if known.
+
+    .. attribute:: rejected
+
+        number of search calls that have been rejected by the server
+        because the result would have been too large.
+
+    .. attribute:: chunksize
+
+        the chunk size to be used in the next search call.
+
+    .. attribute:: accepted
+
+        the largest chunk size known to be accepted by the server.
+
+    .. attribute:: limit
+
+        the largest chunk size not known to be rejected by the server
+        or :const:`None`.
+    """
+
+    def __init__(self, chunksize):
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.rejected = 0
+        self.chunksize = chunksize
+        self.accepted = 0
+        self.limit = None
+
+    def __repr__(self):
+        return ("<ChunkStats calls=%d items=%d seconds=%.3f bytes=%d "
+                "rejected=%d chunksize=%d>"
+                % (self.calls, self.items, self.seconds, self.bytes,
+                   self.rejected, self.chunksize))
+
+
+class ChunkSize(object):
+    """A fixed chunk size.
+
+    :param size: number of items to query in each search call.
+    :type size: :class:`int`
+    """
+
+    def __init__(self, size=100):
+        super(ChunkSize, self).__init__()
+        self.size = size
+        self.stats = {}
+        """A dict mapping the queries to their
+        :class:`icat.chunking.ChunkStats`.  Queries that only differ
+        in the values of literals share their statistics, the keys
+        are as returned by :func:`icat.chunking.queryShape`."""
+
+    def setup(self, client):
+        """Prepare for a search with `client`.  Called by
+        :meth:`icat.client.Client.searchChunked` before starting the
+        search.
+        """
+        pass
+
+    def getStats(self, query):
+        """Get the statistics for a query.
+        """
+        key = queryShape(query)
+        try:
+            return self.stats[key]
+        except KeyError:
+            stats = ChunkStats(self.size)
+            self.stats[key] = stats
+            return stats
+
+    def record(self, stats, requested, items, seconds, nbytes):
+        """Record the outcome of a search call.
+
+        :param stats: the statistics of the query.
+        :type stats: :class:`icat.chunking.ChunkStats`
+        :param requested: the number of items requested.
+        :type requested: :class:`int`
+        :param items: the number of items retrieved.
+        :type items: :class:`int`
+        :param seconds: the time spent in the call.
+        :type seconds: :class:`float`
+        :param nbytes: the size of the SOAP reply or :const:`None` if
+            not known.
+        :type nbytes: :class:`int`
+        """
+        stats.calls += 1
+        stats.items += items
+        stats.seconds += seconds
+        if nbytes:
+            stats.bytes += nbytes
+
+    def reject(self, stats, requested, error):
+        """Handle an error raised by a search call.
+
+        Return :const:`True` if the search call should be retried
+        with :attr:`icat.chunking.ChunkStats.chunksize`, or
+        :const:`False` if the error should be raised.
+        """
+        return False
+
+
+class AdaptiveChunkSize(ChunkSize):
+    """A chunk size that adapts to the observed search calls.
+
+    Starting from `initial`, the chunk size grows by a factor of at
+    most `growth` after each search call as long as the response time
+    and the size of the reply stay below `targettime` and
+    `targetbytes` respectively.  If the search calls get slower or
+    the replies larger than these targets, the chunk size shrinks
+    accordingly.  If the ICAT server rejects a search call because it
+    would return more than the maximum number of entities, the chunk
+    size is halved and the call is retried transparently.  Subsequent
+    calls for this query approach the rejected size by bisection
+    rather than by growth.
+
+    If `maxsize` is :const:`None`, it will be set from the
+    ``maxEntities`` property of the ICAT server, as reported by
+    :meth:`icat.client.Client.getProperties`.
+
+    The chunk size is controlled separately for each query, as the
+    cost per item differs between queries, depending e.g. on the
+    INCLUDE clause.  An instance may be reused for several searches,
+    subsequent searches with the same query, up to the values of
+    literals, will then start with the chunk size adapted in the
+    previous ones.
+
+    :param initial: the chunk size for the first search call.
+    :type initial: :class:`int`
+    :param minsize: the minimal chunk size.
+    :type minsize: :class:`int`
+    :param maxsize: the maximal chunk size.
+    :type maxsize: :class:`int`
+    :param targettime: the target response time in seconds.
+    :type targettime: :class:`float`
+    :param targetbytes: the target size of the SOAP replies in bytes.
+    :type targetbytes: :class:`int`
+    :param growth: the maximal factor to grow the chunk size in one
+        step.
+    :type growth: :class:`float`
+    """
+
+    def __init__(self, initial=100, minsize=1, maxsize=None,
+                 targettime=1.0, targetbytes=4*1024*1024, growth=2.0):
+        super(AdaptiveChunkSize, self).__init__(initial)
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.targettime = targettime
+        self.targetbytes = targetbytes
+        self.growth = growth
+        self._seeded = maxsize is not None
+
+    def setup(self, client):
+        """Seed the maximal chunk size from the ICAT server if needed.
+        """
+        if self._seeded:
+            return
+        self._seeded = True
+        try:
+            props = client.getProperties()
+        except Exception as e:
+            log.debug("Cannot get the properties from the ICAT server: %s", e)
+            return
+        for p in props:
+            try:
+                k, v = p.split(None, 1)
+                if k == 'maxEntities':
+                    self.maxsize = int(v)
+                    log.debug("Maximal chunk size set to %d.", self.maxsize)
+            except ValueError:
+                pass
+
+    def _clip(self, stats, size):
+        if stats.limit is not None and size > stats.accepted:
+            # Approach a size that has been rejected before by
+            # bisection.
+            size = min(size, (stats.accepted + stats.limit + 1) // 2)
+        if self.maxsize is not None:
+            size = min(size, self.maxsize)
+        return max(int(size), self.minsize)
+
+    def getStats(self, query):
+        stats = super(AdaptiveChunkSize, self).getStats(query)
+        stats.chunksize = self._clip(stats, stats.chunksize)
+        return stats
+
+    def record(self, stats, requested, items, seconds, nbytes):
+        super(AdaptiveChunkSize, self).record(stats, requested, items,
+                                              seconds, nbytes)
+        if not items:
+            return
+        if items == requested:
+            stats.accepted = max(stats.accepted, requested)
+        size = requested * self.growth
+        if seconds > 0:
+            size = min(size, self.targettime * items / seconds)
+        if nbytes:
+            size = min(size, self.targetbytes * items / float(nbytes))
+        stats.chunksize = self._clip(stats, size)
+
+    def reject(self, stats, requested, error):
+        if not isinstance(error, ICATValidationError):
+            return False
+        if "attempt to return more than" not in str(error):
+            return False
+        if requested <= self.minsize:
+            return False
+        stats.rejected += 1
+        stats.limit = requested - 1
+        stats.accepted = min(stats.accepted, stats.limit)
+        stats.chunksize = self._clip(stats, max(requested // 2, 
+                                                stats.accepted))
+        log.debug("Search call with chunk size %d rejected, "
+                  "retrying with %d.", requested, stats.chunksize)
+        return True
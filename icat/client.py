@@ -4,23 +4,40 @@ This is the only module that needs to be imported to use the icat.
 """
 
 import os
+import datetime
 from warnings import warn
 import re
+import copy
+import time
+import threading
 import logging
 from distutils.version import StrictVersion as Version
 import atexit
 
 import suds
 import suds.client
+import suds.options
 import suds.sudsobject
+from suds.properties import Unskin
 
 from icat.entity import Entity
 import icat.entities
-from icat.query import Query
+from icat.query import Query, _fmtdate
+from icat.cache import ClientCache
+from icat.identitymap import IdentityMap
+from icat.unitofwork import UnitOfWork
+from icat.lazyload import ResultGroup
+from icat.compact import CompactRecord, recordClass, compactInstance
+from icat.parallel import BackgroundIterator, WorkerPool
+from icat.chunking import ReplySize, ChunkSize
+from icat.stream import fieldSetItems, RowDecoder, iterCall
 from icat.exception import *
 from icat.ids import *
 from icat.sslcontext import create_ssl_context, HTTPSTransport
-from icat.helper import simpleqp_unquote, parse_attr_val, ms_timestamp
+from icat.helper import simpleqp_quote, simpleqp_unquote, parse_attr_val
+from icat.helper import parse_attr_string
+from icat.helper import ms_timestamp
+from icat.helper import parse_jpql_clauses
 
 __all__ = ['Client']
 
@@ -131,6 +148,181 @@ TypeMap47.update( dataCollection = icat.entities.DataCollection47,
                   user = icat.entities.User47 )
 
 
+class _PrototypeFactory(object):
+    """Create Suds instances of entity types by cloning prototypes.
+
+    Creating an instance with the Suds factory is expensive, because
+    it builds a whole tree of dummy objects for all relationships,
+    following the schema, that are then discarded.  This factory
+    creates one prototype for each instance type with the dummy
+    objects removed and returns shallow clones of the prototype.
+    Instance types not in the typemap are passed to the Suds factory
+    unchanged.
+    """
+
+    def __init__(self, factory, typemap):
+        self.factory = factory
+        self.typemap = typemap
+        self.prototypes = {}
+
+    def _getPrototype(self, instancetype, Class):
+        key = (instancetype, Class)
+        try:
+            return self.prototypes[key]
+        except KeyError:
+            proto = self.factory.create(instancetype)
+            # The factory creates a whole tree of dummy objects for
+            # all relationships of the instance object and the
+            # relationships of the related objects and so on.  These
+            # dummy objects are of no use, discard them.
+            for r in (Class.InstRel | Class.InstMRel):
+                if hasattr(proto, r):
+                    delattr(proto, r)
+            return self.prototypes.setdefault(key, proto)
+
+    def create(self, instancetype):
+        Class = self.typemap.get(instancetype)
+        if Class is None:
+            return self.factory.create(instancetype)
+        proto = self._getPrototype(instancetype, Class)
+        instance = proto.__class__()
+        md = instance.__metadata__
+        for name, value in proto.__metadata__:
+            setattr(md, name, value)
+        for name, value in proto:
+            if isinstance(value, (list, suds.sudsobject.Object)):
+                value = copy.deepcopy(value)
+            setattr(instance, name, value)
+        return instance
+
+
+class UpdateStats(object):
+    """Statistics on the calls of :meth:`icat.client.Client.update`.
+
+    The sizes are estimated from the instances passed to the server,
+    see :meth:`icat.client.Client.update` for details.
+    """
+
+    def __init__(self):
+        self.updates = 0
+        """Number of update calls sent to the server."""
+        self.skipped = 0
+        """Number of updates skipped, because nothing was modified."""
+        self.bytesSent = 0
+        """Estimated size of the objects sent in the update calls."""
+        self.bytesSaved = 0
+        """Estimated size of the related objects and one to many
+        relations not sent in the update calls."""
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return ("<UpdateStats updates=%d skipped=%d bytesSent=%d "
+                "bytesSaved=%d>" % (self.updates, self.skipped, 
+                                     self.bytesSent, self.bytesSaved))
+
+    def add(self, sent=None, saved=0):
+        with self.lock:
+            if sent is None:
+                self.skipped += 1
+            else:
+                self.updates += 1
+                self.bytesSent += sent
+                self.bytesSaved += saved
+
+
+def _isnaivedate(value):
+    """Check whether a value can be formatted as a timestamp literal.
+
+    Dates read from a dump file are strings and datetimes from the
+    server are time zone aware.  Neither one can be bound to a
+    ``"date"`` placeholder in a :class:`icat.query.QueryTemplate`.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.tzinfo is None
+    return isinstance(value, datetime.date)
+
+def _dateKey(value):
+    """Normalize the value of a Date attribute for comparison.
+
+    Strings are parsed.  Return a tuple of a flag whether the value is
+    time zone aware, or :const:`None` if the value could not be
+    parsed, and the value.  Time zone aware values can only be
+    compared to each other, naive values only to the local time of
+    the server.
+    """
+    if isinstance(value, basestring):
+        try:
+            value = parse_attr_string(value, "Date")
+        except ValueError:
+            return (None, value)
+    if isinstance(value, datetime.datetime):
+        return (value.tzinfo is not None, value)
+    elif isinstance(value, datetime.date):
+        return (False, datetime.datetime.combine(value, datetime.time()))
+    else:
+        return (None, value)
+
+def _serverDateKeys(value):
+    """Get the keys a Date value returned from the server may match.
+    """
+    if value is None:
+        return []
+    keys = [_dateKey(value)]
+    if getattr(value, 'tzinfo', None) is not None:
+        keys.append((False, value.replace(tzinfo=None)))
+    return keys
+
+def _instanceSize(instance, seen=None):
+    """Estimate the size in bytes of the XML representation of a Suds
+    instance in a SOAP request.  Each related instance is only counted
+    once.
+    """
+    if seen is None:
+        seen = set()
+    seen.add(id(instance))
+    size = 0
+    for name, value in instance:
+        if value is None:
+            continue
+        if isinstance(value, list):
+            values = value
+        else:
+            values = [value]
+        for v in values:
+            # Start and end tag.
+            size += 2*len(name) + 5
+            if isinstance(v, (suds.sudsobject.Object, CompactRecord)):
+                if id(v) not in seen:
+                    size += _instanceSize(v, seen)
+            else:
+                size += len(unicode(v))
+    return size
+
+def _splitBatches(instances, batchsize, maxbytes):
+    """Split a list of instances into batches.
+
+    Iterate over tuples (start, end) of indices into the list, such
+    that each batch has at most batchsize instances and at most
+    maxbytes estimated size, but at least one instance.
+    """
+    start = 0
+    size = 0
+    for i, instance in enumerate(instances):
+        if maxbytes:
+            isize = _instanceSize(instance)
+            if i > start and size + isize > maxbytes:
+                yield (start, i)
+                start = i
+                size = 0
+            size += isize
+        if batchsize and i + 1 - start >= batchsize:
+            yield (start, i + 1)
+            start = i + 1
+            size = 0
+    if start < len(instances):
+        yield (start, len(instances))
+
+
 class Client(suds.client.Client):
  
     """A client accessing an ICAT service.
@@ -162,6 +354,40 @@ class Client(suds.client.Client):
         Extend the inherited constructor.  Query the API version from
         the ICAT server and initialize the typemap accordingly.
 
+        If the keyword argument `cacheDir` is set, a persistent
+        cache for the parsed WSDL and the API version of the ICAT
+        server is kept in this directory.  Subsequent clients
+        connecting to the same URL will then neither download the
+        WSDL nor query the API version from the server until the
+        cached information expires after one day.  The entity info
+        retrieved by :meth:`icat.client.Client.prefetchEntityInfo`
+        is also kept in this cache.
+
+        If the keyword argument `searchCache` is set to a
+        :class:`icat.searchcache.SearchCache`, the results of
+        :meth:`icat.client.Client.search` are cached on the client
+        side.
+
+        If the keyword argument `identityMap` is set to :const:`True`,
+        the client keeps an :class:`icat.identitymap.IdentityMap`, so
+        that each object retrieved from the server is represented by
+        one single entity object as long as it is in use.
+
+        If the keyword argument `compactEntities` is set to
+        :const:`True`, the entity objects created by the client keep
+        their attributes in a :class:`icat.compact.CompactRecord`
+        rather then in a Suds instance.  This needs considerably less
+        memory.
+
+        If the keyword argument `includeAdvisor` is set to an
+        :class:`icat.includeadvisor.IncludeAdvisor`, the access to
+        related objects in search results is recorded in it.
+
+        If the keyword argument `lazyLoad` is set to :const:`True`,
+        related objects that have not been included in a search are
+        loaded on first access for all objects in the search result
+        at once, see :class:`icat.lazyload.ResultGroup`.
+
         :param url: The URL for the WSDL.
         :type url: str
         :param kwargs: keyword arguments.
@@ -169,6 +395,21 @@ class Client(suds.client.Client):
         """
 
         idsurl = kwargs.pop('idsurl', None)
+        self.searchCache = kwargs.pop('searchCache', None)
+        identitymap = kwargs.pop('identityMap', False)
+        self.compactEntities = kwargs.pop('compactEntities', False)
+        self.lazyLoad = kwargs.pop('lazyLoad', False)
+        self.includeAdvisor = kwargs.pop('includeAdvisor', None)
+
+        self.replySize = ReplySize()
+        kwargs['plugins'] = list(kwargs.get('plugins', [])) + [self.replySize]
+
+        cachedir = kwargs.pop('cacheDir', None)
+        if cachedir:
+            self.cache = ClientCache(cachedir, url)
+            kwargs.update(self.cache.sudsOptions(kwargs['plugins']))
+        else:
+            self.cache = None
 
         sslverify = kwargs.pop('checkCert', True)
         cafile = kwargs.pop('caFile', None)
@@ -182,7 +423,13 @@ class Client(suds.client.Client):
         proxy = kwargs.pop('proxy', {})
         kwargs['transport'] = HTTPSTransport(self.sslContext, proxy=proxy)
         super(Client, self).__init__(url, **kwargs)
-        apiversion = self.getApiVersion()
+        apiversion = None
+        if self.cache:
+            apiversion = self.cache.get('apiversion')
+        if not apiversion:
+            apiversion = self.getApiVersion()
+            if self.cache:
+                self.cache.set('apiversion', apiversion)
         # Translate a version having a trailing '-SNAPSHOT' into
         # something that StrictVersion would accept.
         apiversion = re.sub(r'-SNAPSHOT$', 'a1', apiversion)
@@ -210,10 +457,24 @@ class Client(suds.client.Client):
             warn(ClientVersionWarning(self.apiversion, "too new"))
             self.typemap = TypeMap47.copy()
 
+        self.prototypeFactory = _PrototypeFactory(self.factory, self.typemap)
+        self.updateStats = UpdateStats()
+        if identitymap:
+            self.identityMap = IdentityMap(self.typemap)
+        else:
+            self.identityMap = None
+        self.activeUnitOfWork = None
         self.ids = None
         self.sessionId = None
         self.autoLogout = True
         self.entityInfoCache = {}
+        self.attrPathCache = {}
+        self.queryTemplateCache = {}
+        self.rowDecoders = {}
+        if self.cache:
+            info = self.cache.getEntityInfo(str(self.apiversion))
+            if info:
+                self.entityInfoCache.update(info)
 
         if idsurl:
             self.add_ids(idsurl)
@@ -235,6 +496,64 @@ class Client(suds.client.Client):
                 self.logout()
             del self.Register[id(self)]
 
+    def clone(self):
+        """Create a clone of this client.
+
+        The clone connects to the same ICAT and IDS server.  It shares
+        the parsed WSDL schema, the typemap, the entity info cache,
+        the attribute path cache, and the query template cache with
+        this client, so creating it does not need any interaction
+        with the server.  It also
+        shares the search cache, the identity map, and the include
+        advisor, if any.  But it uses its own transport, so that it
+        may be used concurrently with this client in another thread.
+        The clone is bound to the same ICAT session as this client.
+        It never logs out automatically.
+
+        :return: the clone.
+        :rtype: :class:`icat.client.Client`
+        """
+        Class = type(self)
+        clone = Class.__new__(Class)
+        clone.ids = None
+        # The following is mostly the same as in
+        # suds.client.Client.clone(), except that the transport can
+        # not be deep copied, because of the SSL context.
+        options = dict(Unskin(self.options).defined)
+        tpoptions = dict(Unskin(self.options.transport.options).defined)
+        options['transport'] = HTTPSTransport(self.sslContext, **tpoptions)
+        clone.options = suds.options.Options()
+        Unskin(clone.options).update(options)
+        clone.wsdl = self.wsdl
+        clone.factory = self.factory
+        clone.service = suds.client.ServiceSelector(clone, self.wsdl.services)
+        clone.sd = self.sd
+        clone.messages = dict(tx=None, rx=None)
+
+        clone.sslContext = self.sslContext
+        clone.url = self.url
+        clone.cache = self.cache
+        clone.replySize = self.replySize
+        clone.apiversion = self.apiversion
+        clone.typemap = self.typemap
+        clone.prototypeFactory = self.prototypeFactory
+        clone.updateStats = self.updateStats
+        clone.autoLogout = False
+        clone.entityInfoCache = self.entityInfoCache
+        clone.attrPathCache = self.attrPathCache
+        clone.queryTemplateCache = self.queryTemplateCache
+        clone.rowDecoders = self.rowDecoders
+        clone.searchCache = self.searchCache
+        clone.identityMap = self.identityMap
+        clone.compactEntities = self.compactEntities
+        clone.lazyLoad = self.lazyLoad
+        clone.includeAdvisor = self.includeAdvisor
+        clone.activeUnitOfWork = None
+        if self.ids:
+            clone.add_ids(self.ids.url)
+        clone.sessionId = self.sessionId
+        return clone
+
     def add_ids(self, url, proxy=None):
         """Add the URL to an ICAT Data Service."""
         if proxy is None:
@@ -263,10 +582,21 @@ class Client(suds.client.Client):
         name.  If obj is an instance object, look up its class name in
         the typemap to determine the class.  If obj is :const:`None`,
         do nothing and return :const:`None`.
+
+        If :attr:`self.compactEntities` is :const:`True`, the entity
+        object keeps its attributes in a
+        :class:`icat.compact.CompactRecord`.  A Suds instance object
+        passed in obj is converted.
+
+        If the client has an identity map, an instance object is
+        looked up in the map.  If an entity object for it is already
+        in use, this is returned rather then a new one, unless kwargs
+        are given.
         
-        :param obj: either a Suds instance object, a name of an
-            instance type, or :const:`None`.
-        :type obj: :class:`suds.sudsobject.Object` or :class:`str`
+        :param obj: either a Suds instance object, a record, a name
+            of an instance type, or :const:`None`.
+        :type obj: :class:`suds.sudsobject.Object` or
+            :class:`icat.compact.CompactRecord` or :class:`str`
         :param kwargs: attributes passed to the constructor of
             :class:`icat.entity.Entity`.
         :return: the new entity object or :const:`None`.
@@ -275,7 +605,7 @@ class Client(suds.client.Client):
             nor a valid name of an entity type, nor None.
         """
 
-        if isinstance(obj, suds.sudsobject.Object):
+        if isinstance(obj, (suds.sudsobject.Object, CompactRecord)):
             # obj is already an instance, use it right away
             instance = obj
             instancetype = instance.__class__.__name__
@@ -292,13 +622,7 @@ class Client(suds.client.Client):
             except KeyError:
                 raise stripCause(TypeError("Invalid instance type '%s'." 
                                            % instancetype))
-            instance = self.factory.create(instancetype)
-            # The factory creates a whole tree of dummy objects for
-            # all relationships of the instance object and the
-            # relationships of the related objects and so on.  These
-            # dummy objects are of no use, discard them.
-            for r in (Class.InstRel | Class.InstMRel):
-                delattr(instance, r)
+            instance = None
         elif obj is None:
             return None
         else:
@@ -311,8 +635,74 @@ class Client(suds.client.Client):
             raise TypeError("Refuse to create an instance of "
                             "abstract type '%s'." % instancetype)
 
+        if instance is None:
+            if self.compactEntities:
+                instance = recordClass(self.typemap, instancetype)()
+            else:
+                instance = self.prototypeFactory.create(instancetype)
+        elif (self.compactEntities and 
+              isinstance(instance, suds.sudsobject.Object)):
+            instance = compactInstance(self.typemap, instance)
+
+        if self.identityMap is not None and not isinstance(obj, basestring):
+            instance = self.identityMap.getInstance(instance)
+            if not kwargs:
+                entity = self.identityMap.getEntity(instance)
+                if entity is not None:
+                    return entity
+            entity = Class(self, instance, **kwargs)
+            self.identityMap.addEntity(entity)
+            return entity
         return Class(self, instance, **kwargs)
 
+    def _getInstance(self, obj):
+        """Get the Suds instance to pass in an ICAT API call for an
+        entity object, converting a record if needed.
+        """
+        instance = Entity.getInstance(obj)
+        if isinstance(instance, CompactRecord):
+            instance = instance.toSuds(self.prototypeFactory)
+        return instance
+
+    def _getInstances(self, objs):
+        return [ self._getInstance(o) for o in objs ]
+
+    def _getResultEntity(self, obj):
+        """Get the entity object for an item in the result of a
+        search or get call.  Take a snapshot of its state, unless it
+        already has one.
+        """
+        obj = self.getEntity(obj)
+        if isinstance(obj, Entity) and not obj._hasSnapshot(obj.instance):
+            obj._takeSnapshot(obj.instance)
+        return obj
+
+    def _getUpdateInstance(self, bean):
+        """Get the Suds instance to pass to the update call for an
+        object.
+
+        Return :const:`None` if the object has not been modified.
+        """
+        if not isinstance(bean, Entity):
+            return Entity.getInstance(bean)
+        if bean.getModifiedAttrs() == frozenset():
+            return None
+        instance = self.prototypeFactory.create(bean.instancetype)
+        for a, v in bean.instance:
+            if a in bean.InstAttr:
+                setattr(instance, a, v)
+            elif a in bean.InstRel:
+                if v is not None and getattr(v, 'id', None) is not None:
+                    # The server only needs the id of a related object.
+                    rinstance = self.prototypeFactory.create(
+                        v.__class__.__name__)
+                    rinstance.id = v.id
+                    v = rinstance
+                elif isinstance(v, CompactRecord):
+                    v = v.toSuds(self.prototypeFactory)
+                setattr(instance, a, v)
+        return instance
+
     def getEntityClass(self, name):
         """Return the Entity class corresponding to a BeanName.
         """
@@ -325,16 +715,23 @@ class Client(suds.client.Client):
     def getEntity(self, obj):
         """Get the corresponding :class:`icat.entity.Entity` for an object.
 
-        If obj is a Suds instance object, create a new object with
-        :meth:`icat.client.Client.new`.  Otherwise do nothing and
-        return obj unchanged.
+        If obj is a Suds instance object or a record, create a new
+        object with :meth:`icat.client.Client.new`.  If obj is a row in the
+        result of a query selecting multiple attributes, return the
+        values as a tuple.  Otherwise do nothing and return obj
+        unchanged.
         
         :param obj: either a Suds instance object or anything.
         :type obj: :class:`suds.sudsobject.Object` or any type
         :return: the new entity object or obj.
         :rtype: :class:`icat.entity.Entity` or any type
         """
-        if isinstance(obj, suds.sudsobject.Object):
+        if isinstance(obj, CompactRecord):
+            return self.new(obj)
+        elif isinstance(obj, suds.sudsobject.Object):
+            items = fieldSetItems(obj)
+            if items is not None:
+                return tuple(self.getEntity(i) for i in items)
             return self.new(obj)
         else:
             return obj
@@ -363,39 +760,164 @@ class Client(suds.client.Client):
 
 
     def create(self, bean):
+        if self.activeUnitOfWork is not None:
+            self.activeUnitOfWork.create(bean)
+            return None
         if getattr(bean, 'validate', None):
             bean.validate()
         try:
-            return self.service.create(self.sessionId, Entity.getInstance(bean))
+            return self.service.create(self.sessionId, self._getInstance(bean))
         except suds.WebFault as e:
             raise translateError(e)
-
-    def createMany(self, beans):
+        finally:
+            self._invalidateSearchCache([bean])
+
+    def createMany(self, beans, batchsize=None, maxbytes=None, workers=1):
+        """Create many objects.
+
+        By default, all objects are created in one single call.  If
+        `batchsize` or `maxbytes` is set, the objects are split into
+        batches having at most this number of objects or this
+        estimated size of the SOAP request respectively, and each
+        batch is created in a call of its own.  If `workers` is
+        larger then one, the batches are submitted concurrently
+        using clones of the client that share the session.  In this
+        case, objects in one batch must not depend on objects in
+        another batch.
+
+        :param beans: the objects to create.
+        :type beans: :class:`list` of :class:`icat.entity.Entity`
+        :param batchsize: the maximal number of objects per call.
+        :type batchsize: :class:`int`
+        :param maxbytes: the maximal estimated size in bytes of the
+            objects in one call.
+        :type maxbytes: :class:`int`
+        :param workers: the number of batches to submit concurrently.
+        :type workers: :class:`int`
+        :return: the ids of the objects created, in the same order as
+            `beans`.
+        :rtype: :class:`list` of :class:`long`
+        :raise ICATError: in case of exceptions raised by the ICAT
+            server, if not split into batches.
+        :raise BatchCallError: if any batch failed.  The ids of the
+            objects created in the successful batches are available
+            from this error.
+        """
+        beans = list(beans)
         for b in beans:
             if getattr(b, 'validate', None):
                 b.validate()
         try:
-            return self.service.createMany(self.sessionId, Entity.getInstances(beans))
-        except suds.WebFault as e:
-            raise translateError(e)
+            if batchsize or maxbytes:
+                return self._batchCall("createMany", beans, 
+                                       batchsize, maxbytes, workers)
+            else:
+                return self._callMany("createMany", 
+                                      self._getInstances(beans))
+        finally:
+            self._invalidateSearchCache(beans)
 
     def delete(self, bean):
+        if self.activeUnitOfWork is not None:
+            self.activeUnitOfWork.delete(bean)
+            return
         try:
-            self.service.delete(self.sessionId, Entity.getInstance(bean))
+            self.service.delete(self.sessionId, self._getInstance(bean))
         except suds.WebFault as e:
             raise translateError(e)
+        finally:
+            self._invalidateSearchCache([bean])
+
+    def deleteMany(self, beans, batchsize=None, maxbytes=None, workers=1):
+        """Delete many objects.
+
+        The arguments `batchsize`, `maxbytes`, and `workers` have the
+        same meaning as for :meth:`icat.client.Client.createMany`.
+
+        :param beans: the objects to delete.
+        :type beans: :class:`list` of :class:`icat.entity.Entity`
+        :param batchsize: the maximal number of objects per call.
+        :type batchsize: :class:`int`
+        :param maxbytes: the maximal estimated size in bytes of the
+            objects in one call.
+        :type maxbytes: :class:`int`
+        :param workers: the number of batches to submit concurrently.
+        :type workers: :class:`int`
+        :raise ICATError: in case of exceptions raised by the ICAT
+            server, if not split into batches.
+        :raise BatchCallError: if any batch failed.
+        """
+        beans = list(beans)
+        try:
+            if batchsize or maxbytes:
+                self._batchCall("deleteMany", beans, 
+                                batchsize, maxbytes, workers)
+            else:
+                self._callMany("deleteMany", self._getInstances(beans))
+        finally:
+            self._invalidateSearchCache(beans)
 
-    def deleteMany(self, beans):
+    def _callMany(self, method, instances):
         try:
-            self.service.deleteMany(self.sessionId, Entity.getInstances(beans))
+            return getattr(self.service, method)(self.sessionId, instances)
         except suds.WebFault as e:
             raise translateError(e)
 
+    def _batchCall(self, method, beans, batchsize, maxbytes, workers):
+        """Call createMany or deleteMany in batches.
+        """
+        instances = self._getInstances(beans)
+        batches = [ (i, start, end) for i, (start, end) 
+                    in enumerate(_splitBatches(instances, batchsize, 
+                                               maxbytes)) ]
+        if method == "createMany":
+            result = [None] * len(instances)
+        else:
+            result = None
+        failed = []
+
+        def pending():
+            # Do not submit any further batches after a failure.
+            for batch in batches:
+                if failed:
+                    return
+                yield batch
+
+        def call(client, batch):
+            i, start, end = batch
+            try:
+                return batch, client._callMany(method, instances[start:end])
+            except Exception as e:
+                return batch, e
+
+        if workers > 1 and len(batches) > 1:
+            pool = WorkerPool(min(workers, len(batches)), init=self.clone)
+            results = pool.imap(call, pending(), ordered=False, 
+                                maxpending=pool.workers)
+        else:
+            pool = None
+            results = (call(self, batch) for batch in pending())
+        try:
+            for (i, start, end), res in results:
+                if isinstance(res, Exception):
+                    log.debug("%s: batch %d failed: %s", method, i, res)
+                    failed.append((i, start, end, res))
+                elif result is not None:
+                    result[start:end] = res
+        finally:
+            if pool:
+                pool.close()
+        if failed:
+            raise BatchCallError(method, failed, result)
+        return result
+
     def get(self, query, primaryKey):
+        if self.includeAdvisor is not None:
+            self.includeAdvisor.get(query, primaryKey)
         try:
             instance = self.service.get(self.sessionId, 
                                         unicode(query), primaryKey)
-            return self.getEntity(instance)
+            return self._getResultEntity(instance)
         except suds.WebFault as e:
             raise translateError(e)
 
@@ -453,7 +975,7 @@ class Client(suds.client.Client):
 
     def isAccessAllowed(self, bean, accessType):
         try:
-            return self.service.isAccessAllowed(self.sessionId, Entity.getInstance(bean), accessType)
+            return self.service.isAccessAllowed(self.sessionId, self._getInstance(bean), accessType)
         except suds.WebFault as e:
             raise translateError(e)
         except suds.MethodNotFound as e:
@@ -473,22 +995,143 @@ class Client(suds.client.Client):
             else:
                 raise
 
-    def search(self, query):
+    def search(self, query, rowtype=None):
+        """Search the ICAT server.
+
+        If `rowtype` is set, the result is not returned as entity
+        objects, but each object is decoded directly from the reply
+        of the server into a lightweight row holding the values of
+        its plain attributes, see :class:`icat.stream.RowDecoder` for
+        details.  This is considerably faster for large results.
+        Otherwise, if :attr:`self.lazyLoad` is set, the entity objects
+        in the result form a :class:`icat.lazyload.ResultGroup` and if
+        :attr:`self.includeAdvisor` is set, the result is recorded
+        there.
+
+        :param query: the search query.
+        :type query: :class:`icat.query.Query` or :class:`str`
+        :param rowtype: either :const:`None` to return entity
+            objects, ``"dict"`` to return :class:`dict` rows, or
+            ``"tuple"`` to return named tuples.
+        :type rowtype: :class:`str`
+        :return: search result.
+        :rtype: :class:`list`
+        :raise ValueError: if `rowtype` is not valid.
+        :raise ICATError: in case of exceptions raised by the ICAT
+            server.
+        """
+        if self.searchCache is None:
+            result = self._search(query, rowtype)
+        else:
+            result = self.searchCache.search(self, query, rowtype, 
+                                             self._search)
+        if rowtype is None:
+            result = map(self._getResultEntity, result)
+            if self.lazyLoad:
+                ResultGroup(result)
+            if self.includeAdvisor is not None:
+                self.includeAdvisor.searchResult(query, result)
+            return result
+        else:
+            return result
+
+    def _search(self, query, rowtype):
+        """Search the ICAT server.
+
+        Return the result as is, without converting the Suds
+        instances into entity objects.
+        """
+        if rowtype is not None:
+            return list(self.iterSearch(query, rowtype=rowtype))
         try:
-            instances = self.service.search(self.sessionId, unicode(query))
-            return map(lambda i: self.getEntity(i), instances)
+            return self.service.search(self.sessionId, unicode(query))
         except suds.WebFault as e:
             raise translateError(e)
 
+    def _searchInstances(self, query):
+        """Search the ICAT server for internal purposes.
+
+        Return the instances in the result, converted into records if
+        :attr:`self.compactEntities` is set.  The result is neither
+        wrapped in entity objects nor put in a result group nor
+        recorded by the include advisor.  It is not merged into the
+        identity map either.
+        """
+        if self.searchCache is None:
+            result = self._search(query, None)
+        else:
+            result = self.searchCache.search(self, query, None, 
+                                             self._search)
+        if self.compactEntities:
+            result = [ compactInstance(self.typemap, i) 
+                       if isinstance(i, suds.sudsobject.Object) else i
+                       for i in result ]
+        return result
+
     def update(self, bean):
+        """Update an object in the ICAT.
+
+        If bean is an :class:`icat.entity.Entity`, only its
+        attributes and the ids of the related objects in the many to
+        one relations are sent to the server.  The one to many
+        relations and the attributes of related objects are ignored
+        by the server anyway.  If the object has a snapshot of its
+        state and no attribute has been modified, see
+        :meth:`icat.entity.Entity.getModifiedAttrs`, the update is
+        skipped altogether.  The estimated size of the data sent and
+        saved is accounted in :attr:`self.updateStats`.
+
+        If a unit of work is active, see
+        :meth:`icat.client.Client.unitOfWork`, the update is only
+        recorded in the unit of work.
+
+        :param bean: the object to update.
+        :type bean: :class:`icat.entity.Entity`
+        """
+        if self.activeUnitOfWork is not None:
+            self.activeUnitOfWork.update(bean)
+            return
+        self._update(bean)
+
+    def _update(self, bean):
+        """Update an object in the ICAT, regardless of an active unit
+        of work.
+        """
+        instance = self._getUpdateInstance(bean)
+        if instance is None:
+            self.updateStats.add()
+            return
         try:
-            self.service.update(self.sessionId, Entity.getInstance(bean))
+            self.service.update(self.sessionId, instance)
         except suds.WebFault as e:
             raise translateError(e)
+        finally:
+            self._invalidateSearchCache([bean])
+        if isinstance(bean, Entity):
+            sent = _instanceSize(instance)
+            full = _instanceSize(bean.instance)
+            self.updateStats.add(sent, max(full - sent, 0))
+            bean._takeSnapshot(bean.instance)
+        else:
+            self.updateStats.add(_instanceSize(instance))
 
 
     # =================== custom API methods ===================
 
+    def _invalidateSearchCache(self, beans):
+        """Invalidate the cached search results related to the entity
+        types of beans.
+        """
+        if self.searchCache is not None:
+            beannames = set()
+            for b in beans:
+                if getattr(b, 'BeanName', None):
+                    beannames.add(b.BeanName)
+                else:
+                    beannames = None
+                    break
+            self.searchCache.invalidate(beannames)
+
     def assertedSearch(self, query, assertmin=1, assertmax=1):
         """Search with an assertion on the result.
 
@@ -521,7 +1164,52 @@ class Client(suds.client.Client):
         else:
             raise SearchAssertionError(query, assertmin, assertmax, num)
 
-    def searchChunked(self, query, skip=0, count=None, chunksize=100):
+    def _getRowDecoder(self, rowtype):
+        try:
+            return self.rowDecoders[rowtype]
+        except KeyError:
+            decoder = RowDecoder(self, rowtype)
+            self.rowDecoders[rowtype] = decoder
+            return decoder
+
+    def iterSearch(self, query, rowtype=None):
+        """Search the ICAT server and iterate over the result.
+
+        Same as :meth:`icat.client.Client.search`, but the reply from
+        the server is parsed incrementally while it is being
+        received.  The items in the result are yielded one by one as
+        soon as they have been decoded, rather than building the
+        complete list first.  This keeps the memory consumption low
+        for large results and the first items are available earlier.
+        The search call is done when the first item is requested from
+        the generator.
+
+        :param query: the search query.
+        :type query: :class:`icat.query.Query` or :class:`str`
+        :param rowtype: return lightweight rows rather than entity
+            objects, see :meth:`icat.client.Client.search`.
+        :type rowtype: :class:`str`
+        :return: a generator that iterates over the items in the
+            search result.
+        :rtype: generator
+        :raise ValueError: if `rowtype` is not valid.
+        :raise ICATError: in case of exceptions raised by the ICAT
+            server.
+        """
+        if rowtype is None:
+            decode = None
+        else:
+            decode = self._getRowDecoder(rowtype)
+        try:
+            for obj in iterCall(self, 'search', 
+                                (self.sessionId, unicode(query)), 
+                                decode=decode, received=self.replySize.set):
+                yield obj if decode else self._getResultEntity(obj)
+        except suds.WebFault as e:
+            raise translateError(e)
+
+    def searchChunked(self, query, skip=0, count=None, chunksize=100, 
+                      keyset=False, prefetch=0, rowtype=None):
         """Search the ICAT server.
 
         Call the ICAT :meth:`icat.client.Client.search` API method,
@@ -542,6 +1230,26 @@ class Client(suds.client.Client):
         changes between individual search calls in a way that would
         affect the result.
 
+        If `keyset` is :const:`True`, the chunks are not selected by
+        an offset in the LIMIT clause, but by a condition on the id
+        being larger then the id of the last item from the previous
+        chunk.  This avoids that the server needs to skip over all
+        the previous items in each call, which becomes very
+        expensive for large results.  As a side effect, the result
+        is consistent even if objects are concurrently added in the
+        ICAT server.  The query must be a :class:`icat.query.Query`
+        or a JPQL style search expression that either selects entity
+        objects or their id.  Any ORDER BY clause will be replaced,
+        the result will always be sorted by id.
+
+        If `prefetch` is larger then zero, the search calls are done
+        in a background thread using a clone of this client, see
+        :meth:`icat.client.Client.clone`.  Up to `prefetch` chunks
+        will be fetched from the server in advance while the caller
+        is still processing the previous items.  The generator
+        should be closed if it is not consumed completely in order
+        to stop the background thread.
+
         :param query: the search query.
         :type query: :class:`icat.query.Query` or :class:`str`
         :param skip: offset from within the full list of available results.
@@ -551,14 +1259,93 @@ class Client(suds.client.Client):
         :type count: :class:`int`
         :param chunksize: number of items to query in each search
             call.  This is an internal tuning parameter and does not
-            affect the result.
-        :type chunksize: :class:`int`
+            affect the result.  It may also be a
+            :class:`icat.chunking.ChunkSize`, in particular an
+            :class:`icat.chunking.AdaptiveChunkSize` to adjust the
+            number of items in each call to the observed response
+            times.  Statistics on the search calls will then be
+            recorded in this object.
+        :type chunksize: :class:`int` or
+            :class:`icat.chunking.ChunkSize`
+        :param keyset: flag whether to select the chunks by id rather
+            then by offset.
+        :type keyset: :class:`bool`
+        :param prefetch: number of chunks to fetch in advance in a
+            background thread.  A value of zero means to do all
+            search calls in the current thread when needed.
+        :type prefetch: :class:`int`
+        :param rowtype: return lightweight rows rather than entity
+            objects, see :meth:`icat.client.Client.search`.
+        :type rowtype: :class:`str`
         :return: a generator that iterates over the items in the
             search result.
         :rtype: generator
+        :raise ValueError: if `keyset` is set and the query is not
+            suitable for it or if `rowtype` is not valid.
         """
         if isinstance(query, Query):
             query = unicode(query)
+        if not isinstance(chunksize, ChunkSize):
+            chunksize = ChunkSize(chunksize)
+        chunksize.setup(self)
+        if rowtype is not None:
+            # Check rowtype early, rather than in the first search call.
+            self._getRowDecoder(rowtype)
+        client = self.clone() if prefetch > 0 else self
+        if keyset:
+            pages = client._searchKeyset(query, skip, count, chunksize, 
+                                         rowtype)
+        else:
+            pages = client._searchOffset(query, skip, count, chunksize, 
+                                         rowtype)
+        if client is self:
+            for items in pages:
+                for o in items:
+                    yield o
+        else:
+            pages = BackgroundIterator(pages, prefetch)
+            try:
+                for items in pages:
+                    for o in items:
+                        # Rebind the objects to this client, they
+                        # have been created by the clone.
+                        if isinstance(o, Entity):
+                            o.client = self
+                        yield o
+            finally:
+                pages.close()
+
+    def _searchChunk(self, query, args, chunksize, stats, remaining, 
+                     rowtype):
+        """Do one search call in a chunked search.
+
+        The query must end with a LIMIT clause having placeholders
+        for the offset and the number of items, args are the values
+        for all but the last placeholder.  Return the items found
+        and the number of items requested.
+        """
+        while True:
+            n = stats.chunksize
+            if remaining is not None:
+                n = min(n, remaining)
+            start = time.time()
+            # Results served from the search cache have no reply.
+            self.replySize.set(None)
+            try:
+                items = self.search(query % (args + (n,)), rowtype=rowtype)
+            except ICATError as e:
+                if chunksize.reject(stats, n, e):
+                    continue
+                raise
+            chunksize.record(stats, n, len(items), time.time() - start,
+                             self.replySize.get())
+            return items, n
+
+    def _searchOffset(self, query, skip, count, chunksize, rowtype=None):
+        """Iterate over the chunks of a search result using LIMIT
+        offsets.
+        """
+        stats = chunksize.getStats(query)
         query = query.replace('%', '%%')
         if query.startswith("SELECT"):
             query += " LIMIT %d, %d"
@@ -566,15 +1353,205 @@ class Client(suds.client.Client):
             query = "%d, %d " + query
         delivered = 0
         while True:
-            if count is not None and count - delivered < chunksize:
-                chunksize = count - delivered
-            items = self.search(query % (skip, chunksize))
-            skip += chunksize
+            remaining = None if count is None else count - delivered
+            if remaining is not None and remaining <= 0:
+                break
+            items, n = self._searchChunk(query, (skip,), chunksize, stats, 
+                                         remaining, rowtype)
+            skip += n
+            if not items:
+                break
+            yield items
+            delivered += len(items)
+
+    def _parseKeysetQuery(self, query):
+        """Verify that a query is suitable to select chunks by id.
+
+        Return the clauses of the query, the identification variable
+        of the selected entity, and a flag whether the query selects
+        the id rather then the objects.
+        """
+        clauses = parse_jpql_clauses(query)
+        if clauses['LIMIT'] is not None:
+            raise ValueError("Query must not contain a LIMIT clause.")
+        m = re.match(r"^SELECT\s+(?:DISTINCT\s+)?(\w+)(\.id)?\s+"
+                     r"FROM\s+\w+\s+(?:AS\s+)?(\w+)", 
+                     clauses['SELECT'], re.IGNORECASE)
+        if not m or m.group(1) != m.group(3):
+            raise ValueError("Query must either select objects or their id "
+                             "for keyset pagination.")
+        return clauses, m.group(3), bool(m.group(2))
+
+    def _searchKeyset(self, query, skip, count, chunksize, rowtype=None):
+        """Iterate over the chunks of a search result using conditions
+        on the id.
+        """
+        stats = chunksize.getStats(query)
+        clauses, var, selectid = self._parseKeysetQuery(query)
+        idattr = "%s.id" % var
+        def template(where):
+            q = clauses['SELECT'].replace('%', '%%')
+            if where:
+                q += " WHERE " + " AND ".join(where)
+            q += " ORDER BY %s" % idattr
+            if clauses['INCLUDE']:
+                q += " INCLUDE %s" % clauses['INCLUDE'].replace('%', '%%')
+            return q + " LIMIT %d, %d"
+        where = []
+        if clauses['WHERE']:
+            where.append("(%s)" % clauses['WHERE'].replace('%', '%%'))
+        first = template(where)
+        where.append("%s > %%d" % idattr)
+        following = template(where)
+        items = None
+        delivered = 0
+        while True:
+            remaining = None if count is None else count - delivered
+            if remaining is not None and remaining <= 0:
+                break
+            if items is None:
+                items, n = self._searchChunk(first, (skip,), chunksize, 
+                                             stats, remaining, rowtype)
+            else:
+                last = items[-1]
+                if selectid:
+                    lastid = last
+                elif isinstance(last, dict):
+                    lastid = last['id']
+                else:
+                    lastid = last.id
+                items, n = self._searchChunk(following, (lastid, 0), 
+                                             chunksize, stats, remaining, 
+                                             rowtype)
             if not items:
                 break
-            for o in items:
-                yield o
-                delivered += 1
+            yield items
+            delivered += len(items)
+            if len(items) < n:
+                break
+
+    def searchParallel(self, query, workers=4, ordered=True, chunksize=100):
+        """Search the ICAT server using several sessions concurrently.
+
+        Determine the range of ids of the objects in the search
+        result and the number of objects, split the id range into
+        parts, each holding about `chunksize` objects on average, and
+        search the parts concurrently in a pool of worker threads.
+        Each worker thread uses its own clone of this client, see
+        :meth:`icat.client.Client.clone`.  The parts are searched
+        using keyset pagination, so the same restrictions on the
+        query apply as for the `keyset` argument of
+        :meth:`icat.client.Client.searchChunked`.
+
+        If `ordered` is :const:`True`, the result is yielded sorted by
+        id, as with keyset pagination in
+        :meth:`icat.client.Client.searchChunked`.  Otherwise, the
+        parts are yielded as soon as they are available, only the
+        items within each part are sorted by id.  The generator should
+        be closed if it is not consumed completely in order to stop
+        the worker threads.
+
+        :param query: the search query.
+        :type query: :class:`icat.query.Query` or :class:`str`
+        :param workers: number of worker threads.
+        :type workers: :class:`int`
+        :param ordered: flag whether to yield the result sorted by id.
+        :type ordered: :class:`bool`
+        :param chunksize: the average number of items in each part of
+            the id range.  This is an internal tuning parameter and
+            does not affect the result.
+        :type chunksize: :class:`int`
+        :return: a generator that iterates over the items in the
+            search result.
+        :rtype: generator
+        :raise ValueError: if the query is not suitable for keyset
+            pagination.
+        """
+        if isinstance(query, Query):
+            query = unicode(query)
+        clauses, var, selectid = self._parseKeysetQuery(query)
+        idattr = "%s.id" % var
+        select = clauses['SELECT']
+        fromclause = select[re.search(r"\sFROM\s", select, 
+                                      re.IGNORECASE).start():]
+        where = [ "(%s)" % clauses['WHERE'] ] if clauses['WHERE'] else []
+
+        def aggregate(func):
+            q = "SELECT %s(%s)%s" % (func, idattr, fromclause)
+            if where:
+                q += " WHERE " + " AND ".join(where)
+            res = self.search(q)
+            return res[0] if res else None
+
+        low = aggregate("MIN")
+        if low is None:
+            return
+        high = aggregate("MAX")
+        num = aggregate("COUNT")
+        nparts = max(workers, -(-num // chunksize))
+        width = max(-(-(high - low + 1) // nparts), 1)
+        parts = [ (l, min(l + width - 1, high)) 
+                  for l in range(low, high + 1, width) ]
+
+        def searchPart(client, part):
+            cond = "%s >= %d AND %s <= %d" % (idattr, part[0], idattr, part[1])
+            q = "%s WHERE %s" % (select, " AND ".join(where + [cond]))
+            if clauses['INCLUDE']:
+                q += " INCLUDE %s" % clauses['INCLUDE']
+            result = []
+            for items in client._searchKeyset(q, 0, None, 
+                                              ChunkSize(chunksize)):
+                result.extend(items)
+            return result
+
+        pool = WorkerPool(workers, init=self.clone)
+        try:
+            for items in pool.imap(searchPart, parts, ordered=ordered):
+                for o in items:
+                    # Rebind the objects to this client, they have
+                    # been created by a clone.
+                    if isinstance(o, Entity):
+                        o.client = self
+                    yield o
+        finally:
+            pool.close()
+
+    def prefetchEntityInfo(self, workers=4):
+        """Retrieve the entity info for all entity types at once.
+
+        :meth:`icat.client.Client.getEntityInfo` caches the entity
+        info, but retrieves it lazily, one call per entity type, as
+        needed e.g. to build queries.  This method rather retrieves
+        the info for all entity types not yet cached concurrently in
+        a pool of worker threads.  If the client has a persistent
+        cache (see the `cacheDir` argument to the constructor), the
+        complete entity info is stored there, so that later clients
+        connecting to the same ICAT server will start with the entity
+        info already at hand.
+
+        :param workers: the number of worker threads.
+        :type workers: :class:`int`
+        :raise ICATError: in case of exceptions raised by the ICAT
+            server.
+        """
+        names = [ n for n in self.getEntityNames() 
+                  if n not in self.entityInfoCache ]
+        if not names:
+            return
+        if workers > 1 and len(names) > 1:
+            # The clones share the entity info cache with this client.
+            pool = WorkerPool(min(workers, len(names)), init=self.clone)
+            try:
+                for info in pool.imap(lambda c, n: c.getEntityInfo(n), names):
+                    pass
+            finally:
+                pool.close()
+        else:
+            for n in names:
+                self.getEntityInfo(n)
+        if self.cache:
+            self.cache.setEntityInfo(str(self.apiversion), 
+                                     self.entityInfoCache)
 
     def searchUniqueKey(self, key, objindex=None):
         """Search the object that belongs to a unique key.
@@ -613,25 +1590,292 @@ class Client(suds.client.Client):
         beanname = key[:us]
         av = parse_attr_val(key[us+1:])
         info = self.getEntityInfo(beanname)
-        query = Query(self, beanname)
+        types = {}
+        values = {}
         for f in info.fields:
             if f.name in av.keys():
                 attr = f.name
                 if f.relType == "ATTRIBUTE":
-                    cond = "= '%s'" % simpleqp_unquote(av[attr])
-                    query.addConditions({attr:cond})
+                    types[attr] = "string"
+                    values[attr] = simpleqp_unquote(av[attr])
                 elif f.relType == "ONE":
                     rk = str("%s_%s" % (f.type, av[attr]))
                     ro = self.searchUniqueKey(rk, objindex)
-                    query.addConditions({"%s.id" % attr:"= %d" % ro.id})
+                    types[attr] = "id"
+                    values[attr] = ro.id
                 else:
                     raise ValueError("malformed '%s': invalid attribute '%s'" 
                                      % (key, attr))
-        obj = self.assertedSearch(query)[0]
+        template = self._getQueryTemplate(beanname, types)
+        obj = self.assertedSearch(template.bind(**values))[0]
         if objindex is not None:
             objindex[key] = obj
         return obj
 
+    def searchUniqueKeys(self, keys, objindex=None, batchsize=100):
+        """Search the objects that belong to a list of unique keys.
+
+        This has the same effect as calling
+        :meth:`icat.client.Client.searchUniqueKey` for each of the
+        keys, but needs much less search calls.  The keys are grouped
+        by the entity type and the attributes they are made of.
+        Within each group, the keys are further grouped by the values
+        of all but one attribute and all keys in such a group are
+        searched at once using an IN condition on the remaining
+        attribute.  The keys of related objects are resolved the same
+        way beforehand.
+
+        If a key is not matched by the result of these searches, e.g.
+        because the database does not distinguish the case of
+        characters, it is searched individually with
+        :meth:`icat.client.Client.searchUniqueKey`.
+
+        :param keys: the unique keys of the objects to search for.
+        :type keys: iterable of :class:`str`
+        :param objindex: cache of Entity objects.  See
+            :meth:`icat.client.Client.searchUniqueKey` for details.
+            All objects retrieved will be added to this index.
+        :type objindex: :class:`dict`
+        :param batchsize: the maximal number of keys to search in
+            one call.
+        :type batchsize: :class:`int`
+        :return: the objects corresponding to the keys, in the same
+            order as the keys.
+        :rtype: :class:`list` of :class:`icat.entity.Entity`
+        :raise SearchResultError: if any of the objects has not been
+            found.
+        :raise ValueError: if any of the keys is not well formed.
+        :raise VersionMethodError: if connected to an ICAT server
+            older then 4.3.0.
+        """
+        if self.apiversion < '4.3':
+            raise VersionMethodError("searchUniqueKeys", self.apiversion)
+        keys = list(keys)
+        if objindex is None:
+            objindex = {}
+        self._searchUniqueKeys(set(keys), objindex, batchsize)
+        return [ objindex[k] for k in keys ]
+
+    def _searchUniqueKeys(self, keys, objindex, batchsize):
+        keys = [ k for k in keys if k not in objindex ]
+        if not keys:
+            return
+        # Parse the keys into a list of (attribute, relType, value)
+        # per key, where the value is the quoted attribute value or
+        # the key of the related object respectively.
+        parsed = {}
+        relkeys = set()
+        for key in keys:
+            us = key.index('_')
+            beanname = key[:us]
+            av = parse_attr_val(key[us+1:])
+            info = self.getEntityInfo(beanname)
+            attrs = []
+            for f in info.fields:
+                if f.name in av.keys():
+                    attr = f.name
+                    if f.relType == "ATTRIBUTE":
+                        attrs.append((attr, f.relType, av[attr]))
+                    elif f.relType == "ONE":
+                        rk = str("%s_%s" % (f.type, av[attr]))
+                        attrs.append((attr, f.relType, rk))
+                        relkeys.add(rk)
+                    else:
+                        raise ValueError("malformed '%s': invalid "
+                                         "attribute '%s'" % (key, attr))
+            parsed[key] = (beanname, attrs)
+        self._searchUniqueKeys(relkeys, objindex, batchsize)
+        items = []
+        for key, (beanname, attrs) in sorted(parsed.items()):
+            # Some keys may have been resolved as related objects of
+            # others.
+            if key in objindex:
+                continue
+            attrs = tuple((a, t, objindex[v].id if t == "ONE" else v)
+                          for a, t, v in attrs)
+            items.append((key, beanname, attrs))
+        found = self._searchConstraints(items, None, batchsize)
+        for key, beanname, attrs in items:
+            objs = found.get(key, [])
+            if len(objs) == 1:
+                objindex[key] = objs[0]
+            else:
+                # Let searchUniqueKey() deal with it, it will raise
+                # the appropriate error.
+                self.searchUniqueKey(key, objindex)
+
+    def _searchConstraints(self, items, includes, batchsize):
+        """Search objects by the values of their constraint attributes.
+
+        `items` is a list of tuples (token, beanname, attrs), attrs
+        being a tuple of (attribute, relType, value), where value is
+        the value quoted by :func:`icat.helper.simpleqp_quote` for
+        plain attributes and the id of the related object for
+        relations.  Date attributes may have the relType ``"DATE"``,
+        the value being a tuple of the literal for the condition and
+        the key to match the result, see :func:`_dateKey`.  The items
+        are grouped by entity type and
+        attributes.  Within each group, one attribute is taken as
+        pivot and the items are further grouped by the values of all
+        other attributes.  Each of these
+        groups is searched with an IN condition on the pivot.
+        Return a dict mapping the tokens to the lists of objects
+        found.
+        """
+
+        def condvalue(relType, value):
+            if relType == "ATTRIBUTE":
+                return "'%s'" % simpleqp_unquote(value).replace("'", "''")
+            elif relType == "DATE":
+                return value[0]
+            else:
+                return "%d" % value
+
+        def condattr(attr, relType):
+            return "%s.id" % attr if relType == "ONE" else attr
+
+        def others(attrs, p):
+            return tuple(v for i, (a, t, v) in enumerate(attrs) if i != p)
+
+        groups = {}
+        for token, beanname, attrs in items:
+            shape = (beanname, tuple((a, t) for a, t, v in attrs))
+            groups.setdefault(shape, []).append((token, attrs))
+        found = {}
+        for (beanname, shape), gitems in sorted(groups.items()):
+            if not shape:
+                continue
+            # Choose the pivot that yields the least number of groups.
+            p = min(range(len(shape)), 
+                    key=lambda i: len(set(others(attrs, i) 
+                                          for t, attrs in gitems)))
+            pattr, ptype = shape[p]
+            subgroups = {}
+            for token, attrs in gitems:
+                subgroup = subgroups.setdefault(others(attrs, p), [])
+                subgroup.append((token, attrs[p][2]))
+            fixedattrs = [ a for i, a in enumerate(shape) if i != p ]
+            for fixed, sitems in sorted(subgroups.items()):
+                conditions = {}
+                for (attr, relType), value in zip(fixedattrs, fixed):
+                    conditions[condattr(attr, relType)] = \
+                        "= %s" % condvalue(relType, value)
+                for i in range(0, len(sitems), batchsize):
+                    bitems = sitems[i:i+batchsize]
+                    pvalues = {}
+                    for token, v in bitems:
+                        pvalues.setdefault(v, []).append(token)
+                    cond = dict(conditions)
+                    pvals = [ condvalue(ptype, v) 
+                              for v in sorted(pvalues.keys()) ]
+                    cond[condattr(pattr, ptype)] = "IN (%s)" % ", ".join(pvals)
+                    query = Query(self, beanname, conditions=cond, 
+                                  includes=includes)
+                    if ptype == "ONE":
+                        query.addIncludes([pattr])
+                    elif ptype == "DATE":
+                        dvalues = {}
+                        for v in pvalues.keys():
+                            dvalues.setdefault(v[1], []).extend(pvalues[v])
+                    else:
+                        # The database may not distinguish the case of
+                        # characters in the condition.
+                        lvalues = {}
+                        for v in pvalues.keys():
+                            lv = simpleqp_unquote(v).lower()
+                            lvalues.setdefault(lv, []).extend(pvalues[v])
+                    for obj in self.search(query):
+                        if ptype == "ONE":
+                            tokens = pvalues.get(getattr(obj, pattr).id, [])
+                        elif ptype == "DATE":
+                            tokens = []
+                            v = getattr(obj, pattr, None)
+                            for k in _serverDateKeys(v):
+                                tokens.extend(dvalues.get(k, []))
+                        else:
+                            v = getattr(obj, pattr, None)
+                            tokens = pvalues.get(simpleqp_quote(v))
+                            if tokens is None:
+                                lv = simpleqp_unquote(simpleqp_quote(v))
+                                tokens = lvalues.get(lv.lower(), [])
+                        for token in tokens:
+                            found.setdefault(token, []).append(obj)
+        return found
+
+    def searchMatchingMany(self, objs, includes=None, batchsize=100):
+        """Search the matching objects for a list of objects.
+
+        This has the same effect as calling
+        :meth:`icat.client.Client.searchMatching` for each of the
+        objects, but needs only a few search calls: the objects are
+        grouped by entity type and by the values of all but one of
+        the attributes in the uniqueness constraint.  Each group is
+        searched at once with an IN condition on the remaining
+        attribute, in batches of at most `batchsize` objects.  The
+        `batchsize` must not exceed the maximal number of entities
+        that the ICAT server returns in one search.
+
+        :param objs: entity objects having the attributes for the
+            uniqueness constraint set accordingly.
+        :type objs: iterable of :class:`icat.entity.Entity`
+        :param includes: list of related objects to add to the INCLUDE
+            clause of the search queries.
+            See :meth:`icat.query.Query.addIncludes` for details.
+        :type includes: iterable of :class:`str`
+        :param batchsize: the maximal number of objects to search in
+            one call.
+        :type batchsize: :class:`int`
+        :return: a mapping of each object in `objs` to the
+            corresponding object found or :const:`None` if no matching
+            object has been found.
+        :rtype: :class:`dict`
+        :raise SearchResultError: if more then one matching object
+            has been found for any of the objects.
+        :raise ValueError: if the class of any object does not have a
+            uniqueness constraint or if any attribute needed for the
+            constraint is not set.
+        :raise VersionMethodError: if connected to an ICAT server
+            older then 4.3.0.
+        """
+        if self.apiversion < '4.3':
+            raise VersionMethodError("searchMatchingMany", self.apiversion)
+        items = []
+        for obj in objs:
+            if 'id' in obj.Constraint:
+                raise ValueError("%s does not have a uniqueness constraint." 
+                                 % obj.BeanName)
+            attrs = []
+            for a in obj.Constraint:
+                v = getattr(obj, a)
+                if v is None:
+                    raise ValueError("%s is not set" % a)
+                if a in obj.InstAttr:
+                    if obj.getAttrType(a) == "Date":
+                        # Bind dates the same way as searchMatching().
+                        if _isnaivedate(v):
+                            literal = _fmtdate(v)
+                        else:
+                            sv = v if isinstance(v, basestring) else str(v)
+                            literal = "'%s'" % sv.replace("'", "''")
+                        attrs.append((a, "DATE", (literal, _dateKey(v))))
+                    else:
+                        attrs.append((a, "ATTRIBUTE", simpleqp_quote(v)))
+                elif a in obj.InstRel:
+                    attrs.append((a, "ONE", v.id))
+                else:
+                    raise InternalError("Invalid constraint '%s' in %s."
+                                        % (a, obj.BeanName))
+            items.append((obj, obj.BeanName, tuple(attrs)))
+        found = self._searchConstraints(items, includes, batchsize)
+        result = {}
+        for obj, beanname, attrs in items:
+            objs = found.get(obj, [])
+            if len(objs) > 1:
+                raise SearchResultError("%d objects found matching %s." 
+                                        % (len(objs), obj))
+            result[obj] = objs[0] if objs else None
+        return result
+
     def searchMatching(self, obj, includes=None):
         """Search the matching object.
 
@@ -659,19 +1903,151 @@ class Client(suds.client.Client):
         """
         if 'id' in obj.Constraint:
             raise ValueError("%s does not have a uniqueness constraint.")
-        query = Query(self, obj.BeanName, includes=includes)
+        types = {}
+        values = {}
         for a in obj.Constraint:
             v = getattr(obj, a)
             if v is None:
                 raise ValueError("%s is not set" % a)
             if a in obj.InstAttr:
-                query.addConditions({a: "= '%s'" % v})
+                # Other values of Date attributes are quoted as
+                # strings and left to the server to parse.
+                if obj.getAttrType(a) == "Date" and _isnaivedate(v):
+                    types[a] = "date"
+                    values[a] = v
+                else:
+                    types[a] = "string"
+                    values[a] = v if isinstance(v, basestring) else str(v)
             elif a in obj.InstRel:
-                query.addConditions({"%s.id" % a: "= %d" % v.id})
+                types[a] = "id"
+                values[a] = v.id
             else:
                 raise InternalError("Invalid constraint '%s' in %s."
                                     % (a, obj.BeanName))
-        return self.assertedSearch(query)[0]
+        template = self._getQueryTemplate(obj.BeanName, types, includes)
+        return self.assertedSearch(template.bind(**values))[0]
+
+    def _getQueryTemplate(self, beanname, types, includes=None):
+        """Get a template to search objects by some of their attributes.
+
+        The template has a condition ``= :attr`` for each attribute
+        in `types` and ``attr.id = :attr`` for the relations.  It is
+        kept in :attr:`self.queryTemplateCache`.
+        """
+        if includes:
+            includes = frozenset(includes)
+        else:
+            includes = frozenset()
+        key = (beanname, tuple(sorted(types.items())), includes)
+        try:
+            return self.queryTemplateCache[key]
+        except KeyError:
+            pass
+        conditions = {}
+        for a, t in types.items():
+            if t == "id":
+                conditions["%s.id" % a] = "= :%s" % a
+            else:
+                conditions[a] = "= :%s" % a
+        query = Query(self, beanname, conditions=conditions, 
+                      includes=includes)
+        template = query.prepare(**types)
+        self.queryTemplateCache[key] = template
+        return template
+
+    def updateMany(self, beans, workers=4):
+        """Update many objects.
+
+        The ICAT server has no API method to update more then one
+        object in one call.  This method updates each object in a
+        call of its own, but does these calls concurrently using
+        `workers` clones of the client that share the session.  All
+        objects are processed, even if some of the updates fail.  The
+        throughput achieved is logged.
+
+        As with :meth:`icat.client.Client.createMany` and
+        :meth:`icat.client.Client.deleteMany`, the updates are always
+        sent to the server right away, regardless of the number of
+        workers, even if a unit of work is active, see
+        :meth:`icat.client.Client.unitOfWork`.
+
+        :param beans: the objects to update.
+        :type beans: :class:`list` of :class:`icat.entity.Entity`
+        :param workers: the number of concurrent calls.
+        :type workers: :class:`int`
+        :raise BatchCallError: if any update failed.  The error
+            reports each failed object by its index in `beans` along
+            with the error raised by the server.
+        """
+        beans = list(beans)
+        failed = []
+
+        def call(client, i):
+            try:
+                client._update(beans[i])
+            except Exception as e:
+                return i, e
+            else:
+                return i, None
+
+        start = time.time()
+        if workers > 1 and len(beans) > 1:
+            pool = WorkerPool(min(workers, len(beans)), init=self.clone)
+            results = pool.imap(call, range(len(beans)), ordered=False)
+        else:
+            pool = None
+            results = (call(self, i) for i in range(len(beans)))
+        try:
+            for i, e in results:
+                if e is not None:
+                    log.debug("updateMany: object %d failed: %s", i, e)
+                    failed.append((i, i, i+1, e))
+        finally:
+            if pool:
+                pool.close()
+            self._invalidateSearchCache(beans)
+        elapsed = time.time() - start
+        if elapsed > 0:
+            log.info("updateMany: %d objects in %.2f s (%.1f objects/s)",
+                     len(beans), elapsed, len(beans) / elapsed)
+        if failed:
+            raise BatchCallError("updateMany", failed)
+
+    def unitOfWork(self, batchsize=None, workers=1):
+        """Record creates, updates, and deletes and send them in batches.
+
+        Return a context manager.  While it is active, calls to
+        :meth:`icat.client.Client.create`,
+        :meth:`icat.client.Client.update`, and
+        :meth:`icat.client.Client.delete`, including the calls made by
+        the methods of the same name in :class:`icat.entity.Entity`,
+        are recorded rather then sent to the server one by one.
+        :meth:`icat.client.Client.create` returns :const:`None` in
+        this case.  On exit, the objects are created in dependency
+        order in as few calls to :meth:`icat.client.Client.createMany`
+        as possible, their ids are set, then the updates and the
+        deletes are sent.  Nothing is sent if the context is left by
+        an exception.  E.g.::
+
+            with client.unitOfWork():
+                investigation.create()
+                for name in names:
+                    dataset = client.new("dataset", name=name, 
+                                         investigation=investigation,
+                                         type=dstype)
+                    dataset.create()
+
+        creates the investigation and all datasets in two calls.
+
+        :param batchsize: the maximal number of objects per call to
+            create or delete.
+        :type batchsize: :class:`int`
+        :param workers: the number of concurrent calls.
+        :type workers: :class:`int`
+        :return: the unit of work.
+        :rtype: :class:`icat.unitofwork.UnitOfWork`
+        """
+        return UnitOfWork(self, batchsize=batchsize, workers=workers)
 
     def createUser(self, name, search=False, **kwargs):
         """Search a user by name or Create a new user.
@@ -0,0 +1,184 @@
+"""A compact storage for the attributes of entity objects.
+
+By default, each :class:`icat.entity.Entity` object keeps its
+attributes in a :class:`suds.sudsobject.Object`, as created by Suds
+when unmarshalling a reply from the ICAT server.  These objects carry
+a considerable overhead in memory: each of them has a
+:class:`dict` for the attributes, a list of the attribute names, and
+a metadata object.  This module provides records having a fixed set
+of slots for the attributes, generated from the attribute names of
+the entity class.  These may be used instead of the Suds instances
+to store the attributes.  They are used by
+:class:`icat.client.Client` if the `compactEntities` keyword argument
+is set to :const:`True` in the constructor.  The records are only
+converted to Suds instances when they need to be passed in an ICAT
+API call.
+
+**Note**: This module is mostly intended for the internal use in
+python-icat.  Most users will not need to use it directly.
+"""
+
+import suds.sudsobject
+
+__all__ = ['CompactRecord', 'recordClass', 'compactInstance']
+
+
+class CompactRecord(object):
+    """The base class of the records for the entity classes.
+
+    Records mimic :class:`suds.sudsobject.Object` as far as needed
+    to be used as instance in an :class:`icat.entity.Entity` object:
+    attributes that have not been set raise :exc:`AttributeError`
+    and iterating over a record yields pairs of name and value for
+    all attributes set.  The name of each record class is the name
+    of the instance type.
+    """
+
+    __slots__ = ('__weakref__', '__snapshot__')
+
+    Fields = ()
+    """Names of the attributes of the record."""
+    EntityClass = None
+    """The :class:`icat.entity.Entity` class the record is made for."""
+
+    def __iter__(self):
+        for a in self.Fields:
+            try:
+                yield (a, getattr(self, a))
+            except AttributeError:
+                pass
+
+    def _plain(self, memo):
+        """Convert to a plain :class:`suds.sudsobject.Object`, only
+        used to get a string representation.
+        """
+        try:
+            return memo[id(self)]
+        except KeyError:
+            pass
+        obj = suds.sudsobject.Factory.object(self.__class__.__name__)
+        memo[id(self)] = obj
+        for a, v in self:
+            if isinstance(v, CompactRecord):
+                v = v._plain(memo)
+            elif isinstance(v, list):
+                v = [ i._plain(memo) if isinstance(i, CompactRecord) else i
+                      for i in v ]
+            setattr(obj, a, v)
+        return obj
+
+    def __str__(self):
+        return str(self._plain({}))
+
+    def __repr__(self):
+        return str(self)
+
+    def toSuds(self, factory, memo=None):
+        """Convert the record to a Suds instance.
+
+        Related records are converted recursively.
+
+        :param factory: the factory to create the Suds instances.
+            Any object having a `create` method taking the name of the
+            instance type will do, such as the Suds factory of the
+            client.
+        :param memo: a :class:`dict` mapping the ids of records
+            already converted to the resulting instances.
+        :return: the Suds instance.
+        :rtype: :class:`suds.sudsobject.Object`
+        """
+        if memo is None:
+            memo = {}
+        try:
+            return memo[id(self)]
+        except KeyError:
+            pass
+        instance = factory.create(self.__class__.__name__)
+        memo[id(self)] = instance
+        # Discard the tree of dummy related objects the factory might
+        # have created, see icat.client.Client.new().
+        for r in (self.EntityClass.InstRel | self.EntityClass.InstMRel):
+            if hasattr(instance, r):
+                delattr(instance, r)
+        for a, v in self:
+            if isinstance(v, CompactRecord):
+                v = v.toSuds(factory, memo)
+            elif isinstance(v, list):
+                v = [ i.toSuds(factory, memo)
+                      if isinstance(i, CompactRecord) else i for i in v ]
+            setattr(instance, a, v)
+        return instance
+
+
+_recordClasses = {}
+
+def recordClass(typemap, instancetype):
+    """Get the record class for an instance type.
+
+    The record classes are created on first use and cached.
+
+    :param typemap: the typemap of the client, mapping the instance
+        types to the entity classes.
+    :type typemap: :class:`dict`
+    :param instancetype: the name of the instance type.
+    :type instancetype: :class:`str`
+    :return: the record class.
+    :raise TypeError: if the instance type is not a valid entity type.
+    """
+    try:
+        Class = typemap[instancetype]
+    except KeyError:
+        raise TypeError("Invalid instance type '%s'." % instancetype)
+    if Class is None or Class.BeanName is None:
+        raise TypeError("Instance type '%s' is not supported."
+                        % instancetype)
+    key = (instancetype, Class)
+    try:
+        return _recordClasses[key]
+    except KeyError:
+        fields = tuple(sorted(Class.InstAttr | Class.MetaAttr |
+                              Class.InstRel | Class.InstMRel))
+        rclass = type(str(instancetype), (CompactRecord,),
+                      dict(__slots__=fields, Fields=fields,
+                           EntityClass=Class))
+        _recordClasses[key] = rclass
+        return rclass
+
+def compactInstance(typemap, instance, memo=None):
+    """Convert a Suds instance to a record.
+
+    Related instances are converted recursively.  Attributes in the
+    instance not known in the entity class are dropped.
+
+    :param typemap: the typemap of the client, mapping the instance
+        types to the entity classes.
+    :type typemap: :class:`dict`
+    :param instance: the Suds instance.
+    :type instance: :class:`suds.sudsobject.Object`
+    :param memo: a :class:`dict` mapping the ids of instances already
+        converted to the resulting records.
+    :return: the record.
+    :rtype: :class:`icat.compact.CompactRecord`
+    :raise TypeError: if the type of instance is not a valid entity
+        type.
+    """
+    if memo is None:
+        memo = {}
+    try:
+        return memo[id(instance)]
+    except KeyError:
+        pass
+    record = recordClass(typemap, instance.__class__.__name__)()
+    memo[id(instance)] = record
+    fields = record.Fields
+    for a, v in instance:
+        if a not in fields or v is None:
+            continue
+        if isinstance(v, suds.sudsobject.Object):
+            v = compactInstance(typemap, v, memo)
+        elif isinstance(v, list):
+            v = [ compactInstance(typemap, i, memo)
+                  if isinstance(i, suds.sudsobject.Object) else i
+                  for i in v ]
+        setattr(record, a, v)
+    return record
@@ -251,6 +251,9 @@ class Config(object):
         self.add_variable('no_proxy', ("--no-proxy",), 
                           dict(help="list of exclusions for proxy use"),
                           envvar='no_proxy', optional=True)
+        self.add_variable('cacheDir', ("--cache-dir",), 
+                          dict(help="directory to cache server information"),
+                          envvar='ICAT_CACHE_DIR', optional=True)
         if self.needlogin:
             self.add_variable('auth', ("-a", "--auth"), 
                               dict(help="authentication plugin"),
@@ -445,5 +448,7 @@ class Config(object):
             config.client_kwargs['proxy'] = proxy
         if config.no_proxy:
                 os.environ['no_proxy'] = config.no_proxy
+        if config.cacheDir:
+            config.client_kwargs['cacheDir'] = config.cacheDir
 
         return config
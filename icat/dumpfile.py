@@ -152,7 +152,7 @@ class DumpFileWriter(object):
         """Finalize the data file."""
         raise NotImplementedError
 
-    def writeobjs(self, objs, keyindex, chunksize=100):
+    def writeobjs(self, objs, keyindex, chunksize=100, prefetch=0):
         """Write some entity objects to the current data chunk.
 
         The objects are searched from the ICAT server.  The key index
@@ -186,10 +186,15 @@ class DumpFileWriter(object):
         :type keyindex: :class:`dict`
         :param chunksize: tuning parameter, see
             :meth:`icat.client.Client.searchChunked` for details.
-        :type chunksize: :class:`int`
+        :type chunksize: :class:`int` or
+            :class:`icat.chunking.ChunkSize`
+        :param prefetch: tuning parameter, see
+            :meth:`icat.client.Client.searchChunked` for details.
+        :type prefetch: :class:`int`
         """
         if isinstance(objs, Query) or isinstance(objs, basestring):
-            objs = self.client.searchChunked(objs, chunksize=chunksize)
+            objs = self.client.searchChunked(objs, chunksize=chunksize, 
+                                             prefetch=prefetch)
         else:
             objs.sort(key=icat.entity.Entity.__sortkey__)
         for obj in objs:
@@ -209,7 +214,7 @@ class DumpFileWriter(object):
                 k = obj.getUniqueKey(keyindex=keyindex)
             self.writeobj(k, obj, keyindex)
 
-    def writedata(self, objs, keyindex=None, chunksize=100):
+    def writedata(self, objs, keyindex=None, chunksize=100, prefetch=0):
         """Write a data chunk.
 
         :param objs: an iterable that yields either queries to search
@@ -223,13 +228,18 @@ class DumpFileWriter(object):
         :type keyindex: :class:`dict`
         :param chunksize: tuning parameter, see
             :meth:`icat.client.Client.searchChunked` for details.
-        :type chunksize: :class:`int`
+        :type chunksize: :class:`int` or
+            :class:`icat.chunking.ChunkSize`
+        :param prefetch: tuning parameter, see
+            :meth:`icat.client.Client.searchChunked` for details.
+        :type prefetch: :class:`int`
         """
         if keyindex is None:
             keyindex = {}
         self.startdata()
         for o in objs:
-            self.writeobjs(o, keyindex, chunksize=chunksize)
+            self.writeobjs(o, keyindex, chunksize=chunksize, 
+                           prefetch=prefetch)
 
 
 # ------------------------------------------------------------
@@ -5,12 +5,78 @@ import re
 from warnings import warn
 import suds.sudsobject
 from icat.listproxy import ListProxy
+from icat.compact import CompactRecord
 from icat.exception import InternalError, DataConsistencyError
 from icat.helper import simpleqp_quote
 
 __all__ = ['Entity']
 
 
+# Kinds of attributes in the dispatch table of the entity classes.
+_SELF, _ATTR, _META, _REL, _MREL = range(5)
+
+_dispatchSources = frozenset(['SelfAttr', 'InstAttr', 'MetaAttr', 
+                              'InstRel', 'InstMRel', 'AttrAlias'])
+"""Class attributes that the dispatch table is derived from."""
+
+def _attrDispatch(cls):
+    """Build the dispatch table of an entity class.
+
+    Map each attribute name to a tuple of the kind of the attribute
+    and the name of the attribute in the instance.  Aliases are
+    resolved to the kind and the name of the attribute they refer to.
+    Precedence among names listed in more then one of the class
+    attributes follows the order in which these have been tested
+    before the dispatch table has been introduced.
+    """
+    dispatch = {}
+    for kind, names in ((_MREL, cls.InstMRel), (_REL, cls.InstRel), 
+                        (_META, cls.MetaAttr), (_ATTR, cls.InstAttr), 
+                        (_SELF, cls.SelfAttr)):
+        for a in names:
+            dispatch[a] = (kind, a)
+    for alias in cls.AttrAlias:
+        if alias in dispatch:
+            continue
+        a = alias
+        seen = set()
+        while a in cls.AttrAlias and a not in seen:
+            seen.add(a)
+            a = cls.AttrAlias[a]
+        if a in dispatch:
+            dispatch[alias] = dispatch[a]
+    return dispatch
+
+
+class EntityType(type):
+    """The metaclass of :class:`icat.entity.Entity`.
+
+    Maintain a dispatch table in each entity class, mapping the
+    attribute names to the kind of attribute, so that the attribute
+    access in the entity objects needs only one dictionary lookup.
+    The table is rebuilt if any of the class attributes it is derived
+    from is changed.  The same holds for the list of the attributes
+    taken into account in the snapshot of an object's state.
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super(EntityType, cls).__init__(name, bases, namespace)
+        cls._updateDispatch()
+
+    def __setattr__(cls, attr, value):
+        super(EntityType, cls).__setattr__(attr, value)
+        if attr in _dispatchSources:
+            cls._updateDispatch()
+
+    def _updateDispatch(cls):
+        type.__setattr__(cls, '_AttrDispatch', _attrDispatch(cls))
+        type.__setattr__(cls, '_StateAttrs', 
+                         (tuple(sorted(cls.InstAttr)), 
+                          tuple(sorted(cls.InstRel))))
+        for sub in cls.__subclasses__():
+            sub._updateDispatch()
+
+
 class Entity(object):
     """The base of the classes representing the entities in the ICAT schema.
 
@@ -24,14 +90,18 @@ class Entity(object):
     schema.  Entity objects mimic the behavior of the corresponding
     instance.  Attribute accesses are proxied to the instance.  A
     transparent conversion between Entity objects and Suds instances
-    is performed where appropriate.
+    is performed where appropriate.  Alternatively, the instance may
+    be an :class:`icat.compact.CompactRecord`, see
+    :attr:`icat.client.Client.compactEntities`.
     """
+    __metaclass__ = EntityType
     BeanName = None
     """Name of the entity in the ICAT schema, :const:`None` for abstract
     classes."""
     Constraint = ('id',)
     """Attribute or relation names that form a uniqueness constraint."""
-    SelfAttr = frozenset(['client', 'instance', 'validate'])
+    SelfAttr = frozenset(['client', 'instance', 'validate', 
+                          '_resultGroup', '_accessPath'])
     """Attributes stored in the Entity object itself."""
     InstAttr = frozenset(['id'])
     """Attributes of the entity in the ICAT schema, stored in the instance."""
@@ -53,13 +123,20 @@ class Entity(object):
     at the ICAT server.  The function is expected to raise an
     exception (preferably ValueError) in case of validation errors.
     """
+    _resultGroup = None
+    """The :class:`icat.lazyload.ResultGroup` this object belongs to,
+    if any."""
+    _accessPath = None
+    """The search and the path of relations this object has been
+    reached by, if recorded by an
+    :class:`icat.includeadvisor.IncludeAdvisor`."""
 
     @classmethod
     def getInstance(cls, obj):
         """Get the corresponding instance from an object."""
         if obj is None:
             return None
-        elif isinstance(obj, suds.sudsobject.Object):
+        elif isinstance(obj, (suds.sudsobject.Object, CompactRecord)):
             return obj
         elif isinstance(obj, Entity):
             return obj.instance
@@ -151,6 +228,49 @@ class Entity(object):
         return order
 
 
+    @classmethod
+    def _getState(cls, instance):
+        """Get the state of an instance to be kept in a snapshot.
+
+        This is a tuple of the values of the attributes and the ids
+        of the related objects.
+        """
+        attrs, rels = cls._StateAttrs
+        state = [ getattr(instance, a, None) for a in attrs ]
+        for r in rels:
+            v = getattr(instance, r, None)
+            if v is not None and getattr(v, 'id', None) is not None:
+                v = v.id
+            state.append(v)
+        return tuple(state)
+
+    @classmethod
+    def _takeSnapshot(cls, instance):
+        """Keep the current state of an instance as the state known
+        to be stored in the ICAT server.
+        """
+        instance.__snapshot__ = cls._getState(instance)
+
+    @classmethod
+    def _hasSnapshot(cls, instance):
+        return getattr(instance, '__snapshot__', None) is not None
+
+    @classmethod
+    def _updateSnapshot(cls, instance, attr):
+        """Set the value of one attribute in the snapshot of an
+        instance, if any, to the current one.
+        """
+        snapshot = getattr(instance, '__snapshot__', None)
+        if snapshot is not None:
+            attrs, rels = cls._StateAttrs
+            names = attrs + rels
+            if attr in names:
+                i = names.index(attr)
+                state = list(snapshot)
+                state[i] = cls._getState(instance)[i]
+                instance.__snapshot__ = tuple(state)
+
+
     def __init__(self, client, instance, **kwargs):
         super(Entity, self).__init__()
         self.client = client
@@ -160,11 +280,31 @@ class Entity(object):
 
 
     def __getattr__(self, attr):
-        if attr in self.InstAttr or attr in self.MetaAttr:
+        try:
+            kind, attr = self._AttrDispatch[attr]
+        except KeyError:
+            if attr == 'instancetype':
+                return self.instance.__class__.__name__
+            raise AttributeError("%s object has no attribute %s" % 
+                                 (type(self).__name__, attr))
+        if kind == _ATTR or kind == _META:
             return getattr(self.instance, attr, None)
-        elif attr in self.InstRel:
-            return self.client.new(getattr(self.instance, attr, None))
-        elif attr in self.InstMRel:
+        elif kind == _REL:
+            if self._resultGroup is None and self._accessPath is None:
+                return self.client.new(getattr(self.instance, attr, None))
+            tag = self._accessRelation(attr)
+            obj = self.client.new(getattr(self.instance, attr, None))
+            if obj is not None:
+                if self._resultGroup is not None:
+                    obj._resultGroup = self._resultGroup.getChild(attr)
+                if tag is not None:
+                    self._accessPath[0].tagRelated(obj, tag[1:])
+            return obj
+        elif kind == _MREL:
+            if self._resultGroup is None and self._accessPath is None:
+                tag = None
+            else:
+                tag = self._accessRelation(attr)
             if not hasattr(self.instance, attr):
                 # The list of objects in this one to many relation is
                 # not present in the instance object.  There are two
@@ -179,45 +319,59 @@ class Entity(object):
                 # the two cases, see ICAT Issue 130.
                 setattr(self.instance, attr, [])
             l = EntityList(self.client, getattr(self.instance, attr))
+            if tag is not None:
+                l.accessPath = tag
             super(Entity, self).__setattr__(attr, l)
             return l
-        elif attr == 'instancetype':
-            return self.instance.__class__.__name__
-        elif attr in self.AttrAlias:
-            return self.__getattr__(self.AttrAlias[attr])
         else:
             raise AttributeError("%s object has no attribute %s" % 
                                  (type(self).__name__, attr))
 
+    def _accessRelation(self, attr):
+        """Prepare the access to a relation in an object belonging to a
+        result group or being recorded by an include advisor.
+
+        Load the relation for the result group if needed and record
+        the access.  Return the tag for the related objects, being a
+        tuple of the advisor, the search, and the path, or
+        :const:`None` if not recorded.
+        """
+        present = hasattr(self.instance, attr)
+        ncalls = 0
+        if not present and self._resultGroup is not None:
+            ncalls = self._resultGroup.load(self, attr)
+        if self._accessPath is None:
+            return None
+        advisor = self._accessPath[0]
+        return (advisor,) + advisor.access(self, attr, present, ncalls)
+
     def __setattr__(self, attr, value):
-        if attr in self.SelfAttr:
-            super(Entity, self).__setattr__(attr, value)
-        elif attr in self.InstAttr:
-            setattr(self.instance, attr, value)
-        elif attr in self.InstRel:
-            setattr(self.instance, attr, self.getInstance(value))
-        elif attr in self.InstMRel:
-            setattr(self.instance, attr, [])
-            l = EntityList(self.client, getattr(self.instance, attr))
-            super(Entity, self).__setattr__(attr, l)
+        kind, name = self._AttrDispatch.get(attr, (None, None))
+        if kind == _ATTR:
+            setattr(self.instance, name, value)
+        elif kind == _SELF:
+            super(Entity, self).__setattr__(name, value)
+        elif kind == _REL:
+            setattr(self.instance, name, self.getInstance(value))
+        elif kind == _MREL:
+            setattr(self.instance, name, [])
+            l = EntityList(self.client, getattr(self.instance, name))
+            super(Entity, self).__setattr__(name, l)
             l.extend(value)
-        elif attr in self.AttrAlias:
-            setattr(self, self.AttrAlias[attr], value)
         else:
             raise AttributeError("%s object cannot set attribute '%s'" %
                                  (type(self).__name__, attr))
 
     def __delattr__(self, attr):
-        if attr in (self.InstAttr | self.InstRel):
-            if hasattr(self.instance, attr):
-                delattr(self.instance, attr)
-        elif attr in self.InstMRel:
-            if attr in self.__dict__:
-                super(Entity, self).__delattr__(attr)
-            if hasattr(self.instance, attr):
-                delattr(self.instance, attr)
-        elif attr in self.AttrAlias:
-            delattr(self, self.AttrAlias[attr])
+        kind, name = self._AttrDispatch.get(attr, (None, None))
+        if kind == _ATTR or kind == _REL:
+            if hasattr(self.instance, name):
+                delattr(self.instance, name)
+        elif kind == _MREL:
+            if name in self.__dict__:
+                super(Entity, self).__delattr__(name)
+            if hasattr(self.instance, name):
+                delattr(self.instance, name)
         else:
             raise AttributeError("%s object cannot delete attribute '%s'" %
                                  (type(self).__name__, attr))
@@ -404,6 +558,7 @@ class Entity(object):
         ICAT.
         """ 
         self.id = self.client.create(self)
+        self._takeSnapshot(self.instance)
 
     def update(self):
         """Call :meth:`icat.client.Client.update` to update the object in the
@@ -411,6 +566,29 @@ class Entity(object):
         """ 
         self.client.update(self)
 
+    def getModifiedAttrs(self):
+        """Get the attributes that have been modified.
+
+        Compare the attributes and the ids of the related objects in
+        the many to one relations with the snapshot taken when the
+        object has been retrieved from the ICAT server or has last
+        been created or updated.  Objects retrieved by
+        :meth:`icat.client.Client.search` or
+        :meth:`icat.client.Client.get` have such a snapshot, related
+        objects included in these do not.
+
+        :return: the names of the attributes and relations modified
+            or :const:`None` if there is no snapshot.
+        :rtype: :class:`frozenset` of :class:`str`
+        """
+        snapshot = getattr(self.instance, '__snapshot__', None)
+        if snapshot is None:
+            return None
+        state = self._getState(self.instance)
+        attrs, rels = self._StateAttrs
+        return frozenset(a for (a, old, new) in 
+                         zip(attrs + rels, snapshot, state) if old != new)
+
     def get(self, query=None):
         """Call :meth:`icat.client.Client.get` to get the object from the
         ICAT.
@@ -441,13 +619,20 @@ class EntityList(ListProxy):
     def __init__(self, client, instancelist):
         super(EntityList, self).__init__(instancelist)
         self.client = client
+        self.accessPath = None
+
+    def _getEntity(self, item):
+        obj = self.client.getEntity(item)
+        if self.accessPath is not None:
+            self.accessPath[0].tagRelated(obj, self.accessPath[1:])
+        return obj
 
     def __getitem__(self, index):
         item = super(EntityList, self).__getitem__(index)
         if isinstance(index, slice):
-            return map(lambda i: self.client.getEntity(i), item)
+            return map(self._getEntity, item)
         else:
-            return self.client.getEntity(item)
+            return self._getEntity(item)
 
     def __setitem__(self, index, value):
         if isinstance(index, slice):
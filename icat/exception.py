@@ -26,6 +26,7 @@ __all__ = [
     # icat.client, icat.entity
     'ClientVersionWarning', 'ICATDeprecationWarning', 'VersionMethodError', 
     'SearchResultError', 'SearchAssertionError', 'DataConsistencyError', 
+    'BatchCallError', 
     # icat.ids
     'IDSResponseError', 
     # icat.icatcheck
@@ -364,6 +365,78 @@ class DataConsistencyError(Exception):
     """Some data is not consistent with rules or constraints."""
     pass
 
+class BatchCallError(Exception):
+    """A batch failed in a call split into batches.
+
+    This exception is raised by :meth:`icat.client.Client.createMany`
+    and :meth:`icat.client.Client.deleteMany` if called with a batch
+    size.  The ICAT server processes each batch in a transaction of
+    its own, so the failed batch has been rolled back as a whole,
+    while all other batches submitted have been committed.  No
+    further batches are submitted after a failure.
+
+    It is also raised by :meth:`icat.client.Client.updateMany`,
+    where each object is a batch of its own.  In this case, all
+    objects are processed, regardless of failures.
+
+    .. attribute:: error
+
+        the exception raised by the failed batch.
+
+    .. attribute:: batch
+
+        the number of the failed batch, counting from zero.
+
+    .. attribute:: start
+
+        the index of the first object of the failed batch in the
+        list of objects passed to the call.
+
+    .. attribute:: end
+
+        the index after the last object of the failed batch.
+
+    .. attribute:: index
+
+        the index of the object that caused the error in the list of
+        objects passed to the call or :const:`None` if not known.
+
+    .. attribute:: failed
+
+        a list of tuples (batch, start, end, error) for all batches
+        that failed.  If the batches are submitted concurrently, more
+        then one may fail.
+
+    .. attribute:: result
+
+        the list of ids of the objects created so far in the order of
+        the objects passed to the call, having :const:`None` for the
+        objects not created, or :const:`None` for calls that do not
+        return anything.
+    """
+    def __init__(self, method, failed, result=None):
+        failed = sorted(failed, key=lambda f: f[0])
+        batch, start, end, error = failed[0]
+        offset = getattr(error, 'offset', None)
+        if offset is None and end - start == 1:
+            offset = 0
+        if offset is not None:
+            index = start + offset
+            msg = ("%s: batch %d (objects %d to %d) failed at object %d: %s"
+                   % (method, batch, start, end - 1, index, error))
+        else:
+            index = None
+            msg = ("%s: batch %d (objects %d to %d) failed: %s"
+                   % (method, batch, start, end - 1, error))
+        super(BatchCallError, self).__init__(msg)
+        self.error = error
+        self.batch = batch
+        self.start = start
+        self.end = end
+        self.index = index
+        self.failed = failed
+        self.result = result
+
 
 # ================= Exceptions raised in icat.ids ==================
 
@@ -30,9 +30,18 @@ True
 {'visitId': '1', 'name': '2010=2DE2=2D0489=2D1', 'facility': 'name-ESNF'}
 >>> parse_attr_val(d['facility'])
 {'name': 'ESNF'}
+>>> c = parse_jpql_clauses("SELECT o FROM User o WHERE o.name LIKE 'j%' "
+...                        "ORDER BY o.name LIMIT 0, 10")
+>>> c['SELECT']
+'SELECT o FROM User o'
+>>> c['WHERE']
+"o.name LIKE 'j%'"
+>>> c['LIMIT']
+'0, 10'
 """
 
 import sys
+import re
 import datetime
 import suds.sax.date
 
@@ -225,3 +234,63 @@ def ms_timestamp(dt):
             ts = (1000 * (td.seconds + td.days * 24 * 3600) 
                   + td.microseconds / 1000)
     return int(ts)
+
+
+_jpql_keyword = re.compile(r"\b(WHERE|ORDER\s+BY|INCLUDE|LIMIT)\b", 
+                           re.IGNORECASE)
+
+def parse_jpql_clauses(query):
+    """Split a JPQL style search expression into its top level clauses.
+
+    Return a dict having the keys ``SELECT``, ``WHERE``, ``ORDER BY``,
+    ``INCLUDE``, and ``LIMIT``.  The value for ``SELECT`` is the
+    beginning of the query up to the first of the other clauses,
+    e.g. the select expression, the FROM clause and the JOINs.  The
+    other values are the content of the respective clauses, without
+    the keywords, or :const:`None` if the clause is not present.
+    Keywords inside quoted strings or inside parenthesis,
+    e.g. subqueries, are not taken into account.
+
+    :param query: the search expression.
+    :type query: :class:`str`
+    :return: the clauses of the query.
+    :rtype: :class:`dict`
+    :raise ValueError: if the query does not start with SELECT or if
+        any of the clauses is present more then once.
+    """
+    if not query[:7].upper().startswith("SELECT "):
+        raise ValueError("Not a JPQL style query: '%s'" % query)
+    marks = []
+    depth = 0
+    inquote = False
+    i = 0
+    while i < len(query):
+        c = query[i]
+        if inquote:
+            if c == "'":
+                inquote = False
+        elif c == "'":
+            inquote = True
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif depth == 0 and query[i-1] != '.':
+            m = _jpql_keyword.match(query, i)
+            if m:
+                kw = " ".join(m.group(1).upper().split())
+                marks.append((kw, m.start(), m.end()))
+                i = m.end()
+                continue
+        i += 1
+    clauses = dict.fromkeys(['WHERE', 'ORDER BY', 'INCLUDE', 'LIMIT'])
+    end = marks[0][1] if marks else len(query)
+    clauses['SELECT'] = query[:end].strip()
+    for n, (kw, start, end) in enumerate(marks):
+        if clauses[kw] is not None:
+            raise ValueError("Duplicate %s clause in '%s'" % (kw, query))
+        if n + 1 < len(marks):
+            clauses[kw] = query[end:marks[n+1][1]].strip()
+        else:
+            clauses[kw] = query[end:].strip()
+    return clauses
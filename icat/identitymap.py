@@ -0,0 +1,172 @@
+"""An identity map for entity objects.
+
+This module provides :class:`icat.identitymap.IdentityMap` that is
+used by :class:`icat.client.Client` if the `identityMap` keyword
+argument is set to :const:`True` in the constructor.  The client
+then keeps track of the entity objects and the Suds instances it has
+seen, keyed by the entity type and the id.  All occurrences of the
+same object in search results, including the related objects
+included in the results, are represented by one single Suds instance
+and the client returns one single :class:`icat.entity.Entity` object
+for it as long as it is in use.  This saves memory in large search
+results having many references to the same related objects, e.g. in
+a list of datafiles including ``dataset.investigation.facility``.
+"""
+
+import threading
+import weakref
+import suds.sudsobject
+from icat.compact import CompactRecord
+
+__all__ = ['IdentityMap']
+
+_instanceTypes = (suds.sudsobject.Object, CompactRecord)
+
+
+class IdentityMap(object):
+    """Map the entity type and id to one single object.
+
+    Both maps hold weak references only, an object is dropped from
+    the map as soon as it is not used anywhere else any more.
+
+    Each instance passed to
+    :meth:`icat.identitymap.IdentityMap.getInstance` for an object
+    already known is merged into the one known before: the attribute
+    values and the related objects in the new instance, that are
+    assumed to be the more recent state retrieved from the server,
+    replace the ones in the known instance.  Related objects not
+    present in the new instance, because they have not been included
+    in the search, are kept.  Note that this also replaces any
+    changes made locally to an entity object, that have not yet been
+    sent to the server, if the same object is retrieved again.  The
+    snapshot of the known instance, if any, is taken anew, see
+    :meth:`icat.entity.Entity.getModifiedAttrs`.
+
+    The map is thread safe and may be shared by the clones of a
+    client.
+
+    :param typemap: the typemap of the client, mapping the instance
+        types to the entity classes.
+    :type typemap: :class:`dict`
+    """
+
+    def __init__(self, typemap):
+        super(IdentityMap, self).__init__()
+        self.typemap = typemap
+        self.instances = weakref.WeakValueDictionary()
+        self.entities = weakref.WeakValueDictionary()
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.instances)
+
+    def __repr__(self):
+        return ("<IdentityMap instances=%d entities=%d>"
+                % (len(self.instances), len(self.entities)))
+
+    def _getKey(self, instance):
+        """Return the key and the entity class for an instance.  The
+        key is :const:`None` if the instance has no id.
+        """
+        id = getattr(instance, 'id', None)
+        if id is None:
+            return (None, None)
+        try:
+            Class = self.typemap[instance.__class__.__name__]
+        except KeyError:
+            return (None, None)
+        if Class is None or Class.BeanName is None:
+            return (None, None)
+        return ((Class.BeanName, id), Class)
+
+    def _merge(self, instance):
+        """Replace all related instances in instance by the known ones
+        and merge instance into the known one.
+        """
+        key, Class = self._getKey(instance)
+        if key is not None:
+            known = self.instances.get(key)
+            if known is instance:
+                # This instance has been processed before.
+                return instance
+        else:
+            known = None
+        for attr, value in instance:
+            if isinstance(value, _instanceTypes):
+                setattr(instance, attr, self._merge(value))
+            elif (isinstance(value, list) and value and
+                  isinstance(value[0], _instanceTypes)):
+                value[:] = [ self._merge(v) for v in value ]
+        if key is None:
+            return instance
+        if known is None:
+            self.instances[key] = instance
+            return instance
+        for attr, value in instance:
+            knownvalue = getattr(known, attr, None)
+            if isinstance(value, list) and isinstance(knownvalue, list):
+                # Keep the list object, it may be referenced by an
+                # EntityList.
+                knownvalue[:] = value
+            else:
+                setattr(known, attr, value)
+        if Class._hasSnapshot(known):
+            Class._takeSnapshot(known)
+        return known
+
+    def getInstance(self, instance):
+        """Get the known instance for an object.
+
+        Search instance and all related instances in the map.  Each
+        instance found is merged into the known one and replaced by
+        it in the tree of related instances.  The other instances
+        are added to the map.
+
+        :param instance: an instance as retrieved from the server.
+        :type instance: :class:`suds.sudsobject.Object`
+        :return: the known instance for the object, or instance
+            itself if it has not been known before or if it does not
+            have an id.
+        :rtype: :class:`suds.sudsobject.Object`
+        """
+        with self.lock:
+            return self._merge(instance)
+
+    def getEntity(self, instance):
+        """Get the known entity object for an instance.
+
+        :param instance: an instance as returned by
+            :meth:`icat.identitymap.IdentityMap.getInstance`.
+        :type instance: :class:`suds.sudsobject.Object`
+        :return: the entity object wrapping instance or :const:`None`
+            if not known.
+        :rtype: :class:`icat.entity.Entity`
+        """
+        key, Class = self._getKey(instance)
+        if key is None:
+            return None
+        obj = self.entities.get(key)
+        if obj is not None and obj.instance is instance:
+            return obj
+        else:
+            return None
+
+    def addEntity(self, obj):
+        """Add an entity object to the map.
+
+        :param obj: the entity object.  Only objects having an id
+            are added.
+        :type obj: :class:`icat.entity.Entity`
+        """
+        key, Class = self._getKey(obj.instance)
+        if key is not None:
+            with self.lock:
+                self.instances.setdefault(key, obj.instance)
+                self.entities[key] = obj
+
+    def clear(self):
+        """Remove all objects from the map.
+        """
+        with self.lock:
+            self.instances.clear()
+            self.entities.clear()
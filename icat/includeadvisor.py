@@ -0,0 +1,366 @@
+"""Record the access to related objects in search results.
+
+This module provides :class:`icat.includeadvisor.IncludeAdvisor`
+that may be passed as keyword argument `includeAdvisor` to the
+constructor of :class:`icat.client.Client`.  The entity objects in
+the results of :meth:`icat.client.Client.search` are then tagged
+with the search they came from and each access to a related object
+is recorded along with the path of relations it has been reached
+by, together with the calls to the server that were needed to get
+related objects that have not been included in the search: lazy
+loading, see :class:`icat.lazyload.ResultGroup`, and calls to
+:meth:`icat.client.Client.get` for objects reached this way.  At the
+end of a run, :meth:`icat.includeadvisor.IncludeAdvisor.report`
+tells which paths should be added to the INCLUDE clause of which
+search, e.g. with :meth:`icat.query.Query.addIncludes`, to save the
+most calls, and which of the included paths have not been used at
+all.
+"""
+
+from collections import namedtuple, OrderedDict
+import re
+import threading
+from icat.query import Query
+from icat.helper import parse_jpql_clauses
+
+__all__ = ['PathStats', 'Advice', 'IncludeAdvisor']
+
+
+_select = re.compile(r"SELECT\s+(?:DISTINCT\s+)?(\w+)\s+FROM\s+(\w+)\s+(\w+)",
+                     re.IGNORECASE)
+_beanname = re.compile(r"\s*(\w+)")
+_include1 = re.compile(r"\bINCLUDE\s+1\s*$", re.IGNORECASE)
+_includeitem = re.compile(r"(\w+)\.(\w+)(?:\s+AS\s+(\w+))?$", re.IGNORECASE)
+
+def _parseQuery(query):
+    """Get the entity type and the included paths from a query.
+
+    Return a tuple of the name of the entity type and the included
+    paths as a :class:`frozenset` or :const:`None` if these cannot
+    be determined.
+    """
+    if isinstance(query, Query):
+        return (query.entity.BeanName, frozenset(query.includes))
+    query = unicode(query)
+    try:
+        clauses = parse_jpql_clauses(query)
+    except ValueError:
+        # Not a JPQL style query, but a concise one, such as
+        # "Dataset INCLUDE 1".
+        beanname = _beanname.match(query).group(1)
+        if _include1.search(query):
+            return (beanname, frozenset(["1"]))
+        elif re.search(r"\bINCLUDE\b", query, re.IGNORECASE):
+            return (beanname, None)
+        else:
+            return (beanname, frozenset())
+    m = _select.match(clauses['SELECT'])
+    if not m:
+        return (None, None)
+    var, beanname, rootvar = m.groups()
+    if not clauses['INCLUDE']:
+        return (beanname, frozenset())
+    if clauses['INCLUDE'].strip() == "1":
+        return (beanname, frozenset(["1"]))
+    aliases = { rootvar: "" }
+    includes = set()
+    for item in clauses['INCLUDE'].split(","):
+        m = _includeitem.match(item.strip())
+        if not m or m.group(1) not in aliases:
+            return (beanname, None)
+        parent, attr, alias = m.groups()
+        path = aliases[parent] + "." + attr if aliases[parent] else attr
+        includes.add(path)
+        if alias:
+            aliases[alias] = path
+    return (beanname, frozenset(includes))
+
+def _isCovered(includes, path, toplevel):
+    """Tell whether the path is included.  `toplevel` is true for many
+    to one relations of the objects in the search result.
+    """
+    if includes is None:
+        return False
+    if path in includes or (toplevel and "1" in includes):
+        return True
+    prefix = path + "."
+    return any(i.startswith(prefix) for i in includes)
+
+
+class PathStats(object):
+    """Statistics on the access to related objects along one path.
+    """
+
+    def __init__(self, covered):
+        self.covered = covered
+        """Flag whether the path is included in the search."""
+        self.accesses = 0
+        """Number of accesses."""
+        self.uncovered = 0
+        """Number of accesses to relations not included in the search."""
+        self.roundTrips = 0
+        """Number of calls to the server to get the related objects."""
+
+    def __repr__(self):
+        return ("<PathStats accesses=%d uncovered=%d roundTrips=%d>"
+                % (self.accesses, self.uncovered, self.roundTrips))
+
+
+Advice = namedtuple('Advice', ['entity', 'includes', 'path',
+                               'roundTrips', 'uncovered'])
+"""An advice to add a path to the INCLUDE clause of a search.
+
+The search is identified by the name of the entity type searched
+for and the set of paths included, which is :const:`None` if it
+could not be determined from the query.
+"""
+
+
+class IncludeAdvisor(object):
+    """Record the access to related objects in search results.
+
+    The searches are identified by the entity type searched for and
+    the set of paths included, so that searches only differing in
+    their conditions or limits are counted together.  Related
+    objects are recorded along many to one relations and one to many
+    relations, with the path of relation names from the object in
+    the search result, e.g. ``investigationUsers.user`` for a search
+    of investigations.  Only the objects in search results and the
+    related objects reached from these are recorded, not the objects
+    created with :meth:`icat.client.Client.new`.
+
+    In order to count the calls to :meth:`icat.client.Client.get`
+    for objects reached by a search, the advisor remembers the search
+    and path for the `maxseen` most recently tagged objects.  Calls
+    to get older objects are not counted.
+
+    The advisor is thread safe and may be shared by several clients.
+
+    :param maxseen: maximal number of objects to remember.
+    :type maxseen: :class:`int`
+    """
+
+    def __init__(self, maxseen=100000):
+        super(IncludeAdvisor, self).__init__()
+        self.maxseen = maxseen
+        self.searches = {}
+        """Map the searches to a :class:`dict` mapping the paths of
+        related objects accessed to :class:`icat.includeadvisor.PathStats`.
+        """
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<IncludeAdvisor searches=%d>" % len(self.searches)
+
+    def clear(self):
+        """Discard all recorded data.
+        """
+        with self.lock:
+            self.searches.clear()
+            self.seen.clear()
+
+    def _tag(self, obj, tag):
+        obj._accessPath = (self,) + tag
+        id = getattr(obj.instance, 'id', None)
+        if id is not None:
+            key = (obj.instance.__class__.__name__.lower(), id)
+            with self.lock:
+                # Reinsert the entry to mark it as most recently used.
+                self.seen.pop(key, None)
+                self.seen[key] = tag + (type(obj),)
+                while len(self.seen) > self.maxseen:
+                    self.seen.popitem(last=False)
+
+    def _getStats(self, search, path, toplevel):
+        """Get the statistics for a path, the lock must be held.
+        """
+        stats = self.searches[search].get(path)
+        if stats is None:
+            covered = _isCovered(search[1], path, toplevel)
+            stats = self.searches[search][path] = PathStats(covered)
+        return stats
+
+    def searchResult(self, query, objs):
+        """Record a search result.
+
+        Tag the entity objects in the result with the search.
+
+        :param query: the search query.
+        :type query: :class:`icat.query.Query` or :class:`str`
+        :param objs: the search result.  Items that are not entity
+            objects are ignored.
+        :type objs: :class:`list`
+        """
+        search = None
+        for obj in objs:
+            if getattr(obj, 'BeanName', None) is None:
+                continue
+            if search is None:
+                beanname, includes = _parseQuery(query)
+                search = (beanname or obj.BeanName, includes)
+                with self.lock:
+                    self.searches.setdefault(search, {})
+            self._tag(obj, (search, ""))
+
+    def access(self, obj, attr, present, roundTrips=0):
+        """Record the access to a relation in a tagged object.
+
+        :param obj: the object.
+        :type obj: :class:`icat.entity.Entity`
+        :param attr: the name of the relation.
+        :type attr: :class:`str`
+        :param present: flag whether the relation has been present in
+            the object before the access.
+        :type present: :class:`bool`
+        :param roundTrips: the number of calls to the server made to
+            get the relation.
+        :type roundTrips: :class:`int`
+        :return: the search and the path for the related objects.
+        :rtype: :class:`tuple`
+        """
+        advisor, search, path = obj._accessPath
+        path = path + "." + attr if path else attr
+        toplevel = "." not in path and attr in obj.InstRel
+        with self.lock:
+            stats = self._getStats(search, path, toplevel)
+            stats.accesses += 1
+            if not stats.covered:
+                stats.uncovered += 1
+            stats.roundTrips += roundTrips
+        return (search, path)
+
+    def tagRelated(self, obj, tag):
+        """Tag a related object with the search and path it has been
+        reached by.
+
+        :param obj: the related object.
+        :type obj: :class:`icat.entity.Entity`
+        :param tag: the search and the path as returned by
+            :meth:`icat.includeadvisor.IncludeAdvisor.access`.
+        :type tag: :class:`tuple`
+        """
+        if obj is not None:
+            self._tag(obj, tag)
+
+    def get(self, query, id):
+        """Record a call to :meth:`icat.client.Client.get`.
+
+        If the object has been seen before in a search result or as a
+        related object, count the call as a round trip for each path
+        included in the query, relative to the path of the object.
+        ``INCLUDE 1`` counts for all many to one relations of the
+        object.  A call without INCLUDE counts for the path of the
+        object itself.
+
+        :param query: the query passed to get.
+        :type query: :class:`icat.query.Query` or :class:`str`
+        :param id: the id of the object.
+        :type id: :class:`int`
+        """
+        beanname, includes = _parseQuery(query)
+        if beanname is None:
+            return
+        with self.lock:
+            tag = self.seen.get((beanname.lower(), id))
+            if tag is None:
+                return
+            search, path, Class = tag
+            if includes is None or not includes:
+                rels = [""]
+            elif "1" in includes:
+                rels = sorted(Class.InstRel)
+            else:
+                rels = sorted(includes)
+            for r in rels:
+                p = ".".join(filter(None, [path, r]))
+                if p:
+                    toplevel = not path and r in Class.InstRel
+                    self._getStats(search, p, toplevel).roundTrips += 1
+
+    def advise(self, minimum=1):
+        """Get the paths that should be included in searches.
+
+        Paths already included are not reported.
+
+        :param minimum: only report paths that would have saved at
+            least this number of round trips.  If zero, also report
+            paths that have been accessed without being included, but
+            did not take any round trip.
+        :type minimum: :class:`int`
+        :return: the advice, the paths saving the most round trips
+            first.
+        :rtype: :class:`list` of :class:`icat.includeadvisor.Advice`
+        """
+        advice = []
+        with self.lock:
+            for (entity, includes), paths in self.searches.items():
+                for path, stats in paths.items():
+                    if stats.covered:
+                        continue
+                    if not stats.uncovered and not stats.roundTrips:
+                        continue
+                    if stats.roundTrips < minimum:
+                        continue
+                    advice.append(Advice(entity, includes, path,
+                                         stats.roundTrips, stats.uncovered))
+        advice.sort(key=lambda a: (-a.roundTrips, -a.uncovered,
+                                   a.entity, a.path))
+        return advice
+
+    def unusedIncludes(self):
+        """Get the included paths that have never been accessed.
+
+        :return: a :class:`dict` mapping the searches, as tuples of
+            the entity type and the included paths, to the set of
+            included paths not accessed.
+        :rtype: :class:`dict`
+        """
+        unused = {}
+        with self.lock:
+            for search, paths in self.searches.items():
+                includes = search[1]
+                if not includes:
+                    continue
+                accessed = set(p for p, s in paths.items() if s.accesses)
+                u = set(i for i in includes if i != "1" and i not in accessed)
+                if u:
+                    unused[search] = u
+        return unused
+
+    def report(self, minimum=1):
+        """Format the advice and the unused includes as text.
+
+        :param minimum: see :meth:`icat.includeadvisor.IncludeAdvisor.advise`.
+        :type minimum: :class:`int`
+        :return: the report.
+        :rtype: :class:`str`
+        """
+        def searchname(entity, includes):
+            if includes is None:
+                return "%s (INCLUDE unknown)" % entity
+            elif includes:
+                return ("%s (INCLUDE %s)" 
+                        % (entity, ", ".join(sorted(includes))))
+            else:
+                return entity
+
+        lines = []
+        advice = self.advise(minimum)
+        if advice:
+            lines.append("Paths to add to the INCLUDE clause:")
+            for a in advice:
+                lines.append("  %s: %s: %d round trips, %d accesses not "
+                             "included" % (searchname(a.entity, a.includes),
+                                           a.path, a.roundTrips, a.uncovered))
+        unused = self.unusedIncludes()
+        if unused:
+            lines.append("Included paths never accessed:")
+            for (entity, includes), paths in sorted(
+                    unused.items(), 
+                    key=lambda i: (i[0][0], sorted(i[0][1] or []))):
+                lines.append("  %s: %s" % (searchname(entity, includes),
+                                           ", ".join(sorted(paths))))
+        if not lines:
+            lines.append("Nothing to report.")
+        return "\n".join(lines)
@@ -0,0 +1,154 @@
+"""Load related objects for all objects in a search result at once.
+
+Related objects that have not been included in a search are missing
+in the entity objects.  Accessing them yields :const:`None` or an
+empty list respectively.  Getting them one object at a time takes
+one extra call to the server for each object in the search result.
+This module provides :class:`icat.lazyload.ResultGroup` that is used
+by :class:`icat.client.Client` if the `lazyLoad` keyword argument is
+set to :const:`True` in the constructor.  All entity objects in the
+result of :meth:`icat.client.Client.search` are then put in one
+group.  On first access to a missing relation in any of these
+objects, the relation is searched for all objects of the group in
+one call, using an ``IN`` condition on the ids, and set in all of
+them.  Iterating over a search result and accessing the same
+relation in each object thus takes two calls rather then one call
+per object.
+"""
+
+import weakref
+from icat.entity import Entity
+
+__all__ = ['ResultGroup']
+
+
+class ResultGroup(object):
+    """A group of sibling objects from one search result.
+
+    The group holds weak references to the instances of the objects
+    only.  Each entity object in the group references the group in
+    its `_resultGroup` attribute.
+
+    Relations are only loaded for objects that have an id and that
+    do not have the relation set.  After loading, the relation is
+    set to :const:`None` or to the empty list respectively in all
+    objects for which nothing has been found, so that it is not
+    loaded again.  The snapshot of the objects, see
+    :meth:`icat.entity.Entity.getModifiedAttrs`, is updated
+    accordingly, loading a relation does not count as a modification.
+    The searches to load relations are internal to the group, they are
+    not recorded by the include advisor of the client, if any.  If
+    the client has an identity map, only the related objects loaded
+    are merged into it, the objects in the group keep their state,
+    including local modifications not yet sent to the server.
+
+    The related objects in a many to one relation of all objects in
+    the group form a group of their own, so that relations of these
+    may be loaded in turn.  E.g. accessing ``df.dataset.investigation``
+    for each datafile in a search result takes three calls in total.
+
+    :param entities: the objects in the search result.  Items that
+        are not entity objects are ignored.
+    :type entities: :class:`list`
+    """
+
+    batchsize = 500
+    """Maximal number of objects to load a relation for in one call."""
+
+    def __init__(self, entities):
+        super(ResultGroup, self).__init__()
+        self.refs = []
+        self.children = {}
+        seen = set()
+        for obj in entities:
+            if isinstance(obj, Entity):
+                if id(obj.instance) not in seen:
+                    seen.add(id(obj.instance))
+                    self.refs.append(weakref.ref(obj.instance))
+                obj._resultGroup = self
+
+    def __len__(self):
+        return len(self.refs)
+
+    def __repr__(self):
+        return "<ResultGroup objects=%d>" % len(self.refs)
+
+    def _instances(self, instancetype):
+        for ref in self.refs:
+            instance = ref()
+            if (instance is not None and
+                instance.__class__.__name__ == instancetype):
+                yield instance
+
+    def load(self, obj, attr):
+        """Load a relation for all objects in the group.
+
+        :param obj: the object the relation has been accessed in.
+            Its client is used to search the related objects and only
+            objects of the same type are taken into account.
+        :type obj: :class:`icat.entity.Entity`
+        :param attr: the name of the relation.
+        :type attr: :class:`str`
+        :return: the number of search calls made.
+        :rtype: :class:`int`
+        """
+        Class = type(obj)
+        many = attr in Class.InstMRel
+        pending = {}
+        for instance in self._instances(obj.instancetype):
+            if hasattr(instance, attr):
+                continue
+            id = getattr(instance, 'id', None)
+            if id is not None:
+                pending.setdefault(id, []).append(instance)
+        ids = sorted(pending.keys())
+        identityMap = obj.client.identityMap
+        ncalls = 0
+        for i in range(0, len(ids), self.batchsize):
+            batch = ids[i:i+self.batchsize]
+            query = ("SELECT o FROM %s o WHERE o.id IN (%s) INCLUDE o.%s"
+                     % (Class.BeanName, ", ".join("%d" % id for id in batch),
+                        attr))
+            ncalls += 1
+            for found in obj.client._searchInstances(query):
+                value = getattr(found, attr, None)
+                if value is None:
+                    continue
+                if identityMap is not None:
+                    if many:
+                        value = [ identityMap.getInstance(v) for v in value ]
+                    else:
+                        value = identityMap.getInstance(value)
+                for instance in pending.get(found.id, []):
+                    setattr(instance, attr, value)
+        for instances in pending.values():
+            for instance in instances:
+                if not hasattr(instance, attr):
+                    setattr(instance, attr, [] if many else None)
+                if not many:
+                    Class._updateSnapshot(instance, attr)
+        return ncalls
+
+    def getChild(self, attr):
+        """Get the group of the related objects in a many to one
+        relation of the objects in the group.
+
+        :param attr: the name of the relation.
+        :type attr: :class:`str`
+        :return: the group of related objects.
+        :rtype: :class:`icat.lazyload.ResultGroup`
+        """
+        try:
+            return self.children[attr]
+        except KeyError:
+            pass
+        child = ResultGroup([])
+        seen = set()
+        for ref in self.refs:
+            instance = ref()
+            value = getattr(instance, attr, None)
+            if value is not None and id(value) not in seen:
+                seen.add(id(value))
+                child.refs.append(weakref.ref(value))
+        self.children[attr] = child
+        return child
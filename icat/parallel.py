@@ -0,0 +1,212 @@
+"""Helper classes to perform ICAT calls concurrently in background threads.
+
+**Note**: This module is mostly intended for the internal use in
+python-icat.  Most users will not need to use it directly or even care
+about it.
+"""
+
+import threading
+import Queue
+
+__all__ = ['BackgroundIterator', 'WorkerPool']
+
+
+class BackgroundIterator(object):
+    """Iterate over an iterable in a background thread.
+
+    The items are taken from the iterable in a worker thread as soon
+    as possible and passed to the consumer through a bounded queue.
+    The worker thread will run ahead of the consumer by at most
+    `maxsize` items.  Exceptions raised while iterating in the worker
+    thread will be raised in the consumer at the corresponding
+    position.
+
+    The iterator should be closed if the consumer is not going to
+    consume all items in order to stop the worker thread.
+
+    >>> it = BackgroundIterator(range(5), maxsize=2)
+    >>> list(it)
+    [0, 1, 2, 3, 4]
+
+    :param iterable: the iterable to iterate over.
+    :param maxsize: the maximal number of items to fetch in advance.
+    :type maxsize: :class:`int`
+    """
+
+    # Kind of the messages passed through the queue.
+    _Item, _Error, _End = range(3)
+
+    def __init__(self, iterable, maxsize=1):
+        super(BackgroundIterator, self).__init__()
+        self.queue = Queue.Queue(maxsize)
+        self.stopped = threading.Event()
+        self.done = False
+        self.thread = threading.Thread(target=self._run,
+                                       args=(iter(iterable),))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _put(self, msg):
+        # Do not block forever on a full queue in order to notice if
+        # the consumer closes the iterator.
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(msg, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def _run(self, iterator):
+        try:
+            for item in iterator:
+                if not self._put((self._Item, item)):
+                    return
+        except Exception as e:
+            self._put((self._Error, e))
+        else:
+            self._put((self._End, None))
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self.done:
+            raise StopIteration
+        kind, value = self.queue.get()
+        if kind == self._Item:
+            return value
+        self.done = True
+        self.stopped.set()
+        if kind == self._Error:
+            raise value
+        else:
+            raise StopIteration
+
+    def close(self):
+        """Stop the worker thread.
+        """
+        self.done = True
+        self.stopped.set()
+
+
+class WorkerPool(object):
+    """A pool of worker threads to process tasks concurrently.
+
+    Each worker thread calls `init` once when it starts.  The return
+    value is passed as first argument to all tasks processed in this
+    thread.  This may be used to give each thread its own resources,
+    e.g. a clone of an ICAT client.
+
+    >>> pool = WorkerPool(3)
+    >>> list(pool.imap(lambda ctx, x: x*x, range(8)))
+    [0, 1, 4, 9, 16, 25, 36, 49]
+    >>> pool.close()
+
+    :param workers: the number of worker threads.
+    :type workers: :class:`int`
+    :param init: a callable without arguments or :const:`None`.
+    """
+
+    def __init__(self, workers, init=None):
+        super(WorkerPool, self).__init__()
+        if workers < 1:
+            raise ValueError("Invalid number of workers %d." % workers)
+        self.workers = workers
+        self.init = init
+        self.tasks = Queue.Queue()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def _start(self):
+        while len(self.threads) < self.workers:
+            t = threading.Thread(target=self._run)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def _run(self):
+        try:
+            ctx = self.init() if self.init else None
+        except Exception as e:
+            ctx = None
+            initerror = e
+        else:
+            initerror = None
+        while True:
+            task = self.tasks.get()
+            if task is None or self.stopped.is_set():
+                return
+            func, arg, key, results = task
+            if initerror is not None:
+                results.put((key, False, initerror))
+                continue
+            try:
+                results.put((key, True, func(ctx, arg)))
+            except Exception as e:
+                results.put((key, False, e))
+
+    def imap(self, func, iterable, ordered=True, maxpending=None):
+        """Call `func` on each item in `iterable` in the worker threads.
+
+        Return a generator yielding the results.  If `ordered` is
+        :const:`True`, the results are yielded in the order of the
+        items, otherwise as soon as they are available.  An exception
+        raised by `func` is raised in the caller, no further results
+        are yielded after that.  At most `maxpending` items are
+        processed ahead of the consumer, the default being twice the
+        number of workers.
+
+        :param func: a callable taking the context returned by `init`
+            and an item as arguments.
+        :param iterable: the items.
+        :param ordered: whether to yield the results in order.
+        :type ordered: :class:`bool`
+        :param maxpending: maximal number of pending items.
+        :type maxpending: :class:`int`
+        """
+        if maxpending is None:
+            maxpending = 2 * self.workers
+        self._start()
+        items = iter(iterable)
+        results = Queue.Queue()
+        done = {}
+        submitted = 0
+        nextkey = 0
+        exhausted = False
+        while True:
+            while not exhausted and submitted - nextkey < maxpending:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                self.tasks.put((func, item, submitted, results))
+                submitted += 1
+            if nextkey >= submitted:
+                break
+            if ordered:
+                while nextkey not in done:
+                    key, ok, value = results.get()
+                    done[key] = (ok, value)
+                ok, value = done.pop(nextkey)
+            else:
+                key, ok, value = results.get()
+            nextkey += 1
+            if not ok:
+                raise value
+            yield value
+
+    def close(self):
+        """Stop all worker threads.
+
+        Tasks not yet started will not be processed.  Wait for the
+        tasks currently running to finish.  The pool can not be used
+        any more after calling this method.
+        """
+        self.stopped.set()
+        for t in self.threads:
+            self.tasks.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
@@ -2,10 +2,12 @@
 """
 
 from warnings import warn
+import re
+import datetime
 import icat.entity
 from icat.exception import *
 
-__all__ = ['Query']
+__all__ = ['Query', 'QueryTemplate']
 
 substnames = {
     "datafileFormat":"dff",
@@ -30,6 +32,20 @@ search expressions somewhat better readable.  There is no need for
 completeness here.
 """
 
+aggregate_fcts = frozenset(["COUNT", "MIN", "MAX", "AVG", "SUM"])
+"""Aggregate functions that may be used in the SELECT clause.
+"""
+
+_renderattrs = frozenset(["entity", "attribute", "aggregate", "order", 
+                          "conditions", "includes", "limit"])
+"""Attributes of Query the string representation depends on.
+"""
+
+_placeholder = re.compile(r"('(?:[^']|'')*'|\{[^}]*\})|:([A-Za-z_]\w*)")
+"""Match a placeholder in a rendered query, while skipping string
+and timestamp literals.
+"""
+
 # ======================== Internal helper ===========================
 
 def _parents(obj):
@@ -51,7 +67,20 @@ def _parents(obj):
 def _attrpath(client, entity, attrname):
     """Follow the attribute path along related objects and iterate over
     the components.
+
+    The components are kept in :attr:`client.attrPathCache`, unless
+    this is :const:`None`.
     """
+    cache = client.attrPathCache
+    key = (entity, attrname)
+    if cache is not None and key in cache:
+        return iter(cache[key])
+    path = list(_resolveattrpath(client, entity, attrname))
+    if cache is not None:
+        cache[key] = path
+    return iter(path)
+
+def _resolveattrpath(client, entity, attrname):
     rclass = entity
     for attr in attrname.split('.'):
         if rclass is None:
@@ -92,6 +121,37 @@ def _dosubst(obj, subst, addas=True):
         n += " AS %s" % (subst[obj])
     return n
 
+def _fmtid(value):
+    if isinstance(value, icat.entity.Entity):
+        value = value.id
+    if isinstance(value, bool) or not isinstance(value, (int, long)):
+        raise TypeError("Invalid id %r." % (value,))
+    return "%d" % value
+
+def _fmtstring(value):
+    if not isinstance(value, basestring):
+        raise TypeError("Invalid string %r." % (value,))
+    return "'%s'" % value.replace("'", "''")
+
+def _fmtdate(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            raise ValueError("Time zone aware datetime %r is not supported."
+                             % (value,))
+    elif isinstance(value, datetime.date):
+        value = datetime.datetime.combine(value, datetime.time())
+    else:
+        raise TypeError("Invalid date %r." % (value,))
+    return "{ts %s}" % value.strftime("%Y-%m-%d %H:%M:%S")
+
+_formatters = {
+    "id": _fmtid,
+    "string": _fmtstring,
+    "date": _fmtdate,
+}
+"""Format a value of the given placeholder type as a literal in a query.
+"""
+
 # ========================== class Query =============================
 
 class Query(object):
@@ -99,11 +159,18 @@ class Query(object):
 
     The query uses the JPQL inspired syntax introduced with ICAT
     4.3.0.  It won't work with older ICAT servers.
+
+    The string representation of the query is cached.  The cache is
+    invalidated by the methods modifying the query and by setting
+    any of its attributes.  Modifying the values of the attributes in
+    place, e.g. adding an item to the :class:`dict` of conditions,
+    must be avoided.
     """
 
     def __init__(self, client, entity, 
                  attribute=None, order=None, 
-                 conditions=None, includes=None, limit=None):
+                 conditions=None, includes=None, limit=None, 
+                 aggregate=None):
         """Initialize the query.
 
         :param client: the ICAT client.
@@ -111,9 +178,9 @@ class Query(object):
         :param entity: the type of objects to search for.  This may
             either be an :class:`icat.entity.Entity` subclass or the
             name of an entity type.
-        :param attribute: the attribute that the query shall return.
-            See the :meth:`icat.query.Query.setAttribute` method for
-            details.
+        :param attribute: the attribute or the list of attributes
+            that the query shall return.  See the
+            :meth:`icat.query.Query.setAttribute` method for details.
         :param order: the sorting attributes to build the ORDER BY
             clause from.  See the :meth:`icat.query.Query.setOrder`
             method for details.
@@ -126,6 +193,9 @@ class Query(object):
         :param limit: a tuple (skip, count) to be used in the LIMIT
             clause.  See the :meth:`icat.query.Query.setLimit` method
             for details.
+        :param aggregate: the aggregate function to be applied in the
+            SELECT clause, if any.  See the
+            :meth:`icat.query.Query.setAggregate` method for details.
         """
 
         if client.apiversion < '4.3':
@@ -133,6 +203,7 @@ class Query(object):
 
         super(Query, self).__init__()
         self._init = True
+        self._rendered = None
         self.client = client
 
         if isinstance(entity, basestring):
@@ -147,6 +218,7 @@ class Query(object):
             raise TypeError("Invalid entity type '%s'." % type(entity))
 
         self.setAttribute(attribute)
+        self.setAggregate(aggregate)
         self.conditions = dict()
         self.addConditions(conditions)
         self.includes = set()
@@ -155,6 +227,11 @@ class Query(object):
         self.setLimit(limit)
         self._init = None
 
+    def __setattr__(self, attr, value):
+        super(Query, self).__setattr__(attr, value)
+        if attr in _renderattrs:
+            super(Query, self).__setattr__('_rendered', None)
+
     def setAttribute(self, attribute):
         """Set the attribute that the query shall return.
 
@@ -162,13 +239,76 @@ class Query(object):
             the query will be a list of attribute values for the
             matching entity objects.  If attribute is :const:`None`,
             the result will be the list of matching objects instead.
-        :type attribute: :class:`str`
+            If attribute is a list of more then one name, the result
+            will be a list of tuples holding the values of these
+            attributes.
+            The names may be dotted paths to attributes of related
+            objects, these are then joined in the query.  Note that
+            more then one attribute requires ICAT 4.11.0 or newer.
+        :type attribute: :class:`str` or :class:`list` of :class:`str`
+        :raise ValueError: if any of the attributes is not valid.
+        :raise VersionMethodError: if more then one attribute is given
+            and the ICAT server is too old to support this.
         """
+        if attribute is None or isinstance(attribute, basestring):
+            attrs = [attribute] if attribute is not None else []
+        else:
+            attribute = list(attribute)
+            attrs = attribute
+            if len(attrs) > 1 and self.client.apiversion < '4.10.9':
+                raise VersionMethodError("Query with multiple attributes", 
+                                         self.client.apiversion)
         # Get the attribute path only to verify that the attribute is valid.
-        if attribute is not None:
-            attrpath = list(_attrpath(self.client, self.entity, attribute))
+        for a in attrs:
+            attrpath = list(_attrpath(self.client, self.entity, a))
         self.attribute = attribute
 
+    def setAggregate(self, function):
+        """Set the aggregate function to be applied to the result.
+
+        The result of a query with an aggregate function is a list
+        having one single value, e.g. the number of matching objects
+        for ``"COUNT"`` or the total of the attribute values for
+        ``"SUM"``.  The computation is done by the ICAT server, the
+        matching objects are not transferred to the client.  ORDER BY
+        and INCLUDE clauses are meaningless in this case and will be
+        omitted.
+
+        :param function: the aggregate function.  Valid values are
+            ``"COUNT"``, ``"MIN"``, ``"MAX"``, ``"AVG"``, and
+            ``"SUM"``.  Any of these may be combined with
+            ``":DISTINCT"``, e.g. ``"COUNT:DISTINCT"``, in order to
+            take only distinct values into account.  The special value
+            ``"DISTINCT"`` does not aggregate, but removes duplicates
+            from the result.  :const:`None` means no aggregate
+            function.  All functions other then ``"COUNT"`` and
+            ``"DISTINCT"`` require a single attribute to be set in the
+            query.
+        :type function: :class:`str`
+        :raise ValueError: if `function` is not valid or does not
+            match the attributes of the query.
+        """
+        if function:
+            fct, sep, distinct = function.partition(':')
+            if sep and (distinct != "DISTINCT" or fct not in aggregate_fcts):
+                raise ValueError("Invalid aggregate function '%s'." 
+                                 % function)
+            if fct != "DISTINCT":
+                if fct not in aggregate_fcts:
+                    raise ValueError("Invalid aggregate function '%s'." 
+                                     % function)
+                if isinstance(self.attribute, list):
+                    if len(self.attribute) != 1:
+                        raise ValueError("Cannot apply aggregate function "
+                                         "'%s' to multiple attributes." 
+                                         % function)
+                elif self.attribute is None and fct != "COUNT":
+                    raise ValueError("Aggregate function '%s' requires "
+                                     "an attribute." % function)
+            self.aggregate = function
+        else:
+            self.aggregate = None
+
     def setOrder(self, order):
         """Set the order to build the ORDER BY clause from.
 
@@ -253,6 +393,7 @@ class Query(object):
                     self.conditions[a] = conds
                 else:
                     self.conditions[a] = conditions[a]
+            self._rendered = None
 
     def addIncludes(self, includes):
         """Add related objects to build the INCLUDE clause from.
@@ -274,6 +415,7 @@ class Query(object):
                     raise ValueError("%s.%s is not a related object." 
                                      % (self.entity.BeanName, iobj))
             self.includes.update(includes)
+            self._rendered = None
 
     def setLimit(self, limit):
         """Set the limits to build the LIMIT clause from.
@@ -306,13 +448,37 @@ class Query(object):
         non-ascii characters working.  For Python 3, there is no
         distinction between Unicode and string objects anyway.
         """
+        if self._rendered is None:
+            self._rendered = self._render()
+        return self._rendered
+
+    def _render(self):
+        """Build the string representation of the query.
+        """
+        if self.aggregate:
+            fct, sep, distinct = self.aggregate.partition(':')
+        else:
+            fct = distinct = None
+        aggregate = fct in aggregate_fcts
+        if aggregate:
+            order = []
+        else:
+            order = self.order
+        joinattrs = set(order) | set(self.conditions.keys())
         if self.attribute is None:
             res = "o"
-        else:
+        elif isinstance(self.attribute, basestring):
             res = "o.%s" % self.attribute
-        base = "SELECT %s FROM %s o" % (res, self.entity.BeanName)
-        joinattrs = set(self.order) | set(self.conditions.keys())
+        else:
+            joinattrs.update(self.attribute)
         subst = _makesubst(joinattrs)
+        if isinstance(self.attribute, list):
+            res = ", ".join(_dosubst(a, subst, False) for a in self.attribute)
+        if fct == "DISTINCT" or distinct:
+            res = "DISTINCT %s" % res
+        if aggregate:
+            res = "%s(%s)" % (fct, res)
+        base = "SELECT %s FROM %s o" % (res, self.entity.BeanName)
         joins = ""
         for obj in sorted(subst.keys()):
             joins += " JOIN %s" % _dosubst(obj, subst)
@@ -329,12 +495,12 @@ class Query(object):
             where = " WHERE " + " AND ".join(conds)
         else:
             where = ""
-        if self.order:
-            orders = [ _dosubst(a, subst, False) for a in self.order ]
+        if order:
+            orders = [ _dosubst(a, subst, False) for a in order ]
             order = " ORDER BY " + ", ".join(orders)
         else:
             order = ""
-        if self.includes:
+        if self.includes and not aggregate:
             subst = _makesubst(self.includes)
             includes = set(self.includes)
             includes.update(subst.keys())
@@ -348,13 +514,155 @@ class Query(object):
             limit = ""
         return base + joins + where + order + include + limit
 
+    def prepare(self, **types):
+        """Render the query into a template having typed placeholders.
+
+        Placeholders are written as ``:name`` in the conditions of the
+        query, e.g. ``conditions={"investigation.id": "= :inv"}``.
+        The query is validated and rendered only once, binding values
+        to the placeholders of the template then only needs to format
+        these values.
+
+        >>> query = Query(client, "Dataset", order=["name"],
+        ...               conditions={"investigation.id": "= :inv",
+        ...                           "name": "LIKE :name"})
+        >>> template = query.prepare(inv="id", name="string")
+        >>> template.bind(inv=42, name="raw%")
+        'SELECT o FROM Dataset o JOIN o.investigation AS i WHERE i.id = 42 AND o.name LIKE \'raw%\' ORDER BY o.name'
+
+        :param types: the type of each placeholder, one of ``"id"``,
+            ``"string"``, or ``"date"``.
+        :return: the template.
+        :rtype: :class:`icat.query.QueryTemplate`
+        :raise ValueError: if any type is not valid or if the
+            placeholders in the query do not match the types.
+        """
+        return QueryTemplate(self.client, unicode(self), types)
+
     def copy(self):
         """Return an independent clone of this query.
         """
         q = Query(self.client, self.entity)
-        q.attribute = self.attribute
+        if isinstance(self.attribute, list):
+            q.attribute = list(self.attribute)
+        else:
+            q.attribute = self.attribute
+        q.aggregate = self.aggregate
         q.order = list(self.order)
         q.conditions = self.conditions.copy()
         q.includes = self.includes.copy()
         q.limit = self.limit
         return q
+
+
+class QueryTemplate(object):
+    """A rendered query having typed placeholders.
+
+    This is usually created by :meth:`icat.query.Query.prepare`.
+    Values are bound to the placeholders according to their type:
+    ``"id"`` takes an integer or an entity object, the id of which is
+    used, ``"string"`` takes a string that is quoted as a string
+    literal, and ``"date"`` takes a :class:`datetime.datetime` or a
+    :class:`datetime.date` that is formatted as a timestamp literal.
+    Timestamp literals have no time zone, they are interpreted by
+    the ICAT server in its local time.  Time zone aware datetime
+    values are therefore rejected.  Placeholders inside string or
+    timestamp literals in the query are not substituted.
+
+    The template only keeps the rendered query and may thus also be
+    bound by other clients, e.g. clones of its client.
+
+    :param client: the ICAT client.
+    :type client: :class:`icat.client.Client`
+    :param query: the rendered query.
+    :type query: :class:`str`
+    :param types: mapping of the placeholder names to their type.
+    :type types: :class:`dict`
+    :raise ValueError: if any type is not valid or if the
+        placeholders in the query do not match the types.
+    """
+
+    def __init__(self, client, query, types):
+        super(QueryTemplate, self).__init__()
+        self.client = client
+        self.query = query
+        self.types = dict(types)
+        for n, t in self.types.items():
+            if t not in _formatters:
+                raise ValueError("Invalid type '%s' for placeholder '%s'."
+                                 % (t, n))
+        self._parts = []
+        self._names = []
+        start = 0
+        for m in _placeholder.finditer(query):
+            name = m.group(2)
+            if name is None:
+                continue
+            if name not in self.types:
+                raise ValueError("No type given for placeholder '%s'." % name)
+            self._parts.append(query[start:m.start()])
+            self._names.append(name)
+            start = m.end()
+        self._parts.append(query[start:])
+        unused = set(self.types.keys()) - set(self._names)
+        if unused:
+            raise ValueError("Placeholder '%s' not found in the query." 
+                             % sorted(unused)[0])
+
+    def __repr__(self):
+        return "%s(%s, %s, %s)" % (self.__class__.__name__, 
+                                   repr(self.client), repr(self.query), 
+                                   repr(self.types))
+
+    def __str__(self):
+        return self.query
+
+    def bind(self, **values):
+        """Bind values to the placeholders.
+
+        :param values: the value for each placeholder.
+        :return: the query having the values substituted.
+        :rtype: :class:`str`
+        :raise ValueError: if the values do not match the placeholders.
+        :raise TypeError: if any value does not fit its type.
+        """
+        if len(values) != len(self.types):
+            missing = set(self.types.keys()) - set(values.keys())
+            if missing:
+                raise ValueError("No value given for placeholder '%s'." 
+                                 % sorted(missing)[0])
+        literals = {}
+        for n, v in values.items():
+            try:
+                fmt = _formatters[self.types[n]]
+            except KeyError:
+                raise ValueError("Invalid placeholder '%s'." % n)
+            literals[n] = fmt(v)
+        parts = self._parts
+        res = [parts[0]]
+        for n, p in zip(self._names, parts[1:]):
+            res.append(literals[n])
+            res.append(p)
+        return "".join(res)
+
+    def search(self, values, **kwargs):
+        """Bind values to the placeholders and search.
+
+        :param values: the value for each placeholder, see
+            :meth:`icat.query.QueryTemplate.bind`.
+        :type values: :class:`dict`
+        :param kwargs: other keyword arguments are passed to
+            :meth:`icat.client.Client.search`.
+        """
+        return self.client.search(self.bind(**values), **kwargs)
+
+    def searchChunked(self, values, **kwargs):
+        """Bind values to the placeholders and search in chunks.
+
+        :param values: the value for each placeholder, see
+            :meth:`icat.query.QueryTemplate.bind`.
+        :type values: :class:`dict`
+        :param kwargs: other keyword arguments are passed to
+            :meth:`icat.client.Client.searchChunked`.
+        """
+        return self.client.searchChunked(self.bind(**values), **kwargs)
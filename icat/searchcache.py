@@ -0,0 +1,222 @@
+"""A client side cache for search results.
+
+This module provides :class:`icat.searchcache.SearchCache` that may
+be passed as `searchCache` keyword argument to the constructor of
+:class:`icat.client.Client`.  The results of
+:meth:`icat.client.Client.search`, and thus also of
+:meth:`icat.client.Client.assertedSearch`, are then kept in the cache
+for a limited time, so that repeated searches for the same query do
+not need to contact the ICAT server.  This is mostly useful for
+applications that frequently look up rarely changing reference data,
+such as facilities, dataset types, or parameter types.
+"""
+
+import re
+import copy
+import time
+import threading
+from collections import OrderedDict
+from icat.query import Query, _attrpath
+
+__all__ = ['normalizeQuery', 'SearchCache']
+
+
+_literal = re.compile(r"('(?:[^']|'')*')")
+_space = re.compile(r"\s+")
+_name = re.compile(r"\b[A-Z]\w*")
+_from = re.compile(r"\bFROM\s+(\w+)", re.IGNORECASE)
+
+def normalizeQuery(query):
+    """Return the query with any sequence of white space outside of
+    string literals replaced by a single blank.
+
+    >>> print(normalizeQuery("SELECT  o FROM Facility o\\n  WHERE o.name = 'a  b'"))
+    SELECT o FROM Facility o WHERE o.name = 'a  b'
+    """
+    parts = _literal.split(unicode(query).strip())
+    # The odd items in parts are the literals.
+    for i in range(0, len(parts), 2):
+        parts[i] = _space.sub(" ", parts[i])
+    return "".join(parts)
+
+
+class CacheEntry(object):
+    """An entry in the search cache.
+    """
+
+    __slots__ = ('result', 'expires', 'entities')
+
+    def __init__(self, result, expires, entities):
+        self.result = result
+        self.expires = expires
+        self.entities = entities
+
+
+class SearchCache(object):
+    """Cache search results on the client side.
+
+    The results are cached by the normalized query string and the
+    name of the user of the ICAT session, so that a cache may be
+    shared by several clients, even if these are logged in as
+    different users.  Each result is kept for `ttl` seconds at most.
+    The time to live may be set individually for the entity types in
+    `entityttl`, a value of zero disables caching for the respective
+    entity type.  If more then `maxsize` results are in the cache,
+    the least recently used ones are evicted.
+
+    All cached results related to an entity type are invalidated when
+    objects of this type are created, updated, or deleted through a
+    client using the cache.  Note that changes made by other clients
+    or indirectly on the server side, e.g. by cascading deletes, are
+    not noticed.  The cache may return stale results for these until
+    the entries expire.
+
+    The results are stored as deep copies of the Suds instances or
+    rows retrieved from the server and each search served from the
+    cache returns yet another deep copy.  Modifying the objects
+    returned from a search thus never affects the cache.  The cache
+    is thread safe.
+
+    The name of the user is looked up once per session.  The user
+    names of the `maxusers` most recently used sessions are kept.
+
+    :param maxsize: maximal number of search results in the cache.
+    :type maxsize: :class:`int`
+    :param ttl: default time to live in seconds.
+    :type ttl: :class:`float`
+    :param entityttl: time to live for individual entity types.
+    :type entityttl: :class:`dict`
+    :param maxusers: maximal number of sessions to keep the user
+        name for.
+    :type maxusers: :class:`int`
+    """
+
+    def __init__(self, maxsize=1000, ttl=60.0, entityttl=None, 
+                 maxusers=100):
+        super(SearchCache, self).__init__()
+        self.maxsize = maxsize
+        self.maxusers = maxusers
+        self.ttl = ttl
+        self.entityttl = dict(entityttl or {})
+        self.hits = 0
+        """Number of searches served from the cache."""
+        self.misses = 0
+        """Number of searches that needed to query the server."""
+        self.entries = OrderedDict()
+        self.users = OrderedDict()
+        # Incremented on each invalidation, so that results retrieved
+        # concurrently to an invalidation are not stored.
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return ("<SearchCache entries=%d hits=%d misses=%d>"
+                % (len(self.entries), self.hits, self.misses))
+
+    def _getUser(self, client):
+        sessionId = client.sessionId
+        with self.lock:
+            user = self.users.pop(sessionId, None)
+            if user is not None:
+                self.users[sessionId] = user
+                return user
+        user = client.getUserName()
+        with self.lock:
+            self.users[sessionId] = user
+            while len(self.users) > self.maxusers:
+                self.users.popitem(last=False)
+        return user
+
+    def _getEntities(self, client, query):
+        """Determine the entity types a query is related to.
+
+        Return the main entity type of the query and the set of all
+        entity types involved.
+        """
+        if isinstance(query, Query):
+            main = query.entity.BeanName
+            entities = set([main])
+            attrs = set(query.conditions.keys()) | set(query.includes)
+            attrs.update(query.order)
+            if isinstance(query.attribute, list):
+                attrs.update(query.attribute)
+            elif query.attribute is not None:
+                attrs.add(query.attribute)
+            for a in attrs:
+                for (attrInfo, rclass) in _attrpath(client, query.entity, a):
+                    if rclass is not None:
+                        entities.add(rclass.BeanName)
+        else:
+            beannames = set(e.BeanName for e in client.typemap.values()
+                            if e is not None and e.BeanName is not None)
+            query = "".join(_literal.split(unicode(query))[::2])
+            entities = set(_name.findall(query)) & beannames
+            m = _from.search(query)
+            if m and m.group(1) in beannames:
+                main = m.group(1)
+            else:
+                main = min(entities) if entities else None
+        return main, frozenset(entities)
+
+    def search(self, client, query, rowtype, search):
+        """Search through the cache.
+
+        Look up the result in the cache.  If not found, call `search`
+        with the query and `rowtype` as arguments to retrieve the
+        result from the server and add it to the cache.  The result
+        returned by `search` must be a list.
+
+        :param client: the client to search with.
+        :type client: :class:`icat.client.Client`
+        :param query: the search query.
+        :type query: :class:`icat.query.Query` or :class:`str`
+        :param rowtype: the rowtype argument to the search.
+        :type rowtype: :class:`str`
+        :param search: the callable to retrieve the result.
+        :return: the search result.
+        :rtype: :class:`list`
+        """
+        if not client.sessionId:
+            return search(query, rowtype)
+        key = (self._getUser(client), normalizeQuery(query), rowtype)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None and entry.expires > now:
+                # Reinsert the entry to mark it as most recently used.
+                self.entries[key] = entry
+                self.hits += 1
+                return copy.deepcopy(entry.result)
+            self.misses += 1
+            generation = self.generation
+        main, entities = self._getEntities(client, query)
+        result = search(query, rowtype)
+        ttl = self.entityttl.get(main, self.ttl)
+        if ttl > 0:
+            with self.lock:
+                if self.generation != generation:
+                    return result
+                self.entries[key] = CacheEntry(copy.deepcopy(result), 
+                                               now + ttl, entities)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return result
+
+    def invalidate(self, entities=None):
+        """Invalidate cached results.
+
+        :param entities: names of entity types.  All results related
+            to any of these types are removed from the cache.  If
+            this is :const:`None`, the cache is cleared completely.
+        :type entities: iterable of :class:`str`
+        """
+        with self.lock:
+            self.generation += 1
+            if entities is None:
+                self.entries.clear()
+                self.users.clear()
+            else:
+                entities = frozenset(entities)
+                for key in [k for k, e in self.entries.items()
+                            if e.entities & entities]:
+                    del self.entries[key]
@@ -6,7 +6,9 @@ about it.
 """
 
 import ssl
+import urllib2
 from urllib2 import HTTPSHandler
+import suds.transport
 import suds.transport.http
 
 
@@ -79,3 +81,27 @@ class HTTPSTransport(suds.transport.http.HttpTransport):
                 # will not end up here in the first place.
                 handlers.append(HTTPSHandler(context=self.ssl_context))
         return handlers
+
+    def stream(self, request):
+        """Send a request and return the reply as a file-like object.
+
+        Same as :meth:`suds.transport.http.HttpTransport.send`, but
+        the body of the reply is not read.  This is left to the
+        caller, who is responsible to close the returned object.
+
+        :param request: the request to send.
+        :type request: :class:`suds.transport.Request`
+        :return: the reply.
+        :raise suds.transport.TransportError: if the server returns an
+            HTTP error.
+        """
+        u2request = urllib2.Request(request.url, request.message, 
+                                    request.headers)
+        self.addcookies(u2request)
+        self.proxy = self.options.proxy
+        try:
+            fp = self.u2open(u2request)
+        except urllib2.HTTPError as e:
+            raise suds.transport.TransportError(e.msg, e.code, e.fp)
+        self.getcookies(fp, u2request)
+        return fp
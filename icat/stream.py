@@ -0,0 +1,284 @@
+"""Process the reply of ICAT calls incrementally.
+
+**Note**: This module is mostly intended for the internal use in
+python-icat.  Most users will not need to use it directly or even care
+about it.  It is used by :meth:`icat.client.Client.iterSearch`.
+
+Suds reads the complete reply from the server, parses it into a tree
+of XML elements and then unmarshals this into a list of
+:class:`suds.sudsobject.Object`.  The peak memory consumption is
+therefore several times the size of the reply.  The functions in this
+module rather feed the reply to an incremental SAX parser while it is
+being read from the server and unmarshal each item of the result as
+soon as it has been parsed completely.
+"""
+
+from collections import namedtuple
+import xml.sax
+from xml.sax.handler import feature_external_ges
+import suds
+import suds.client
+import suds.sax.parser
+import suds.sudsobject
+from suds.sax import Namespace
+from suds.sax.element import Element
+from suds.xsd import qualify
+from suds.transport import Request, TransportError
+from icat.helper import parse_attr_string
+
+__all__ = ['fieldSetItems', 'RowDecoder', 'iterCall']
+
+
+_attrtypes = {
+    'long': 'Long',
+    'int': 'Integer',
+    'double': 'Double',
+    'boolean': 'boolean',
+    'dateTime': 'Date',
+}
+"""Map XML Schema builtin types to the attribute types as used in the
+ICAT entity info.  All types not listed here are taken as strings.
+"""
+
+
+def fieldSetItems(obj):
+    """Get the items of a row selecting multiple attributes.
+
+    ICAT returns each row in the result of a query selecting multiple
+    attributes as a ``fieldSet`` having a ``field`` for each
+    attribute.
+
+    :param obj: either a Suds instance object or an XML element from
+        the reply of the server.
+    :type obj: :class:`suds.sudsobject.Object` or
+        :class:`suds.sax.element.Element`
+    :return: the fields of the row or :const:`None` if obj is not
+        such a row.
+    :rtype: :class:`list`
+    """
+    if isinstance(obj, Element):
+        xsitype = obj.get('type', Namespace.xsins)
+        if xsitype is None:
+            name = obj.name
+        else:
+            name = xsitype.split(':')[-1]
+        if name != 'fieldSet':
+            return None
+        return obj.getChildren('field')
+    elif isinstance(obj, suds.sudsobject.Object):
+        if obj.__class__.__name__ != 'fieldSet':
+            return None
+        items = getattr(obj, 'field', [])
+        if not isinstance(items, list):
+            items = [items]
+        return items
+    else:
+        return None
+
+
+class ReplyHandler(suds.sax.parser.Handler):
+    """A SAX handler that builds the XML elements of a SOAP reply and
+    keeps track of the items in the SOAP body that have been
+    completely parsed.
+
+    The items are the grandchildren of the SOAP Body element, that is
+    the children of the response element of the operation.
+    """
+
+    # Depth of the items in the tree: Document, Envelope, Body,
+    # response element.
+    depth = 4
+
+    def __init__(self):
+        suds.sax.parser.Handler.__init__(self)
+        self.ready = []
+
+    def endElement(self, name):
+        node = self.top()
+        suds.sax.parser.Handler.endElement(self, name)
+        if (len(self.nodes) == self.depth and
+            self.nodes[2].name == 'Body' and
+            self.nodes[3].name.endswith('Response')):
+            self.ready.append(node)
+
+
+class RowDecoder(object):
+    """Decode the items in a search result directly into rows.
+
+    This bypasses the unmarshalling by Suds and the creation of
+    :class:`icat.entity.Entity` objects.  Each entity object in the
+    result is decoded into a row holding the values of its plain
+    attributes, related objects are ignored.  The rows are either
+    :class:`dict` or :func:`collections.namedtuple` instances, having
+    the attribute names as keys or fields respectively.  Attributes
+    not set in the object are :const:`None` in the row.  Items in the
+    result that are not entity objects, such as the result of
+    selecting an attribute, are decoded into the plain value.  Rows
+    in the result of selecting multiple attributes are decoded into
+    tuples of values.
+
+    The layout of the rows is derived from the types defined in the
+    WSDL schema and cached in the decoder, so the same decoder should
+    be reused for all results from one client.
+
+    :param client: the ICAT client.
+    :type client: :class:`icat.client.Client`
+    :param rowtype: either ``"dict"`` or ``"tuple"``.
+    :type rowtype: :class:`str`
+    :raise ValueError: if `rowtype` is not valid.
+    """
+
+    def __init__(self, client, rowtype):
+        if rowtype not in ("dict", "tuple"):
+            raise ValueError("Invalid rowtype '%s'." % rowtype)
+        self.client = client
+        self.rowtype = rowtype
+        self.types = {}
+
+    def _getType(self, qname):
+        """Get the attribute types and the row class for a schema type.
+        """
+        try:
+            return self.types[qname]
+        except KeyError:
+            pass
+        schematype = self.client.wsdl.schema.types.get(qname)
+        if schematype is None or schematype.builtin():
+            fields = None
+            rowclass = _attrtypes.get(qname[0], 'String')
+        else:
+            fields = {}
+            for child, ancestry in schematype.children():
+                resolved = child.resolve()
+                if resolved.builtin():
+                    fields[str(child.name)] = _attrtypes.get(resolved.name, 
+                                                             'String')
+                elif resolved.enum():
+                    fields[str(child.name)] = 'String'
+            if self.rowtype == "tuple":
+                try:
+                    name = self.client.typemap[qname[0]].BeanName
+                except (KeyError, AttributeError):
+                    name = None
+                rowclass = namedtuple(name or str(qname[0]), 
+                                      sorted(fields.keys()))
+            else:
+                rowclass = None
+        self.types[qname] = (fields, rowclass)
+        return (fields, rowclass)
+
+    @staticmethod
+    def _value(node, attrtype):
+        text = node.getText()
+        if text is None or node.isnil():
+            return None
+        if attrtype == 'String':
+            return unicode(text)
+        return parse_attr_string(text, attrtype)
+
+    def __call__(self, node):
+        """Decode an XML element from the search result.
+        """
+        items = fieldSetItems(node)
+        if items is not None:
+            return tuple(self(child) for child in items)
+        xsitype = node.get('type', Namespace.xsins)
+        if xsitype is None:
+            qname = (node.name, None)
+        else:
+            qname = qualify(xsitype, node, node.namespace())
+        fields, rowclass = self._getType(qname)
+        if fields is None:
+            # rowclass is the attribute type of a plain value here.
+            return self._value(node, rowclass)
+        row = dict.fromkeys(fields.keys())
+        for child in node.getChildren():
+            attrtype = fields.get(child.name)
+            if attrtype is not None:
+                row[child.name] = self._value(child, attrtype)
+        if rowclass is None:
+            return row
+        else:
+            return rowclass(**row)
+
+
+def iterCall(client, name, args, blocksize=65536, decode=None, 
+             received=None):
+    """Call an ICAT API method and iterate over the result.
+
+    The method must return a list.  The items in the result are
+    decoded and yielded as soon as they have been received from the
+    server.  Each item is
+    discarded from the parsed reply after it has been yielded.
+
+    :param client: the ICAT client.
+    :type client: :class:`icat.client.Client`
+    :param name: the name of the API method.
+    :type name: :class:`str`
+    :param args: the arguments to the API method.
+    :type args: :class:`tuple`
+    :param blocksize: the number of bytes to read from the server at
+        once.
+    :type blocksize: :class:`int`
+    :param decode: a callable that takes the XML element of an item
+        from the reply as :class:`suds.sax.element.Element` and
+        returns the decoded item, such as a
+        :class:`icat.stream.RowDecoder`.  If this is :const:`None`,
+        the items are unmarshalled by Suds.
+    :param received: a callable that is called with the total number
+        of bytes read from the server after the reply has been
+        processed completely.  The Suds message plugins are bypassed,
+        so this is the only way to learn about the size of the reply.
+    :return: a generator that iterates over the items in the result.
+    :rtype: generator
+    :raise suds.WebFault: if the server returns an error.
+    """
+    method = getattr(client.service, name).method
+    soapclient = suds.client.SoapClient(client, method)
+    soapenv = method.binding.input.get_message(method, args, {})
+    request = Request(soapclient.location(), soapenv.plain().encode('utf-8'))
+    request.headers = soapclient.headers()
+    try:
+        fp = client.options.transport.stream(request)
+    except TransportError as e:
+        # Let Suds process the error, this will raise a WebFault.
+        content = e.fp and e.fp.read() or ''
+        soapclient.process_reply(reply=content, status=e.httpcode,
+                                 description=suds.tostr(e))
+        raise
+
+    if decode is None:
+        output = method.binding.output
+        rtypes = output.returned_types(method)
+        resolved = rtypes[0].resolve(nobuiltin=True)
+        unmarshaller = output.unmarshaller()
+        decode = lambda node: unmarshaller.process(node, resolved)
+    parser = xml.sax.make_parser()
+    parser.setFeature(feature_external_ges, 0)
+    handler = ReplyHandler()
+    parser.setContentHandler(handler)
+    nbytes = 0
+    try:
+        while True:
+            data = fp.read(blocksize)
+            if not data:
+                break
+            nbytes += len(data)
+            parser.feed(data)
+            for node in handler.ready:
+                # Decode the node while it is still attached to the
+                # tree, so that namespace prefixes declared in the
+                # ancestors can be resolved.
+                obj = decode(node)
+                node.detach()
+                yield obj
+            del handler.ready[:]
+        parser.close()
+        if received is not None:
+            received(nbytes)
+        document = handler.nodes[0]
+        fault = soapclient.get_fault(document)
+        if fault:
+            raise suds.WebFault(fault, document)
+    finally:
+        fp.close()
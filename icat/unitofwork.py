@@ -0,0 +1,235 @@
+"""Collect the changes to entity objects and send them in batches.
+
+This module provides :class:`icat.unitofwork.UnitOfWork` that is
+returned by :meth:`icat.client.Client.unitOfWork`.  While a unit of
+work is active, calls to create, update, or delete objects are not
+sent to the ICAT server one by one, but recorded.  When the unit of
+work is flushed, the recorded calls are sent in as few calls as
+possible: the objects to create are sorted by their dependencies
+and created in one call to :meth:`icat.client.Client.createMany`
+for each level of dependencies, the updates are done in one call to
+:meth:`icat.client.Client.updateMany`, and the objects to delete are
+deleted in one call to :meth:`icat.client.Client.deleteMany` for
+each level of dependencies in reverse order.
+"""
+
+from collections import OrderedDict
+import logging
+from icat.entity import Entity
+from icat.exception import BatchCallError, DataConsistencyError
+
+__all__ = ['UnitOfWork']
+
+log = logging.getLogger(__name__)
+
+
+class UnitOfWork(object):
+    """Record the creation, update, and deletion of objects.
+
+    The unit of work is a context manager.  Entering it makes it the
+    active unit of work of the client, such that
+    :meth:`icat.client.Client.create`,
+    :meth:`icat.client.Client.update`, and
+    :meth:`icat.client.Client.delete` and thus also the corresponding
+    methods of :class:`icat.entity.Entity` record the call in the
+    unit of work rather then sending it to the server.
+    :meth:`icat.client.Client.create` then returns :const:`None`.
+    Leaving the context flushes the unit of work, unless it is left
+    by an exception, in which case all recorded calls are discarded.
+
+    Objects are identified by their instance: the same object is
+    only created, updated, or deleted once.  Updating an object
+    that is to be created is a no-op, the object will be created in
+    its state at the time of the flush anyway, updating an object
+    that is to be deleted is ignored.  Deleting an object that is to
+    be created cancels its creation.
+
+    An object to create depends on another one if it refers to the
+    other one in a many to one relation, e.g. a dataset depends on
+    its investigation if both are to be created.  The ids of the
+    objects created are set in the entity objects after each call,
+    such that the dependent objects refer to them in the next call.
+    Objects to delete are deleted in the reverse order of their
+    dependencies, one call for each level, so that the order is kept
+    even if the batches of one call are deleted concurrently.
+    Objects included in a one to many relation of
+    another object are created along with that object by the server
+    and should not be recorded separately.
+
+    :param client: the client to record the calls for.
+    :type client: :class:`icat.client.Client`
+    :param batchsize: the maximal number of objects per call to
+        create or delete, see :meth:`icat.client.Client.createMany`.
+        By default, all objects of one level of dependencies are sent
+        in one call.
+    :type batchsize: :class:`int`
+    :param workers: the number of concurrent calls to create or
+        delete the batches of one level of dependencies, if
+        `batchsize` is set, and the number of concurrent calls to
+        update objects.
+    :type workers: :class:`int`
+    """
+
+    def __init__(self, client, batchsize=None, workers=1):
+        super(UnitOfWork, self).__init__()
+        self.client = client
+        self.batchsize = batchsize
+        self.workers = workers
+        self.creates = OrderedDict()
+        self.updates = OrderedDict()
+        self.deletes = OrderedDict()
+        self._previous = []
+
+    def __enter__(self):
+        self._previous.append(self.client.activeUnitOfWork)
+        self.client.activeUnitOfWork = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.client.activeUnitOfWork = self._previous.pop()
+        if exc_type is None:
+            self.flush()
+        else:
+            self.clear()
+
+    def __len__(self):
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def __repr__(self):
+        return ("<UnitOfWork creates=%d updates=%d deletes=%d>"
+                % (len(self.creates), len(self.updates), len(self.deletes)))
+
+    def _getEntity(self, obj):
+        if not isinstance(obj, Entity):
+            obj = self.client.getEntity(obj)
+        return id(obj.instance), obj
+
+    def create(self, obj):
+        """Record the creation of an object.
+
+        :param obj: the object to create.
+        :type obj: :class:`icat.entity.Entity`
+        """
+        key, obj = self._getEntity(obj)
+        self.creates.setdefault(key, obj)
+
+    def update(self, obj):
+        """Record the update of an object.
+
+        :param obj: the object to update.
+        :type obj: :class:`icat.entity.Entity`
+        """
+        key, obj = self._getEntity(obj)
+        if key not in self.creates and key not in self.deletes:
+            self.updates.setdefault(key, obj)
+
+    def delete(self, obj):
+        """Record the deletion of an object.
+
+        :param obj: the object to delete.
+        :type obj: :class:`icat.entity.Entity`
+        """
+        key, obj = self._getEntity(obj)
+        if key in self.creates:
+            del self.creates[key]
+        else:
+            self.updates.pop(key, None)
+            self.deletes.setdefault(key, obj)
+
+    def clear(self):
+        """Discard all recorded calls.
+        """
+        self.creates.clear()
+        self.updates.clear()
+        self.deletes.clear()
+
+    @staticmethod
+    def _sortLevels(objs):
+        """Sort objects into levels of dependencies.
+
+        Each object only depends on objects in lower levels.
+
+        :param objs: the objects.
+        :type objs: :class:`list` of :class:`icat.entity.Entity`
+        :return: the levels, each being a list of objects in the same
+            order as in `objs`.
+        :rtype: :class:`list` of :class:`list`
+        :raise DataConsistencyError: if the dependencies are circular.
+        """
+        keys = set(id(o.instance) for o in objs)
+        deps = {}
+        for o in objs:
+            key = id(o.instance)
+            deps[key] = set()
+            for r in o.InstRel:
+                v = getattr(o.instance, r, None)
+                if v is not None and id(v) in keys and id(v) != key:
+                    deps[key].add(id(v))
+        levels = []
+        done = set()
+        pending = list(objs)
+        while pending:
+            level = [ o for o in pending if deps[id(o.instance)] <= done ]
+            if not level:
+                raise DataConsistencyError("Circular dependencies between "
+                                           "%d objects." % len(pending))
+            levels.append(level)
+            done.update(id(o.instance) for o in level)
+            pending = [ o for o in pending if id(o.instance) not in done ]
+        return levels
+
+    def flush(self):
+        """Send all recorded calls to the server.
+
+        The objects are created first, then updated, and finally
+        deleted.  The recorded calls are discarded before sending
+        them, so if a call fails, the remaining ones are not sent.
+        The objects created so far have their ids set anyway.
+
+        :raise DataConsistencyError: if the dependencies between the
+            objects to create or to delete are circular.  Nothing has
+            been sent to the server in this case.
+        :raise ICATError: in case of exceptions raised by the ICAT
+            server.
+        :raise BatchCallError: if any batch or update failed.
+        """
+        creates = self._sortLevels(list(self.creates.values()))
+        updates = list(self.updates.values())
+        deletes = self._sortLevels(list(self.deletes.values()))
+        self.clear()
+        client = self.client
+        # Do not record our own calls if we are still active.
+        active = client.activeUnitOfWork
+        client.activeUnitOfWork = None
+        try:
+            ncalls = 0
+            for level in creates:
+                try:
+                    ids = client.createMany(level, batchsize=self.batchsize,
+                                            workers=self.workers)
+                except BatchCallError as e:
+                    self._setIds(level, e.result)
+                    raise
+                self._setIds(level, ids)
+                ncalls += 1
+            if updates:
+                client.updateMany(updates, workers=self.workers)
+                ncalls += 1
+            # Delete dependent objects first.
+            for level in reversed(deletes):
+                client.deleteMany(level, batchsize=self.batchsize,
+                                  workers=self.workers)
+                ncalls += 1
+            log.debug("Flush unit of work: %d objects created, %d updated, "
+                      "%d deleted in %d batches.",
+                      sum(len(l) for l in creates), len(updates),
+                      sum(len(l) for l in deletes), ncalls)
+        finally:
+            client.activeUnitOfWork = active
+
+    @staticmethod
+    def _setIds(objs, ids):
+        for o, id in zip(objs, ids):
+            if id is not None:
+                o.id = id
+                o._takeSnapshot(o.instance)
@@ -31,6 +31,8 @@ import logging
 import icat
 import icat.config
 from icat.query import Query
+from icat.includeadvisor import IncludeAdvisor
+from icat.chunking import AdaptiveChunkSize
 from icat.dumpfile import open_dumpfile
 try:
     import icat.dumpfile_xml
@@ -55,9 +57,16 @@ config.add_variable('file', ("-o", "--outputfile"),
 config.add_variable('format', ("-f", "--format"), 
                     dict(help="output file format", choices=formats),
                     default='YAML')
+config.add_variable('adviseIncludes', ("--advise-includes",), 
+                    dict(help="report the paths that should be added "
+                         "to or removed from the INCLUDE clauses"), 
+                    type=icat.config.flag, default=False)
 conf = config.getconfig()
 
-client = icat.Client(conf.url, **conf.client_kwargs)
+client_kwargs = dict(conf.client_kwargs)
+if conf.adviseIncludes:
+    client_kwargs['includeAdvisor'] = IncludeAdvisor()
+client = icat.Client(conf.url, **client_kwargs)
 if client.apiversion < '4.2.99':
     raise RuntimeError("Sorry, ICAT version %s is too old, need 4.3.0 or newer."
                        % client.apiversion)
@@ -124,20 +133,21 @@ statictypes = [Query(client, "Facility", order=True),
                Query(client, "Application", order=True, 
                      includes={"facility"}) ]
 investtypes = [Query(client, "Investigation", 
-                     conditions={"id":"in (%d)"}, 
+                     conditions={"id":"= :inv"}, 
                      includes=inv_includes), 
                Query(client, "Sample", order=["name"], 
-                     conditions={"investigation.id":"= %d"}, 
+                     conditions={"investigation.id":"= :inv"}, 
                      includes={"investigation", "type.facility", 
                                "parameters", "parameters.type.facility"}), 
                Query(client, "Dataset", order=["name"], 
-                     conditions={"investigation.id":"= %d"}, 
+                     conditions={"investigation.id":"= :inv"}, 
                      includes={"investigation", "type.facility", 
                                "sample", "parameters.type.facility"}), 
                Query(client, "Datafile", order=["dataset.name", "name"], 
-                     conditions={"dataset.investigation.id":"= %d"}, 
+                     conditions={"dataset.investigation.id":"= :inv"}, 
                      includes={"dataset", "datafileFormat.facility", 
                                "parameters.type.facility"}) ]
+investtypes = [ q.prepare(inv="id") for q in investtypes ]
 othertypes =  [Query(client, "Study", order=True, 
                      includes={"user", "studyInvestigations", 
                                "studyInvestigations.investigation.facility"}), 
@@ -160,10 +170,19 @@ with open_dumpfile(client, conf.file, conf.format, 'w') as dumpfile:
     # Dump the investigations each in their own chunk
     investsearch = ("SELECT i.id FROM Investigation i JOIN i.facility f "
                     "ORDER BY f.name, i.name, i.visitId")
+    # We fetch Dataset including DatasetParameter.  This may lead to
+    # a large total number of objects even for a small number of
+    # Datasets fetched at once.  Start with a very small chunksize
+    # and let it adapt, it will be reduced again if we hit the limit.
+    # The chunk sizes learned for one investigation are reused for the
+    # next ones.  Fetch the next chunks in the background while
+    # writing the previous ones.
+    chunksize = AdaptiveChunkSize(initial=5)
     for i in client.searchChunked(investsearch):
-        # We fetch Dataset including DatasetParameter.  This may lead
-        # to a large total number of objects even for a small number
-        # of Datasets fetched at once.  Set a very small chunksize to
-        # avoid hitting the limit.
-        dumpfile.writedata([ str(q) % (i) for q in investtypes ], chunksize=5)
+        dumpfile.writedata([ t.bind(inv=i) for t in investtypes ], 
+                           chunksize=chunksize, prefetch=2)
     dumpfile.writedata(othertypes)
+
+if client.includeAdvisor is not None:
+    logging.getLogger(__name__).info("Include advice:\n%s", 
+                                     client.includeAdvisor.report())
@@ -21,6 +21,10 @@
 #    for single objects.  If the object contains related objects in
 #    one to many relationships that are to be created at once, the
 #    only allowed option to deal with duplicates is THROW.
+#  + With --duplicate=OVERWRITE, the updates of the duplicate objects
+#    are deferred and done in bulk.  A failing update is therefore
+#    only reported after up to 1000 further duplicates have been
+#    read from the dump file.  The objects that failed are logged.
 #
 
 import os.path
@@ -78,6 +82,25 @@ if client.apiversion < '4.3':
 client.login(conf.auth, conf.credentials)
 
 
+# Objects to be updated with conf.duplicate == "OVERWRITE".  The
+# updates do not affect the relations, so they can be deferred and
+# done concurrently in bulk.
+updates = []
+updatesize = 1000
+
+def flush_updates():
+    if updates:
+        try:
+            client.updateMany(updates)
+        except icat.BatchCallError as e:
+            for batch, start, end, error in e.failed:
+                obj = updates[start]
+                log.error("Overwriting %s %s failed: %s", 
+                          obj.BeanName, obj.id, error)
+            raise
+        finally:
+            del updates[:]
+
 def check_duplicate(obj):
     """Deal with duplicate objects according conf.duplicate.
     """
@@ -101,7 +124,9 @@ def check_duplicate(obj):
             v = getattr(obj, a)
             if v is not None:
                 setattr(dobj, a, v)
-        dobj.update()
+        updates.append(dobj)
+        if len(updates) >= updatesize:
+            flush_updates()
     obj.id = dobj.id
 
 with open_dumpfile(client, conf.file, conf.format, 'r') as dumpfile:
@@ -114,3 +139,4 @@ with open_dumpfile(client, conf.file, conf.format, 'r') as dumpfile:
                 obj.create()
             except icat.ICATObjectExistsError:
                 check_duplicate(obj)
+    flush_updates()
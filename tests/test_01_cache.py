@@ -0,0 +1,104 @@
+"""Test module icat.cache
+"""
+
+import os.path
+import json
+import time
+import pytest
+import suds.sudsobject
+from icat.cache import ClientCache
+
+url = "https://icat.example.com/ICATService/ICAT?wsdl"
+
+
+class DocumentContext(object):
+    """Mimic the context that Suds passes to document plugins.
+    """
+    def __init__(self, url, document):
+        self.url = url
+        self.document = document
+
+
+def test_cache_metadata(tmpdirsec):
+    """Metadata is written to disk and read back by a new cache object.
+    """
+    cache = ClientCache(tmpdirsec.dir, url)
+    assert cache.get('apiversion') is None
+    cache.reset()
+    cache.set('apiversion', "4.7.0")
+    assert cache.get('apiversion') == "4.7.0"
+    assert os.path.isfile(os.path.join(cache.dir, "meta.json"))
+    cache2 = ClientCache(tmpdirsec.dir, url)
+    assert cache2.dir == cache.dir
+    assert cache2.get('apiversion') == "4.7.0"
+    # A different URL uses a different directory.
+    cache3 = ClientCache(tmpdirsec.dir, url + "&foo")
+    assert cache3.dir != cache.dir
+    assert cache3.get('apiversion') is None
+
+def test_cache_expire(tmpdirsec):
+    """Expired metadata is discarded.
+    """
+    cache = ClientCache(tmpdirsec.dir, url)
+    cache.reset(apiversion="4.7.0")
+    with open(os.path.join(cache.dir, "meta.json"), 'wt') as f:
+        meta = dict(cache.meta, timestamp=time.time() - 2*86400)
+        json.dump(meta, f)
+    cache2 = ClientCache(tmpdirsec.dir, url)
+    assert cache2.get('apiversion') is None
+    cache3 = ClientCache(tmpdirsec.dir, url, days=3)
+    assert cache3.get('apiversion') == "4.7.0"
+
+def test_cache_wsdl(tmpdirsec):
+    """Store and retrieve an object in the WSDL cache.
+
+    The object is stored under the digest of the loaded documents.
+    Storing a new WSDL resets all other metadata.
+    """
+    cache = ClientCache(tmpdirsec.dir, url + "&wsdl")
+    options = cache.sudsOptions()
+    wsdlcache = options['cache']
+    assert options['cachingpolicy'] == 1
+    assert wsdlcache.digest in options['plugins']
+    assert wsdlcache.get("wsdl") is None
+    wsdlcache.digest.loaded(DocumentContext(url, b"<definitions/>"))
+    obj = {'definitions': ["a", "b"]}
+    cache.set('apiversion', "4.7.0")
+    wsdlcache.put("wsdl", obj)
+    assert cache.get('wsdlDigest') == wsdlcache.digest.hexdigest()
+    assert cache.get('apiversion') is None
+    cache2 = ClientCache(tmpdirsec.dir, url + "&wsdl")
+    assert cache2.wsdlcache.get("wsdl") == obj
+    cache2.wsdlcache.clear()
+    assert cache2.wsdlcache.get("wsdl") is None
+    assert ClientCache(tmpdirsec.dir, url + "&wsdl").wsdlcache.get("x") is None
+
+def test_cache_entityinfo(tmpdirsec):
+    """Store and retrieve the entity info.
+
+    The entity info is stored for a specific API version and
+    discarded if the metadata is reset.
+    """
+    cache = ClientCache(tmpdirsec.dir, url + "&entityinfo")
+    field = suds.sudsobject.Factory.object('entityField', 
+                                           dict(name="name", type="String", 
+                                                relType="ATTRIBUTE", 
+                                                notNullable=True))
+    info = suds.sudsobject.Factory.object('entityInfo', 
+                                          dict(classComment="A facility", 
+                                               fields=[field]))
+    cache.reset()
+    assert cache.getEntityInfo("4.7.0") is None
+    cache.setEntityInfo("4.7.0", {'Facility': info})
+    cache2 = ClientCache(tmpdirsec.dir, url + "&entityinfo")
+    assert cache2.getEntityInfo("4.6.1") is None
+    cached = cache2.getEntityInfo("4.7.0")
+    assert list(cached.keys()) == ['Facility']
+    cinfo = cached['Facility']
+    assert isinstance(cinfo, suds.sudsobject.Object)
+    assert cinfo.__class__.__name__ == 'entityInfo'
+    assert cinfo.classComment == "A facility"
+    assert cinfo.fields[0].name == "name"
+    assert cinfo.fields[0].notNullable is True
+    cache2.reset()
+    assert cache2.getEntityInfo("4.7.0") is None
@@ -0,0 +1,131 @@
+"""Test module icat.chunking
+"""
+
+import threading
+from icat.chunking import queryShape, ReplySize, ChunkSize, AdaptiveChunkSize
+from icat.exception import ICATValidationError, ICATParameterError
+
+
+def rejection():
+    error = { 'code': "VALIDATION", 
+              'message': "attempt to return more than 20 entities" }
+    return ICATValidationError(error, None)
+
+def simulate(chunksize, query, total, limit=None):
+    """Simulate a chunked search, return the sizes requested.
+    """
+    stats = chunksize.getStats(query)
+    requested = []
+    delivered = 0
+    while delivered < total:
+        n = stats.chunksize
+        requested.append(n)
+        if limit is not None and n > limit:
+            assert chunksize.reject(stats, n, rejection())
+            continue
+        items = min(n, total - delivered)
+        chunksize.record(stats, n, items, 0.01 * items, 100 * items)
+        delivered += items
+    return requested
+
+
+def test_query_shape():
+    """Literals in the query are replaced.
+    """
+    q1 = "SELECT o FROM Dataset o WHERE o.investigation.id = 12 LIMIT 0, 10"
+    q2 = "SELECT o FROM Dataset o WHERE o.investigation.id = 345 LIMIT 0, 10"
+    assert queryShape(q1) == queryShape(q2)
+    q = "SELECT o FROM User o WHERE o.name = 'o''neil' AND o.id > 7"
+    assert queryShape(q) == "SELECT o FROM User o WHERE o.name = ? AND o.id > ?"
+
+def test_reply_size():
+    """The reply size is recorded per thread and may be set directly
+    for replies bypassing the Suds plugins.
+    """
+    replySize = ReplySize()
+    assert replySize.get() is None
+    replySize.set(1024)
+    sizes = []
+    def other():
+        sizes.append(replySize.get())
+        replySize.set(512)
+    thread = threading.Thread(target=other)
+    thread.start()
+    thread.join()
+    assert sizes == [None]
+    assert replySize.get() == 1024
+    replySize.set(None)
+    assert replySize.get() is None
+
+def test_fixed_chunksize():
+    """A fixed chunk size never changes but keeps statistics.
+    """
+    chunksize = ChunkSize(10)
+    requested = simulate(chunksize, "SELECT o FROM User o", 45)
+    assert requested == [10, 10, 10, 10, 10]
+    stats = chunksize.stats["SELECT o FROM User o"]
+    assert stats.calls == 5
+    assert stats.items == 45
+    assert stats.bytes == 4500
+    assert abs(stats.seconds - 0.45) < 1e-6
+    assert not chunksize.reject(stats, 10, rejection())
+
+def test_adaptive_grow():
+    """The chunk size grows as long as the calls are fast.
+    """
+    chunksize = AdaptiveChunkSize(initial=10, maxsize=200, targettime=10.0)
+    requested = simulate(chunksize, "SELECT o FROM User o", 1000)
+    assert requested[:5] == [10, 20, 40, 80, 160]
+    assert max(requested) == 200
+
+def test_adaptive_targettime():
+    """The chunk size does not grow beyond the target time.
+    """
+    chunksize = AdaptiveChunkSize(initial=10, maxsize=1000, targettime=0.5)
+    requested = simulate(chunksize, "SELECT o FROM User o", 1000)
+    assert max(requested) == 50
+    assert requested[-2] == 50
+
+def test_adaptive_targetbytes():
+    """The chunk size does not grow beyond the target payload.
+    """
+    chunksize = AdaptiveChunkSize(initial=10, maxsize=1000, targetbytes=3000)
+    requested = simulate(chunksize, "SELECT o FROM User o", 1000)
+    assert max(requested) == 30
+
+def test_adaptive_reject():
+    """Search calls that are rejected by the server are retried with
+    a smaller chunk size.  The chunk size converges to the largest
+    size accepted.
+    """
+    query = "SELECT o FROM Dataset o INCLUDE o.parameters"
+    chunksize = AdaptiveChunkSize(initial=10, maxsize=1000)
+    requested = simulate(chunksize, query, 2000, limit=37)
+    stats = chunksize.stats[query]
+    assert stats.items == 2000
+    assert 0 < stats.rejected <= 8
+    assert stats.chunksize == 37
+    assert requested[-3:-1] == [37, 37]
+    # A new search with the same query shape does not hit the limit
+    # any more.
+    before = stats.rejected
+    simulate(chunksize, query, 500, limit=37)
+    assert stats.rejected == before
+
+def test_adaptive_reject_other_error():
+    """Other errors are not handled.
+    """
+    chunksize = AdaptiveChunkSize(initial=10, maxsize=1000)
+    stats = chunksize.getStats("SELECT o FROM User o")
+    error = { 'code': "BAD_PARAMETER", 'message': "Bad query" }
+    assert not chunksize.reject(stats, 10, ICATParameterError(error, None))
+    assert stats.rejected == 0
+    assert stats.chunksize == 10
+
+def test_adaptive_minsize():
+    """The rejection is not handled if the chunk size is already at
+    the minimum.
+    """
+    chunksize = AdaptiveChunkSize(initial=1, maxsize=1000)
+    stats = chunksize.getStats("SELECT o FROM User o")
+    assert not chunksize.reject(stats, 1, rejection())
@@ -0,0 +1,83 @@
+"""Test module icat.compact
+"""
+
+import pytest
+from suds.sudsobject import Factory
+import icat.entities
+from icat.client import TypeMap47
+from icat.compact import CompactRecord, recordClass, compactInstance
+
+
+class SudsFactory(object):
+    """A minimal stand in for the Suds factory of a client, creating
+    instances with all attributes and dummy related objects.
+    """
+    def create(self, name):
+        Class = TypeMap47[name]
+        instance = Factory.object(name)
+        for a in Class.InstAttr | Class.MetaAttr:
+            setattr(instance, a, None)
+        for a in Class.InstRel | Class.InstMRel:
+            setattr(instance, a, Factory.object('dummy'))
+        return instance
+
+
+def test_record_class():
+    """Record classes have slots for the attributes of the entity class.
+    """
+    rclass = recordClass(TypeMap47, 'datafile')
+    assert rclass is recordClass(TypeMap47, 'datafile')
+    assert rclass.__name__ == 'datafile'
+    Class = TypeMap47['datafile']
+    assert rclass.EntityClass is Class
+    assert set(rclass.Fields) == (Class.InstAttr | Class.MetaAttr |
+                                  Class.InstRel | Class.InstMRel)
+    record = rclass()
+    assert not hasattr(record, '__dict__')
+    with pytest.raises(AttributeError):
+        record.name
+    with pytest.raises(AttributeError):
+        record.foo = "bar"
+    with pytest.raises(TypeError):
+        recordClass(TypeMap47, 'parameter')
+    with pytest.raises(TypeError):
+        recordClass(TypeMap47, 'foo')
+
+def test_entity():
+    """Records may be used as instance in entity objects.
+    """
+    record = recordClass(TypeMap47, 'datafile')()
+    datafile = TypeMap47['datafile'](None, record, name="a.dat", id=42)
+    assert datafile.name == "a.dat"
+    assert datafile.description is None
+    assert datafile.instancetype == "datafile"
+    assert dict(record) == dict(name="a.dat", id=42)
+    assert "a.dat" in str(datafile)
+    del datafile.name
+    assert dict(record) == dict(id=42)
+
+def test_convert():
+    """Convert Suds instances to records and back.
+    """
+    facility = Factory.object('facility', dict(id=1, name="ESNF"))
+    investigation = Factory.object('investigation',
+                                   dict(id=10, name="inv",
+                                        facility=facility, datasets=[]))
+    for i in range(3):
+        dataset = Factory.object('dataset', dict(id=100 + i,
+                                                 name="ds%d" % i,
+                                                 investigation=investigation))
+        investigation.datasets.append(dataset)
+    record = compactInstance(TypeMap47, investigation)
+    assert isinstance(record, CompactRecord)
+    assert record.facility.name == "ESNF"
+    assert [ ds.name for ds in record.datasets ] == ["ds0", "ds1", "ds2"]
+    assert all(ds.investigation is record for ds in record.datasets)
+    instance = record.toSuds(SudsFactory())
+    assert instance.__class__.__name__ == "investigation"
+    assert instance.name == "inv"
+    assert instance.facility.name == "ESNF"
+    assert instance.title is None
+    assert not hasattr(instance, 'investigationUsers')
+    assert [ ds.id for ds in instance.datasets ] == [100, 101, 102]
+    assert all(ds.investigation is instance for ds in instance.datasets)
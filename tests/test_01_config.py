@@ -73,7 +73,7 @@ def test_config_minimal():
     conf = icat.config.Config(needlogin=False).getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'checkCert', 'client_kwargs', 'configDir', 
+    assert attrs == [ 'cacheDir', 'checkCert', 'client_kwargs', 'configDir', 
                       'configFile', 'configSection', 'http_proxy', 
                       'https_proxy', 'no_proxy', 'url' ]
 
@@ -105,7 +105,7 @@ def test_config_minimal_file(tmpconfigfile, monkeypatch):
     conf = icat.config.Config(needlogin=False).getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'checkCert', 'client_kwargs', 'configDir', 
+    assert attrs == [ 'cacheDir', 'checkCert', 'client_kwargs', 'configDir', 
                       'configFile', 'configSection', 'http_proxy', 
                       'https_proxy', 'no_proxy', 'url' ]
 
@@ -125,9 +125,9 @@ def test_config_simple_login(tmpconfigfile):
     conf = icat.config.Config().getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'no_proxy', 
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'no_proxy', 
                       'password', 'promptPass', 'url', 'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
@@ -152,9 +152,9 @@ def test_config_override(tmpconfigfile):
     conf = icat.config.Config().getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'no_proxy', 
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'no_proxy', 
                       'password', 'promptPass', 'url', 'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
@@ -184,9 +184,9 @@ def test_config_askpass(tmpconfigfile, monkeypatch):
     conf = icat.config.Config().getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'no_proxy', 
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'no_proxy', 
                       'password', 'promptPass', 'url', 'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
@@ -217,9 +217,9 @@ def test_config_nopass_askpass(tmpconfigfile, monkeypatch):
     conf = icat.config.Config().getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'no_proxy', 
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'no_proxy', 
                       'password', 'promptPass', 'url', 'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
@@ -247,9 +247,9 @@ def test_config_askpass_file(tmpconfigfile, monkeypatch):
     conf = icat.config.Config().getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'no_proxy', 
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'no_proxy', 
                       'password', 'promptPass', 'url', 'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
@@ -277,9 +277,9 @@ def test_config_environment(tmpconfigfile, monkeypatch):
     conf = icat.config.Config().getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'no_proxy', 
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'no_proxy', 
                       'password', 'promptPass', 'url', 'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
@@ -311,10 +311,11 @@ def test_config_ids(tmpconfigfile):
     conf = icat.config.Config(ids="optional").getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'idsurl', 'no_proxy', 
-                      'password', 'promptPass', 'url', 'username' ]
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'idsurl', 
+                      'no_proxy', 'password', 'promptPass', 'url', 
+                      'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
     assert conf.configDir == tmpconfigfile.dir
@@ -333,10 +334,11 @@ def test_config_ids(tmpconfigfile):
     conf = icat.config.Config(ids="optional").getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'idsurl', 'no_proxy', 
-                      'password', 'promptPass', 'url', 'username' ]
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'idsurl', 
+                      'no_proxy', 'password', 'promptPass', 'url', 
+                      'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
     assert conf.configDir == tmpconfigfile.dir
@@ -370,9 +372,9 @@ def test_config_custom_var(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'http_proxy', 'https_proxy', 'ldap_base', 
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'http_proxy', 'https_proxy', 'ldap_base', 
                       'ldap_filter', 'ldap_uri', 'no_proxy', 'password', 
                       'promptPass', 'url', 'username' ]
 
@@ -404,10 +406,11 @@ def test_config_subst_nosubst(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'greeting', 'http_proxy', 'https_proxy', 'no_proxy', 
-                      'password', 'promptPass', 'url', 'username' ]
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'greeting', 'http_proxy', 'https_proxy', 
+                      'no_proxy', 'password', 'promptPass', 'url', 
+                      'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
     assert conf.configDir == tmpconfigfile.dir
@@ -435,10 +438,11 @@ def test_config_subst(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'greeting', 'http_proxy', 'https_proxy', 'no_proxy', 
-                      'password', 'promptPass', 'url', 'username' ]
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'greeting', 'http_proxy', 'https_proxy', 
+                      'no_proxy', 'password', 'promptPass', 'url', 
+                      'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
     assert conf.configDir == tmpconfigfile.dir
@@ -468,10 +472,11 @@ def test_config_subst_cmdline(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'greeting', 'http_proxy', 'https_proxy', 'no_proxy', 
-                      'password', 'promptPass', 'url', 'username' ]
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'greeting', 'http_proxy', 'https_proxy', 
+                      'no_proxy', 'password', 'promptPass', 'url', 
+                      'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
     assert conf.configDir == tmpconfigfile.dir
@@ -497,9 +502,9 @@ def test_config_subst_confdir(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'extracfg', 
-                      'http_proxy', 'https_proxy', 'no_proxy', 'url' ]
+    assert attrs == [ 'cacheDir', 'checkCert', 'client_kwargs', 'configDir', 
+                      'configFile', 'configSection', 'extracfg', 'http_proxy', 
+                      'https_proxy', 'no_proxy', 'url' ]
 
     assert conf.configFile == [tmpconfigfile.path]
     assert conf.configDir == tmpconfigfile.dir
@@ -519,7 +524,7 @@ def test_config_type_int(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'checkCert', 'client_kwargs', 'configDir', 
+    assert attrs == [ 'cacheDir', 'checkCert', 'client_kwargs', 'configDir', 
                       'configFile', 'configSection', 'http_proxy', 
                       'https_proxy', 'no_proxy', 'num', 'url' ]
 
@@ -560,7 +565,7 @@ def test_config_type_boolean(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'checkCert', 'client_kwargs', 'configDir', 
+    assert attrs == [ 'cacheDir', 'checkCert', 'client_kwargs', 'configDir', 
                       'configFile', 'configSection', 'flag1', 'flag2', 
                       'http_proxy', 'https_proxy', 'no_proxy', 'url' ]
 
@@ -576,7 +581,7 @@ def test_config_type_boolean(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'checkCert', 'client_kwargs', 'configDir', 
+    assert attrs == [ 'cacheDir', 'checkCert', 'client_kwargs', 'configDir', 
                       'configFile', 'configSection', 'flag1', 'flag2', 
                       'http_proxy', 'https_proxy', 'no_proxy', 'url' ]
 
@@ -601,7 +606,7 @@ def test_config_type_flag(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'checkCert', 'client_kwargs', 'configDir', 
+    assert attrs == [ 'cacheDir', 'checkCert', 'client_kwargs', 'configDir', 
                       'configFile', 'configSection', 'flag1', 'flag2', 
                       'http_proxy', 'https_proxy', 'no_proxy', 'url' ]
 
@@ -618,7 +623,7 @@ def test_config_type_flag(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'checkCert', 'client_kwargs', 'configDir', 
+    assert attrs == [ 'cacheDir', 'checkCert', 'client_kwargs', 'configDir', 
                       'configFile', 'configSection', 'flag1', 'flag2', 
                       'http_proxy', 'https_proxy', 'no_proxy', 'url' ]
 
@@ -645,10 +650,11 @@ def test_config_positional(tmpconfigfile):
     conf = config.getconfig(args)
 
     attrs = [ a for a in sorted(conf.__dict__.keys()) if a[0] != '_' ]
-    assert attrs == [ 'auth', 'checkCert', 'client_kwargs', 'configDir', 
-                      'configFile', 'configSection', 'credentials', 
-                      'datafile', 'http_proxy', 'https_proxy', 'no_proxy', 
-                      'password', 'promptPass', 'url', 'username' ]
+    assert attrs == [ 'auth', 'cacheDir', 'checkCert', 'client_kwargs', 
+                      'configDir', 'configFile', 'configSection', 
+                      'credentials', 'datafile', 'http_proxy', 'https_proxy', 
+                      'no_proxy', 'password', 'promptPass', 'url', 
+                      'username' ]
 
     assert conf.configFile == [tmpconfigfile.path]
     assert conf.configDir == tmpconfigfile.dir
@@ -0,0 +1,101 @@
+"""Test the attribute access in entity objects.
+
+The dispatch table in the entity classes and the attribute access
+based on it do not need a client, as long as no related objects are
+retrieved.
+"""
+
+import pytest
+from suds.sudsobject import Factory
+import icat.entities
+from icat.entity import Entity
+
+
+def test_dispatch_alias():
+    """Aliases are resolved in the dispatch table.
+    """
+    assert (icat.entities.UserGroup._AttrDispatch['grouping'] ==
+            icat.entities.UserGroup._AttrDispatch['group'])
+    assert (icat.entities.UserGroup43._AttrDispatch['group'] ==
+            icat.entities.UserGroup43._AttrDispatch['grouping'])
+    assert 'grouping' not in icat.entities.User._AttrDispatch
+
+def test_get_set_del():
+    """Get, set, and delete attributes.
+    """
+    instance = Factory.object('datafile', dict(id=42, name="a.dat",
+                                               createId="root"))
+    datafile = icat.entities.Datafile(None, instance, fileSize=10)
+    assert datafile.name == "a.dat"
+    assert datafile.createId == "root"
+    assert datafile.description is None
+    assert datafile.fileSize == instance.fileSize == 10
+    assert datafile.instancetype == "datafile"
+    dataset = Factory.object('dataset', dict(id=1))
+    datafile.dataset = dataset
+    assert instance.dataset is dataset
+    del datafile.name
+    assert not hasattr(instance, 'name')
+    del datafile.name
+    with pytest.raises(AttributeError):
+        datafile.createId = "nobody"
+    with pytest.raises(AttributeError):
+        datafile.foo = "bar"
+    with pytest.raises(AttributeError):
+        datafile.foo
+    with pytest.raises(AttributeError):
+        del datafile.foo
+
+def test_set_alias():
+    """Set an attribute by its alias name.
+    """
+    grouping = Factory.object('grouping', dict(id=4))
+    instance = Factory.object('userGroup', dict(id=3))
+    usergroup = icat.entities.UserGroup(None, instance, grouping=grouping)
+    assert instance.group is grouping
+    del usergroup.grouping
+    assert not hasattr(instance, 'group')
+
+def test_dispatch_update():
+    """The dispatch table follows changes of the class attributes,
+    also in subclasses.
+    """
+    class Base(Entity):
+        BeanName = 'Base'
+        InstAttr = frozenset(['id', 'name'])
+    class Derived(Base):
+        pass
+    assert 'description' not in Derived._AttrDispatch
+    Base.InstAttr = frozenset(['id', 'name', 'description'])
+    assert 'description' in Base._AttrDispatch
+    assert 'description' in Derived._AttrDispatch
+    Derived.AttrAlias = {'desc': 'description'}
+    assert Derived._AttrDispatch['desc'] == Base._AttrDispatch['description']
+    assert 'desc' not in Base._AttrDispatch
+
+def test_modified_attrs():
+    """Track the attributes modified since the last snapshot.
+    """
+    dataset = Factory.object('dataset', dict(id=1))
+    instance = Factory.object('datafile', dict(id=42, name="a.dat",
+                                               dataset=dataset))
+    datafile = icat.entities.Datafile(None, instance)
+    assert datafile.getModifiedAttrs() is None
+    datafile._takeSnapshot(instance)
+    assert datafile.getModifiedAttrs() == frozenset()
+    assert '__snapshot__' not in dict(instance)
+    datafile.name = "a.dat"
+    datafile.description = None
+    assert datafile.getModifiedAttrs() == frozenset()
+    datafile.name = "b.dat"
+    datafile.fileSize = 10
+    assert datafile.getModifiedAttrs() == frozenset(['name', 'fileSize'])
+    # Only the id of related objects is taken into account.
+    dataset.name = "foo"
+    datafile.dataset = Factory.object('dataset', dict(id=1))
+    assert datafile.getModifiedAttrs() == frozenset(['name', 'fileSize'])
+    datafile.dataset = Factory.object('dataset', dict(id=2))
+    assert datafile.getModifiedAttrs() == frozenset(['name', 'fileSize',
+                                                     'dataset'])
+    datafile._takeSnapshot(instance)
+    assert datafile.getModifiedAttrs() == frozenset()
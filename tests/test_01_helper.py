@@ -168,6 +168,43 @@ def test_helper_parse_attr_string_date():
     if d.tzinfo:
         assert d.isoformat() == "2008-06-18T07:31:11+00:00"
 
+@pytest.mark.parametrize(("query", "clauses"), [
+    ("SELECT o FROM User o", 
+     {'SELECT': "SELECT o FROM User o"}),
+    ("SELECT o FROM Datafile o JOIN o.dataset AS ds "
+     "WHERE ds.name = 'e208945' AND o.name LIKE 'e%' "
+     "ORDER BY o.name INCLUDE o.dataset LIMIT 0, 10", 
+     {'SELECT': "SELECT o FROM Datafile o JOIN o.dataset AS ds", 
+      'WHERE': "ds.name = 'e208945' AND o.name LIKE 'e%'", 
+      'ORDER BY': "o.name", 'INCLUDE': "o.dataset", 'LIMIT': "0, 10"}),
+    ("select i.id from Investigation i order  by i.name", 
+     {'SELECT': "select i.id from Investigation i", 'ORDER BY': "i.name"}),
+    ("SELECT o FROM Rule o WHERE o.what = 'Dataset ORDER BY name' "
+     "AND o.id IN (SELECT r.id FROM Rule r WHERE r.crudFlags = 'R') "
+     "INCLUDE o.grouping", 
+     {'SELECT': "SELECT o FROM Rule o", 
+      'WHERE': ("o.what = 'Dataset ORDER BY name' "
+                "AND o.id IN (SELECT r.id FROM Rule r "
+                "WHERE r.crudFlags = 'R')"), 
+      'INCLUDE': "o.grouping"}),
+])
+def test_helper_parse_jpql_clauses(query, clauses):
+    """Test parse_jpql_clauses()
+    """
+    res = parse_jpql_clauses(query)
+    for k in ['SELECT', 'WHERE', 'ORDER BY', 'INCLUDE', 'LIMIT']:
+        assert res[k] == clauses.get(k)
+
+@pytest.mark.parametrize(("query",), [
+    ("User [name='jdoe']",),
+    ("SELECT o FROM User o WHERE o.id > 1 WHERE o.id < 10",),
+])
+def test_helper_parse_jpql_clauses_err(query):
+    """Test error conditions in parse_jpql_clauses()
+    """
+    with pytest.raises(ValueError):
+        parse_jpql_clauses(query)
+
 @pytest.mark.parametrize(("dt", "ms"), [
     (datetime.datetime(2008, 6, 18, 7, 31, 11), 1213774271000), 
     ("2008-06-18T07:31:11", 1213774271000), 
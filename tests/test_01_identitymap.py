@@ -0,0 +1,98 @@
+"""Test module icat.identitymap
+"""
+
+import gc
+from suds.sudsobject import Factory
+import icat.entities
+from icat.client import TypeMap47
+from icat.identitymap import IdentityMap
+
+
+def facility(id, name="ESNF"):
+    return Factory.object('facility', dict(id=id, name=name))
+
+def investigation(id, name, facility=None):
+    inv = Factory.object('investigation', dict(id=id, name=name))
+    if facility is not None:
+        inv.facility = facility
+    return inv
+
+def dataset(id, name, investigation):
+    return Factory.object('dataset', dict(id=id, name=name,
+                                          investigation=investigation))
+
+
+def test_related_instances():
+    """The same related object in several instances is replaced by
+    one single instance.
+    """
+    idmap = IdentityMap(TypeMap47)
+    datasets = [ dataset(i, "ds%d" % i,
+                         investigation(10 + i % 2, "inv%d" % (i % 2),
+                                       facility(1)))
+                 for i in range(6) ]
+    datasets = [ idmap.getInstance(ds) for ds in datasets ]
+    facilities = set(id(ds.investigation.facility) for ds in datasets)
+    investigations = set(id(ds.investigation) for ds in datasets)
+    assert len(facilities) == 1
+    assert len(investigations) == 2
+    assert len(idmap) == 6 + 2 + 1
+
+def test_merge():
+    """A new instance for a known object updates the known one, but
+    keeps related objects not present in the new instance.
+    """
+    idmap = IdentityMap(TypeMap47)
+    inv = idmap.getInstance(investigation(10, "inv", facility(1)))
+    newinv = investigation(10, "inv", None)
+    newinv.title = "New title"
+    assert idmap.getInstance(newinv) is inv
+    assert inv.title == "New title"
+    assert inv.facility.name == "ESNF"
+    assert idmap.getInstance(inv) is inv
+
+def test_merge_list():
+    """Lists of related objects are updated in place.
+    """
+    idmap = IdentityMap(TypeMap47)
+    inv = investigation(10, "inv")
+    inv.datasets = [ dataset(1, "ds1", None) ]
+    inv = idmap.getInstance(inv)
+    datasets = inv.datasets
+    newinv = investigation(10, "inv")
+    newinv.datasets = [ dataset(1, "ds1", None), dataset(2, "ds2", None) ]
+    assert idmap.getInstance(newinv) is inv
+    assert inv.datasets is datasets
+    assert [ ds.name for ds in datasets ] == ["ds1", "ds2"]
+
+def test_no_id():
+    """Instances without an id are not added to the map.
+    """
+    idmap = IdentityMap(TypeMap47)
+    fac = Factory.object('facility', dict(name="ESNF"))
+    assert idmap.getInstance(fac) is fac
+    assert len(idmap) == 0
+
+def test_entity():
+    """Entity objects are found in the map by their instance.
+    """
+    idmap = IdentityMap(TypeMap47)
+    fac = idmap.getInstance(facility(1))
+    assert idmap.getEntity(fac) is None
+    obj = icat.entities.Facility(None, fac)
+    idmap.addEntity(obj)
+    assert idmap.getEntity(fac) is obj
+    assert idmap.getEntity(idmap.getInstance(facility(1))) is obj
+    assert idmap.getEntity(facility(1)) is None
+
+def test_weak():
+    """Objects are dropped from the map when not used any more.
+    """
+    idmap = IdentityMap(TypeMap47)
+    inv = idmap.getInstance(investigation(10, "inv", facility(1)))
+    idmap.addEntity(icat.entities.Investigation44(None, inv))
+    assert len(idmap) == 2
+    del inv
+    gc.collect()
+    assert len(idmap) == 0
+    assert len(idmap.entities) == 0
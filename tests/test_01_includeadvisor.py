@@ -0,0 +1,112 @@
+"""Test module icat.includeadvisor
+
+The access to related objects is recorded in the entity objects
+themselves, so this may be tested with a minimal stand in for the
+client.
+"""
+
+import pytest
+from suds.sudsobject import Factory
+import icat.entities
+from icat.client import TypeMap47
+from icat.includeadvisor import IncludeAdvisor, _parseQuery
+
+
+class FakeClient(object):
+    """A minimal stand in for a client.
+    """
+    def new(self, instance):
+        if instance is None:
+            return None
+        return TypeMap47[instance.__class__.__name__](self, instance)
+
+    getEntity = new
+
+
+@pytest.mark.parametrize(("query", "result"), [
+    ("Dataset", ("Dataset", frozenset())),
+    ("Dataset INCLUDE 1", ("Dataset", frozenset(["1"]))),
+    ("Datafile <-> Dataset [id=4] INCLUDE Dataset", ("Datafile", None)),
+    ("SELECT o FROM Dataset o WHERE o.id = 4", ("Dataset", frozenset())),
+    ("SELECT o FROM Dataset o INCLUDE 1", ("Dataset", frozenset(["1"]))),
+    ("SELECT i FROM Investigation i JOIN i.facility f "
+     "WHERE f.name = 'ESNF' ORDER BY i.name "
+     "INCLUDE i.facility, i.investigationUsers AS iu, iu.user LIMIT 0, 10",
+     ("Investigation", frozenset(["facility", "investigationUsers",
+                                  "investigationUsers.user"]))),
+])
+def test_parse_query(query, result):
+    """Get the entity type and the includes from a query.
+    """
+    assert _parseQuery(query) == result
+
+def test_advise():
+    """Record the access to related objects and derive the advice.
+    """
+    client = FakeClient()
+    advisor = IncludeAdvisor()
+    facility = Factory.object('facility', dict(id=1, name="ESNF"))
+    invtype = Factory.object('investigationType', dict(id=2, name="exp"))
+    investigations = []
+    for i in range(4):
+        user = Factory.object('user', dict(id=20 + i, name="u%d" % i))
+        iu = Factory.object('investigationUser', dict(id=10 + i, user=user))
+        instance = Factory.object('investigation',
+                                  dict(id=100 + i, name="inv%d" % i,
+                                       facility=facility, type=invtype,
+                                       investigationUsers=[iu]))
+        investigations.append(client.new(instance))
+    query = ("SELECT o FROM Investigation o "
+             "INCLUDE o.facility, o.type AS t, t.facility")
+    advisor.searchResult(query, investigations + [42])
+    for inv in investigations:
+        assert inv.facility.name == "ESNF"
+        for iu in inv.investigationUsers:
+            assert iu.user.name.startswith("u")
+    # Some code getting objects one by one.
+    advisor.get("InvestigationUser INCLUDE 1", 11)
+    advisor.get("InvestigationUser INCLUDE 1", 12)
+    advisor.get("User", 22)
+    advisor.get("Investigation INCLUDE 1", 103)
+    advisor.get("Investigation", 999)
+    search = ("Investigation", 
+              frozenset(["facility", "type", "type.facility"]))
+    stats = advisor.searches[search]
+    assert stats["facility"].accesses == 4
+    assert stats["facility"].uncovered == 0
+    assert stats["investigationUsers"].uncovered == 4
+    assert stats["investigationUsers.user"].accesses == 4
+    assert stats["facility"].covered
+    assert not stats["investigationUsers"].covered
+    advice = advisor.advise()
+    assert [ (a.path, a.roundTrips) for a in advice ] == [
+        ("investigationUsers.user", 3),
+        ("investigationUsers.investigation", 2),
+    ]
+    assert all(a.includes == search[1] for a in advice)
+    paths = [ a.path for a in advisor.advise(minimum=0) ]
+    assert paths == ["investigationUsers.user", 
+                     "investigationUsers.investigation", 
+                     "investigationUsers"]
+    assert advisor.unusedIncludes() == {search: set(["type", 
+                                                     "type.facility"])}
+    report = advisor.report()
+    assert "investigationUsers.user: 3 round trips" in report
+    assert "type, type.facility" in report
+    advisor.clear()
+    assert advisor.report() == "Nothing to report."
+
+def test_maxseen():
+    """Only the most recently tagged objects are remembered.
+    """
+    client = FakeClient()
+    advisor = IncludeAdvisor(maxseen=3)
+    datasets = [ client.new(Factory.object('dataset',
+                                           dict(id=i, name="ds%d" % i)))
+                 for i in range(5) ]
+    advisor.searchResult("SELECT o FROM Dataset o", datasets)
+    assert len(advisor.seen) == 3
+    advisor.get("Dataset INCLUDE 1", 0)
+    advisor.get("Dataset INCLUDE 1", 4)
+    stats = advisor.searches["Dataset", frozenset()]
+    assert stats["investigation"].roundTrips == 1
@@ -0,0 +1,151 @@
+"""Test module icat.lazyload
+
+Loading relations only needs the search() and new() methods of the
+client, so it may be tested with a minimal stand in for the client
+that answers the queries from a set of objects.
+"""
+
+import re
+import pytest
+from suds.sudsobject import Factory
+import icat.entities
+from icat.client import TypeMap47
+from icat.lazyload import ResultGroup
+from icat.includeadvisor import IncludeAdvisor
+from icat.identitymap import IdentityMap
+
+
+class FakeClient(object):
+    """A minimal stand in for a client.
+
+    Answer the queries issued by the lazy loading from a dict of
+    related objects per entity type, relation, and id.
+    """
+    def __init__(self, related, identityMap=None):
+        self.related = related
+        self.identityMap = identityMap
+        self.queries = []
+
+    def new(self, instance):
+        if instance is None:
+            return None
+        return TypeMap47[instance.__class__.__name__](self, instance)
+
+    def _searchInstances(self, query):
+        self.queries.append(query)
+        m = re.match(r"SELECT o FROM (\w+) o WHERE o.id IN \(([\d, ]+)\) "
+                     r"INCLUDE o.(\w+)$", query)
+        assert m
+        beanname, ids, attr = m.groups()
+        itype = beanname[0].lower() + beanname[1:]
+        result = []
+        for id in [ int(i) for i in ids.split(",") ]:
+            instance = Factory.object(itype, dict(id=id))
+            value = self.related[beanname, attr].get(id)
+            if value is not None:
+                setattr(instance, attr, value)
+            result.append(instance)
+        return result
+
+
+def datafiles(client, n):
+    objs = []
+    for i in range(n):
+        instance = Factory.object('datafile', dict(id=i, name="df%d" % i))
+        df = client.new(instance)
+        df._takeSnapshot(df.instance)
+        objs.append(df)
+    return objs
+
+
+def test_load_rel():
+    """Load a many to one relation for all objects in a group in one
+    call, also the relation of the related objects in turn.
+    """
+    investigation = Factory.object('investigation', dict(id=1, name="inv"))
+    datasets = [ Factory.object('dataset', dict(id=10 + i, name="ds%d" % i))
+                 for i in range(2) ]
+    client = FakeClient({
+        ('Datafile', 'dataset'): { i: datasets[i % 2] for i in range(5) },
+        ('Dataset', 'investigation'): { 10: investigation, 11: investigation },
+    })
+    client.related['Datafile', 'dataset'][4] = None
+    objs = datafiles(client, 6)
+    group = ResultGroup(objs + [42])
+    assert len(group) == 6
+    # The last object has no id, nothing can be loaded for it.
+    del objs[5].id
+    names = [ df.dataset.name if df.dataset else None for df in objs ]
+    assert names == ["ds0", "ds1", "ds0", "ds1", None, None]
+    assert len(client.queries) == 1
+    assert "o.id IN (0, 1, 2, 3, 4)" in client.queries[0]
+    assert all(df.getModifiedAttrs() == frozenset() for df in objs[:5])
+    invnames = set(df.dataset.investigation.name for df in objs[:4])
+    assert invnames == set(["inv"])
+    assert len(client.queries) == 2
+    assert "o.id IN (10, 11)" in client.queries[1]
+
+def test_load_mrel():
+    """Load a one to many relation for all objects in a group.
+    """
+    params = { i: [ Factory.object('datafileParameter',
+                                   dict(id=100 + 10*i + j, stringValue="p"))
+                    for j in range(i) ]
+               for i in range(3) }
+    client = FakeClient({('Datafile', 'parameters'): params})
+    objs = datafiles(client, 4)
+    ResultGroup(objs)
+    assert [ len(df.parameters) for df in objs ] == [0, 1, 2, 0]
+    assert len(client.queries) == 1
+
+def test_batchsize(monkeypatch):
+    """Large groups are loaded in batches.
+    """
+    monkeypatch.setattr(ResultGroup, 'batchsize', 4)
+    client = FakeClient({('Datafile', 'dataset'): {}})
+    objs = datafiles(client, 10)
+    ResultGroup(objs)
+    assert objs[0].dataset is None
+    assert len(client.queries) == 3
+    assert all(df.instance.dataset is None for df in objs)
+    objs[9].dataset
+    assert len(client.queries) == 3
+
+def test_advisor():
+    """The searches to load relations are not recorded by an include
+    advisor, only the round trips they take.
+    """
+    datasets = [ Factory.object('dataset', dict(id=10 + i, name="ds%d" % i))
+                 for i in range(2) ]
+    client = FakeClient({
+        ('Datafile', 'dataset'): { i: datasets[i % 2] for i in range(4) },
+    })
+    objs = datafiles(client, 4)
+    advisor = IncludeAdvisor()
+    advisor.searchResult("SELECT o FROM Datafile o", objs)
+    ResultGroup(objs)
+    assert [ df.dataset.name for df in objs ] == ["ds0", "ds1", "ds0", "ds1"]
+    assert len(client.queries) == 1
+    assert list(advisor.searches.keys()) == [("Datafile", frozenset())]
+    stats = advisor.searches["Datafile", frozenset()]["dataset"]
+    assert stats.accesses == 4
+    assert stats.roundTrips == 1
+    assert advisor.seen["datafile", 0][:2] == (("Datafile", frozenset()), "")
+
+def test_identitymap():
+    """With an identity map, the related objects loaded are merged into
+    it, but local modifications in the objects of the group are kept.
+    """
+    dataset = Factory.object('dataset', dict(id=10, name="ds"))
+    known = Factory.object('dataset', dict(id=10, name="ds"))
+    idmap = IdentityMap(TypeMap47)
+    assert idmap.getInstance(known) is known
+    client = FakeClient({('Datafile', 'dataset'): { 0: dataset, 1: dataset }},
+                        identityMap=idmap)
+    objs = datafiles(client, 2)
+    ResultGroup(objs)
+    objs[1].name = "changed"
+    assert objs[0].dataset.instance is known
+    assert objs[1].instance.dataset is known
+    assert objs[1].name == "changed"
+    assert objs[1].getModifiedAttrs() == frozenset(["name"])
@@ -0,0 +1,147 @@
+"""Test module icat.parallel
+"""
+
+import time
+import threading
+import pytest
+from icat.parallel import BackgroundIterator, WorkerPool
+
+
+def test_background_iterator():
+    """Iterate over a list in a background thread.
+    """
+    items = list(range(20))
+    it = BackgroundIterator(items, maxsize=3)
+    assert list(it) == items
+    # The iterator is exhausted now.
+    assert list(it) == []
+    it.thread.join(1.0)
+    assert not it.thread.is_alive()
+
+def test_background_iterator_runahead():
+    """The worker thread runs ahead by at most maxsize items.
+    """
+    fetched = []
+    def gen():
+        for i in range(10):
+            fetched.append(i)
+            yield i
+    it = BackgroundIterator(gen(), maxsize=2)
+    assert next(it) == 0
+    time.sleep(0.2)
+    # One item consumed, two in the queue, one in the hands of the
+    # worker waiting for a free slot.
+    assert len(fetched) <= 4
+    assert list(it) == list(range(1, 10))
+
+def test_background_iterator_error():
+    """An exception in the worker is raised in the consumer.
+    """
+    def gen():
+        yield 1
+        yield 2
+        raise ValueError("spam")
+    it = BackgroundIterator(gen())
+    assert next(it) == 1
+    assert next(it) == 2
+    with pytest.raises(ValueError):
+        next(it)
+    with pytest.raises(StopIteration):
+        next(it)
+
+def test_background_iterator_close():
+    """Closing the iterator stops the worker thread.
+    """
+    def gen():
+        i = 0
+        while True:
+            yield i
+            i += 1
+    it = BackgroundIterator(gen(), maxsize=1)
+    assert next(it) == 0
+    it.close()
+    it.thread.join(1.0)
+    assert not it.thread.is_alive()
+    with pytest.raises(StopIteration):
+        next(it)
+
+def test_worker_pool_ordered():
+    """Results are yielded in order even if the tasks finish out of
+    order.  Each worker thread gets its own context.
+    """
+    def init():
+        return threading.current_thread().name
+    def task(ctx, x):
+        time.sleep(0.01 * (x % 3))
+        return (x, ctx)
+    pool = WorkerPool(4, init=init)
+    try:
+        res = list(pool.imap(task, range(20)))
+    finally:
+        pool.close()
+    assert [x for x, ctx in res] == list(range(20))
+    assert 1 < len(set(ctx for x, ctx in res)) <= 4
+
+def test_worker_pool_unordered():
+    """Results are yielded as they are available.
+    """
+    def task(ctx, x):
+        time.sleep(0.05 * (5 - x))
+        return x
+    pool = WorkerPool(5)
+    try:
+        res = list(pool.imap(task, range(5), ordered=False))
+    finally:
+        pool.close()
+    assert sorted(res) == list(range(5))
+    assert res[0] == 4
+
+def test_worker_pool_maxpending():
+    """Not more than maxpending items are processed ahead of the
+    consumer.
+    """
+    started = []
+    def items():
+        for i in range(10):
+            started.append(i)
+            yield i
+    pool = WorkerPool(2)
+    try:
+        it = pool.imap(lambda ctx, x: x, items(), maxpending=3)
+        assert next(it) == 0
+        time.sleep(0.1)
+        assert len(started) == 3
+        assert list(it) == list(range(1, 10))
+    finally:
+        pool.close()
+
+def test_worker_pool_error():
+    """An exception in a task is raised in the consumer.
+    """
+    def task(ctx, x):
+        if x == 3:
+            raise ValueError("spam")
+        return x
+    pool = WorkerPool(2)
+    try:
+        it = pool.imap(task, range(6))
+        assert [next(it) for i in range(3)] == [0, 1, 2]
+        with pytest.raises(ValueError):
+            next(it)
+        threads = list(pool.threads)
+    finally:
+        pool.close()
+    for t in threads:
+        assert not t.is_alive()
+
+def test_worker_pool_init_error():
+    """An exception in init is raised in the consumer.
+    """
+    def init():
+        raise RuntimeError("no session")
+    pool = WorkerPool(2, init=init)
+    try:
+        with pytest.raises(RuntimeError):
+            list(pool.imap(lambda ctx, x: x, range(4)))
+    finally:
+        pool.close()
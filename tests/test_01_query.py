@@ -0,0 +1,62 @@
+"""Test the QueryTemplate class from module icat.query
+
+Binding values to a template does not need the client, so it may be
+tested without an ICAT server.
+"""
+
+import datetime
+import pytest
+from icat.query import QueryTemplate
+
+
+def test_bind():
+    """Bind values of each type to the placeholders.
+    """
+    query = ("SELECT o FROM Datafile o JOIN o.dataset AS ds "
+             "WHERE ds.id = :ds AND o.datafileCreateTime > :date "
+             "AND o.name LIKE :name AND o.location <> :name")
+    template = QueryTemplate(None, query, 
+                             dict(ds="id", date="date", name="string"))
+    res = template.bind(ds=42, date=datetime.datetime(2016, 6, 1, 10, 5, 3), 
+                        name="it's 100%")
+    assert res == ("SELECT o FROM Datafile o JOIN o.dataset AS ds "
+                   "WHERE ds.id = 42 "
+                   "AND o.datafileCreateTime > {ts 2016-06-01 10:05:03} "
+                   "AND o.name LIKE 'it''s 100%' "
+                   "AND o.location <> 'it''s 100%'")
+    res = template.bind(ds=7, date=datetime.date(2016, 6, 1), name=u"x")
+    assert "ds.id = 7 " in res
+    assert "> {ts 2016-06-01 00:00:00} " in res
+
+def test_literals():
+    """Placeholders in string and timestamp literals are left alone.
+    """
+    query = ("SELECT o FROM Datafile o WHERE o.name = ':name' "
+             "AND o.location = 'a'':name' "
+             "AND o.datafileCreateTime > {ts 2016-06-01 10:05:03} "
+             "AND o.description = :name")
+    template = QueryTemplate(None, query, dict(name="string"))
+    res = template.bind(name="b")
+    assert res == query[:query.rindex(":name")] + "'b'"
+
+def test_invalid():
+    """Invalid types, placeholders, and values are rejected.
+    """
+    query = "SELECT o FROM Dataset o WHERE o.id = :id AND o.name = :name"
+    with pytest.raises(ValueError):
+        QueryTemplate(None, query, dict(id="id", name="int"))
+    with pytest.raises(ValueError):
+        QueryTemplate(None, query, dict(id="id"))
+    with pytest.raises(ValueError):
+        QueryTemplate(None, query, dict(id="id", name="string", x="id"))
+    template = QueryTemplate(None, query, dict(id="id", name="string"))
+    with pytest.raises(ValueError):
+        template.bind(id=1)
+    with pytest.raises(ValueError):
+        template.bind(id=1, name="ds", x=3)
+    with pytest.raises(TypeError):
+        template.bind(id="1 OR 1 = 1", name="ds")
+    with pytest.raises(TypeError):
+        template.bind(id=True, name="ds")
+    with pytest.raises(TypeError):
+        template.bind(id=1, name=1)
@@ -0,0 +1,135 @@
+"""Test module icat.searchcache
+"""
+
+import time
+from icat.searchcache import normalizeQuery, SearchCache
+
+
+class Bean(object):
+    def __init__(self, name):
+        self.BeanName = name
+
+class Client(object):
+    """A minimal stand in for icat.client.Client, providing just what
+    the search cache needs.
+    """
+    def __init__(self, user="db/root"):
+        self.sessionId = "session-%s" % user
+        self.user = user
+        self.typemap = dict((n.lower(), Bean(n))
+                            for n in ("Facility", "Investigation", 
+                                      "Dataset", "DatasetType"))
+        self.calls = []
+    def getUserName(self):
+        return self.user
+    def search(self, query, rowtype):
+        self.calls.append(query)
+        return ["%s #%d" % (query, len(self.calls))]
+
+
+def test_normalize_query():
+    """White space is normalized, but not in literals.
+    """
+    q = "  SELECT o  FROM\tFacility o\n WHERE o.name = 'a   b'  "
+    assert normalizeQuery(q) == "SELECT o FROM Facility o WHERE o.name = 'a   b'"
+
+def test_cache_hit():
+    """A repeated search is served from the cache.
+    """
+    cache = SearchCache()
+    client = Client()
+    r1 = cache.search(client, "SELECT o FROM Facility o", None, client.search)
+    r2 = cache.search(client, "SELECT o  FROM Facility o", None, client.search)
+    assert r1 == r2
+    assert len(client.calls) == 1
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+def test_cache_user():
+    """Results are not shared between different users.
+    """
+    cache = SearchCache()
+    c1 = Client("db/root")
+    c2 = Client("db/nbour")
+    query = "SELECT o FROM Facility o"
+    cache.search(c1, query, None, c1.search)
+    cache.search(c2, query, None, c2.search)
+    cache.search(c1, query, None, c1.search)
+    assert len(c1.calls) == 1
+    assert len(c2.calls) == 1
+
+def test_cache_ttl():
+    """Entries expire after their time to live.  The time to live may
+    be set per entity type.
+    """
+    cache = SearchCache(ttl=60, entityttl={"Dataset": 0.1, 
+                                           "Investigation": 0})
+    client = Client()
+    queries = [ "SELECT o FROM Facility o", 
+                "SELECT o FROM Dataset o", 
+                "SELECT o FROM Investigation o" ]
+    for q in queries:
+        cache.search(client, q, None, client.search)
+    time.sleep(0.2)
+    for q in queries:
+        cache.search(client, q, None, client.search)
+    assert client.calls == queries + queries[1:]
+
+def test_cache_lru():
+    """The least recently used entries are evicted.
+    """
+    cache = SearchCache(maxsize=2)
+    client = Client()
+    q1 = "SELECT o FROM Facility o"
+    q2 = "SELECT o FROM DatasetType o"
+    q3 = "SELECT o FROM Investigation o"
+    for q in (q1, q2, q1, q3, q1, q2):
+        cache.search(client, q, None, client.search)
+    assert client.calls == [q1, q2, q3, q2]
+
+def test_cache_invalidate():
+    """Entries are invalidated by the entity types they are related to.
+    """
+    cache = SearchCache()
+    client = Client()
+    q1 = "SELECT o FROM Facility o"
+    q2 = ("SELECT o FROM Dataset o WHERE o.type.id IN "
+          "(SELECT t.id FROM DatasetType t WHERE t.name = 'Facility')")
+    for q in (q1, q2):
+        cache.search(client, q, None, client.search)
+    cache.invalidate(["DatasetType"])
+    for q in (q1, q2):
+        cache.search(client, q, None, client.search)
+    assert client.calls == [q1, q2, q2]
+    cache.invalidate()
+    cache.search(client, q1, None, client.search)
+    assert client.calls == [q1, q2, q2, q1]
+
+def test_cache_copy():
+    """Modifying a search result does not affect the cache.
+    """
+    cache = SearchCache()
+    client = Client()
+    def search(query, rowtype):
+        client.calls.append(query)
+        return [{"name": "ESNF", "ids": [1, 2]}]
+    query = "SELECT o FROM Facility o"
+    r1 = cache.search(client, query, "dict", search)
+    r1[0]["name"] = "Other"
+    r2 = cache.search(client, query, "dict", search)
+    r2[0]["ids"].append(3)
+    r3 = cache.search(client, query, "dict", search)
+    assert r3 == [{"name": "ESNF", "ids": [1, 2]}]
+    assert r3[0] is not r2[0]
+    assert len(client.calls) == 1
+
+def test_cache_maxusers():
+    """Only the user names of the most recently used sessions are kept.
+    """
+    cache = SearchCache(maxusers=2)
+    clients = [ Client("db/user%d" % i) for i in range(3) ]
+    query = "SELECT o FROM Facility o"
+    for c in clients + clients[:1]:
+        cache.search(c, query, None, c.search)
+    assert len(cache.users) == 2
+    assert list(cache.users.values()) == ["db/user2", "db/user0"]
@@ -0,0 +1,54 @@
+"""Test module icat.stream
+
+Rows in the result of a query selecting multiple attributes may be
+decoded without an ICAT server.
+"""
+
+from suds.sudsobject import Factory
+from suds.sax.parser import Parser
+from icat.stream import fieldSetItems, RowDecoder
+
+
+class Schema(object):
+    types = {}
+
+class Wsdl(object):
+    schema = Schema()
+
+class Client(object):
+    """A minimal stand in for icat.client.Client, providing just what
+    the row decoder needs to decode plain values.
+    """
+    wsdl = Wsdl()
+    typemap = {}
+
+
+reply = b"""<?xml version="1.0"?>
+<return xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+        xmlns:xs="http://www.w3.org/2001/XMLSchema"
+        xmlns:ns1="http://icatproject.org"
+        xsi:type="ns1:fieldSet">
+  <field xsi:type="xs:string">e208945</field>
+  <field xsi:type="xs:long">42</field>
+  <field xsi:nil="true"/>
+</return>
+"""
+
+def test_fieldset_suds():
+    """A Suds fieldSet instance is a row, other instances are not.
+    """
+    row = Factory.object('fieldSet', dict(field=["e208945", 42]))
+    assert fieldSetItems(row) == ["e208945", 42]
+    row = Factory.object('fieldSet', dict(field="e208945"))
+    assert fieldSetItems(row) == ["e208945"]
+    facility = Factory.object('facility', dict(id=1, name="ESNF"))
+    assert fieldSetItems(facility) is None
+    assert fieldSetItems("e208945") is None
+
+def test_fieldset_decode():
+    """A fieldSet element in the reply is decoded into a tuple.
+    """
+    node = Parser().parse(string=reply).root()
+    assert len(fieldSetItems(node)) == 3
+    decode = RowDecoder(Client(), "dict")
+    assert decode(node) == (u"e208945", 42, None)
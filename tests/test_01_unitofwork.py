@@ -0,0 +1,136 @@
+"""Test module icat.unitofwork
+
+The unit of work only uses the createMany(), updateMany(), and
+deleteMany() methods of the client, so it may be tested with a
+minimal stand in for the client that records these calls.
+"""
+
+import pytest
+from suds.sudsobject import Factory
+import icat.entities
+from icat.unitofwork import UnitOfWork
+from icat.exception import DataConsistencyError
+
+
+class RecordingClient(object):
+    """A minimal stand in for a client, recording the calls.
+    """
+    def __init__(self):
+        self.activeUnitOfWork = None
+        self.calls = []
+        self.nextid = 1
+
+    def createMany(self, beans, batchsize=None, workers=1):
+        assert self.activeUnitOfWork is None
+        self.calls.append(("createMany", [ b.name for b in beans ]))
+        ids = list(range(self.nextid, self.nextid + len(beans)))
+        self.nextid += len(beans)
+        return ids
+
+    def updateMany(self, beans, workers=4):
+        self.calls.append(("updateMany", [ b.name for b in beans ]))
+
+    def deleteMany(self, beans, batchsize=None, workers=1):
+        self.calls.append(("deleteMany", [ b.name for b in beans ]))
+
+
+def new(client, Class, **kwargs):
+    instance = Factory.object(Class.BeanName[0].lower() + Class.BeanName[1:])
+    return Class(client, instance, **kwargs)
+
+
+def test_create_order():
+    """Objects are created in dependency order, one call per level,
+    and the ids are set.
+    """
+    client = RecordingClient()
+    uow = UnitOfWork(client)
+    facility = new(client, icat.entities.Facility, name="fac", id=3)
+    inv = new(client, icat.entities.Investigation,
+              name="inv", facility=facility)
+    datasets = [ new(client, icat.entities.Dataset,
+                     name="ds%d" % i, investigation=inv) for i in range(3) ]
+    datafiles = [ new(client, icat.entities.Datafile,
+                      name="df%d" % i, dataset=ds)
+                  for i, ds in enumerate(datasets) ]
+    with uow:
+        assert client.activeUnitOfWork is uow
+        # Record in reverse order, to see that it gets sorted.
+        for obj in datafiles + datasets + [inv]:
+            uow.create(obj)
+        uow.create(inv)
+        assert len(uow) == 7
+    assert client.activeUnitOfWork is None
+    assert len(uow) == 0
+    assert client.calls == [
+        ("createMany", ["inv"]),
+        ("createMany", ["ds0", "ds1", "ds2"]),
+        ("createMany", ["df0", "df1", "df2"]),
+    ]
+    assert inv.id == 1
+    assert [ ds.id for ds in datasets ] == [2, 3, 4]
+    assert datafiles[2].instance.dataset.id == 4
+    assert datafiles[0].getModifiedAttrs() == frozenset()
+
+def test_update_delete():
+    """Updates and deletes are sent after the creates, dependent
+    objects are deleted first.
+    """
+    client = RecordingClient()
+    inv = new(client, icat.entities.Investigation, name="inv", id=10)
+    ds1 = new(client, icat.entities.Dataset, name="ds1", id=11,
+              investigation=inv)
+    ds2 = new(client, icat.entities.Dataset, name="ds2", investigation=inv)
+    ds3 = new(client, icat.entities.Dataset, name="ds3", investigation=inv)
+    ds4 = new(client, icat.entities.Dataset, name="ds4", id=14,
+              investigation=inv)
+    with UnitOfWork(client) as uow:
+        uow.delete(inv)
+        uow.delete(ds1)
+        uow.update(ds1)
+        uow.create(ds2)
+        uow.update(ds2)
+        uow.create(ds3)
+        uow.delete(ds3)
+        uow.update(ds4)
+        uow.update(ds4)
+    assert client.calls == [
+        ("createMany", ["ds2"]),
+        ("updateMany", ["ds4"]),
+        ("deleteMany", ["ds1"]),
+        ("deleteMany", ["inv"]),
+    ]
+
+def test_discard_on_error():
+    """Nothing is sent if the context is left by an exception.
+    """
+    client = RecordingClient()
+    inv = new(client, icat.entities.Investigation, name="inv")
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(client) as uow:
+            uow.create(inv)
+            raise RuntimeError("abort")
+    assert client.activeUnitOfWork is None
+    assert client.calls == []
+    assert inv.id is None
+
+def test_circular():
+    """Circular dependencies are detected before anything is sent.
+    """
+    client = RecordingClient()
+    user = new(client, icat.entities.User, name="user")
+    group = new(client, icat.entities.Group, name="group")
+    ug = new(client, icat.entities.UserGroup, user=user, group=group)
+    levels = UnitOfWork._sortLevels([ug, user, group])
+    assert levels == [[user, group], [ug]]
+    inv = new(client, icat.entities.Investigation, name="inv")
+    ds = new(client, icat.entities.Dataset, name="ds", investigation=inv)
+    # There are no circular relations in the ICAT schema, abuse the
+    # facility relation to construct one.
+    inv.instance.facility = ds.instance
+    uow = UnitOfWork(client)
+    uow.create(inv)
+    uow.create(ds)
+    with pytest.raises(DataConsistencyError):
+        uow.flush()
+    assert client.calls == []
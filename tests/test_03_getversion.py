@@ -40,3 +40,20 @@ def test_get_ids_version():
     assert client.ids.apiversion >= '1.0.0'
     print("\nConnect to %s\nIDS version %s\n" 
           % (conf.idsurl, client.ids.apiversion))
+
+
+def test_get_icat_version_cached(tmpdirsec):
+    """Query the version using a persistent cache.
+
+    The second client should take the WSDL and the version from the
+    cache, the result must be the same.
+    """
+
+    conf = getConfig(needlogin=False)
+    kwargs = dict(conf.client_kwargs, cacheDir=tmpdirsec.dir)
+    client = icat.Client(conf.url, **kwargs)
+    assert client.cache.get('apiversion')
+    assert client.cache.get('wsdlDigest')
+    client2 = icat.Client(conf.url, **kwargs)
+    assert client2.apiversion == client.apiversion
+    assert client2.typemap == client.typemap
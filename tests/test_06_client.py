@@ -6,12 +6,17 @@ this module.
 """
 
 from __future__ import print_function
+import os.path
 from collections import Iterable, Callable
 import pytest
 import icat
 import icat.config
 import icat.exception
 from icat.query import Query
+from icat.chunking import AdaptiveChunkSize
+from icat.searchcache import SearchCache
+from icat.compact import CompactRecord
+from icat.includeadvisor import IncludeAdvisor
 from conftest import getConfig
 
 
@@ -86,6 +91,91 @@ def test_assertedSearch_range_exact_query(client):
     assert len(objs) == 3
     assert objs[0].BeanName == "User"
 
+# ===================== test search() rowtype ======================
+
+@pytest.mark.parametrize(("rowtype",), [("dict",), ("tuple",)])
+def test_search_rowtype(client, rowtype):
+    """Search returning rows rather than entity objects.
+    """
+    query = Query(client, "Investigation", order=["id"])
+    objs = client.search(query)
+    rows = client.search(query, rowtype=rowtype)
+    assert len(rows) == len(objs)
+    for obj, row in zip(objs, rows):
+        if rowtype == "dict":
+            assert isinstance(row, dict)
+            values = row
+        else:
+            assert isinstance(row, tuple)
+            assert type(row).__name__ == "Investigation"
+            values = row._asdict()
+        attrs = obj.InstAttr | obj.MetaAttr
+        assert set(values.keys()) == attrs
+        for a in attrs:
+            assert values[a] == getattr(obj, a)
+
+def test_search_rowtype_attribute(client):
+    """Plain values in the search result are not affected by rowtype.
+    """
+    query = "SELECT u.name FROM User u ORDER BY u.name"
+    names = client.search(query)
+    assert client.search(query, rowtype="dict") == names
+    assert client.search(query, rowtype="tuple") == names
+
+def test_search_rowtype_invalid(client):
+    """An invalid rowtype.
+    """
+    with pytest.raises(ValueError):
+        client.search("User", rowtype="list")
+    with pytest.raises(ValueError):
+        list(client.searchChunked("SELECT u FROM User u", rowtype="list"))
+
+@pytest.mark.parametrize(("keyset", "prefetch"), [
+    (False, 0),
+    (True, 0),
+    (True, 1),
+])
+def test_searchChunked_rowtype(client, keyset, prefetch):
+    """Search with searchChunked() returning rows.
+    """
+    query = Query(client, "User", order=["id"])
+    ids = [u.id for u in client.search(query)]
+    res = client.searchChunked(query, chunksize=2, keyset=keyset, 
+                               prefetch=prefetch, rowtype="dict")
+    assert [r['id'] for r in res] == ids
+    res = client.searchChunked(query, chunksize=2, keyset=keyset, 
+                               prefetch=prefetch, rowtype="tuple")
+    assert [r.id for r in res] == ids
+
+# ======================= test iterSearch() ========================
+
+@pytest.mark.parametrize(("query",), [
+    ("SELECT u FROM User u ORDER BY u.id",),
+    ("SELECT u.name FROM User u ORDER BY u.name",),
+    ("SELECT COUNT(u) FROM User u",),
+    ("SELECT u FROM User u WHERE u.name = 'no such user'",),
+    ("SELECT ds FROM Dataset ds ORDER BY ds.id "
+     "INCLUDE ds.investigation, ds.parameters",),
+    (lambda client: Query(client, "Investigation", order=True, 
+                          includes="1"),),
+])
+def test_iterSearch(client, query):
+    """iterSearch() yields the same result as search().
+    """
+    if isinstance(query, Callable):
+        query = query(client)
+    objs = client.search(query)
+    res = client.iterSearch(query)
+    assert isinstance(res, Iterable)
+    assert list(res) == objs
+
+def test_iterSearch_error(client):
+    """An error from the server is raised when iterating.
+    """
+    res = client.iterSearch("SELECT x FROM NoSuchEntity x")
+    with pytest.raises(icat.exception.ICATError):
+        list(res)
+
 # ===================== test searchChunked() =======================
 
 # Try different type of queries: query strings using concise syntax,
@@ -182,6 +272,344 @@ def test_searchChunked_percent(client, query):
     objs = list(res)
     assert objs == users
 
+@pytest.mark.parametrize(("query",), [
+    ("SELECT u FROM User u",),
+    ("SELECT u.id FROM User u",),
+    ("SELECT u FROM User u WHERE u.name LIKE 'j%' ORDER BY u.name",),
+    ("SELECT u FROM User u "
+     "JOIN u.userGroups AS ug JOIN ug.grouping AS g "
+     "WHERE g.name = 'investigation_08100122-EF_writer' "
+     "INCLUDE u.userGroups",),
+    (lambda client: Query(client, "User", order=True),),
+    (lambda client: Query(client, "User", attribute="id"),),
+])
+@pytest.mark.parametrize(("skip", "count", "chunksize"), [
+    (0,None,100),
+    (0,None,2),
+    (2,4,3),
+])
+def test_searchChunked_keyset(client, query, skip, count, chunksize):
+    """Search with searchChunked() using keyset pagination.
+
+    The result is always ordered by id.
+    """
+    if isinstance(query, Callable):
+        query = query(client)
+    def getid(o):
+        return o if isinstance(o, (int, long)) else o.id
+    users = sorted(client.search(query), key=getid)
+    if count is not None:
+        users = users[skip:skip+count]
+    else:
+        users = users[skip:]
+    res = client.searchChunked(query, skip=skip, count=count, 
+                               chunksize=chunksize, keyset=True)
+    assert isinstance(res, Iterable)
+    objs = list(res)
+    assert [getid(o) for o in objs] == [getid(o) for o in users]
+
+@pytest.mark.parametrize(("query",), [
+    ("User",),
+    ("SELECT u.name FROM User u",),
+    ("SELECT COUNT(u) FROM User u",),
+    ("SELECT u FROM User u LIMIT 0, 10",),
+])
+def test_searchChunked_keyset_invalid(client, query):
+    """Queries that are not suitable for keyset pagination.
+    """
+    with pytest.raises(ValueError):
+        list(client.searchChunked(query, keyset=True))
+
+@pytest.mark.parametrize(("keyset",), [(False,), (True,)])
+def test_searchChunked_prefetch(client, keyset):
+    """Search with searchChunked() fetching chunks in the background.
+    """
+    query = Query(client, "User", order=["id"])
+    users = client.search(query)
+    chunksize = int(len(users)/3)
+    if chunksize < 1:
+        pytest.skip("too few objects for this test")
+    res = client.searchChunked(query, chunksize=chunksize, 
+                               keyset=keyset, prefetch=2)
+    assert isinstance(res, Iterable)
+    objs = list(res)
+    assert objs == users
+    for o in objs:
+        assert o.client is client
+
+def test_searchChunked_prefetch_close(client):
+    """Stop consuming the result early.
+    """
+    users = client.search("SELECT u FROM User u")
+    res = client.searchChunked("SELECT u FROM User u", chunksize=1, 
+                               prefetch=1)
+    assert next(res) == users[0]
+    res.close()
+
+@pytest.mark.parametrize(("keyset",), [(False,), (True,)])
+def test_searchChunked_adaptive(client, keyset):
+    """Search with searchChunked() using an adaptive chunk size.
+    """
+    query = Query(client, "Dataset", order=["id"], includes=["parameters"])
+    datasets = client.search(query)
+    chunksize = AdaptiveChunkSize(initial=1, maxsize=4)
+    res = client.searchChunked(query, chunksize=chunksize, keyset=keyset)
+    assert isinstance(res, Iterable)
+    objs = list(res)
+    assert objs == datasets
+    stats = chunksize.getStats(unicode(query))
+    assert stats.items == len(datasets)
+    assert stats.calls > 0
+    assert stats.bytes > 0
+    assert 1 <= stats.chunksize <= 4
+
+# ===================== test searchParallel() =======================
+
+@pytest.mark.parametrize(("query",), [
+    ("SELECT u FROM User u",),
+    ("SELECT u FROM User u WHERE u.name LIKE 'db/%'",),
+    ("SELECT u FROM User u "
+     "JOIN u.userGroups AS ug JOIN ug.grouping AS g "
+     "WHERE g.name = 'investigation_08100122-EF_writer' "
+     "INCLUDE u.userGroups",),
+    (lambda client: Query(client, "User", attribute="id"),),
+])
+@pytest.mark.parametrize(("chunksize",), [(2,), (100,)])
+def test_searchParallel(client, query, chunksize):
+    """Search with searchParallel(), the result is ordered by id.
+    """
+    if isinstance(query, Callable):
+        query = query(client)
+    def getid(o):
+        return o if isinstance(o, (int, long)) else o.id
+    users = sorted(client.search(query), key=getid)
+    res = client.searchParallel(query, workers=3, chunksize=chunksize)
+    assert isinstance(res, Iterable)
+    objs = list(res)
+    assert [getid(o) for o in objs] == [getid(o) for o in users]
+    for o in objs:
+        if not isinstance(o, (int, long)):
+            assert o.client is client
+
+def test_searchParallel_unordered(client):
+    """Search with searchParallel() yielding parts as they arrive.
+    """
+    query = "SELECT u FROM User u"
+    users = client.search(query)
+    res = client.searchParallel(query, workers=3, ordered=False, 
+                                chunksize=2)
+    assert sorted(o.id for o in res) == sorted(o.id for o in users)
+
+def test_searchParallel_empty(client):
+    """searchParallel() with an empty result.
+    """
+    query = "SELECT u FROM User u WHERE u.name = 'no such user'"
+    assert list(client.searchParallel(query)) == []
+
+# ========================= test new() =============================
+
+@pytest.mark.parametrize("instancetype", 
+                         ["datafile", "dataset", "investigation", "user"])
+def test_new_prototype(client, instancetype):
+    """Instances cloned from a prototype are equivalent to the ones
+    created by the Suds factory, but independent of each other.
+    """
+    Class = client.typemap[instancetype]
+    instance = client.factory.create(instancetype)
+    for r in (Class.InstRel | Class.InstMRel):
+        delattr(instance, r)
+    obj1 = client.new(instancetype)
+    obj2 = client.new(instancetype, name="foo")
+    assert obj1.instance.__class__ is instance.__class__
+    assert obj1.instance.__keylist__ == instance.__keylist__
+    assert (obj1.instance.__metadata__.sxtype is 
+            instance.__metadata__.sxtype)
+    assert dict(obj1.instance) == dict(instance)
+    assert obj1.name is None
+    assert obj2.name == "foo"
+
+# ======================== test clone() ============================
+
+def test_clone(client):
+    """A clone uses the same session but its own transport.
+    """
+    clone = client.clone()
+    assert clone.apiversion == client.apiversion
+    assert clone.sessionId == client.sessionId
+    assert clone.options.transport is not client.options.transport
+    assert clone.autoLogout is False
+    assert clone.getUserName() == client.getUserName()
+    users = client.search("User")
+    assert [u.id for u in clone.search("User")] == [u.id for u in users]
+
+# ================== test prefetchEntityInfo() ======================
+
+def test_prefetchEntityInfo(tmpdirsec):
+    """Prefetch the entity info and store it in the persistent cache.
+    """
+    conf = getConfig()
+    cachedir = os.path.join(tmpdirsec.dir, "prefetch")
+    client = icat.Client(conf.url, cacheDir=cachedir, **conf.client_kwargs)
+    assert not client.entityInfoCache
+    client.prefetchEntityInfo()
+    names = client.getEntityNames()
+    assert set(client.entityInfoCache.keys()) == set(names)
+    client2 = icat.Client(conf.url, cacheDir=cachedir, **conf.client_kwargs)
+    assert set(client2.entityInfoCache.keys()) == set(names)
+    for n in names:
+        info = client.entityInfoCache[n]
+        info2 = client2.entityInfoCache[n]
+        assert ([ (f.name, f.relType) for f in info.fields ] ==
+                [ (f.name, f.relType) for f in info2.fields ])
+    client2.login(conf.auth, conf.credentials)
+    query = Query(client2, "Datafile", order=True, 
+                  conditions={"dataset.investigation.name": "IS NOT NULL"})
+    assert len(client2.search(query)) > 0
+
+
+# ======================= test search cache ========================
+
+def test_searchCache():
+    """Repeated searches are served from the search cache.
+    """
+    conf = getConfig()
+    cache = SearchCache()
+    client = icat.Client(conf.url, searchCache=cache, **conf.client_kwargs)
+    client.login(conf.auth, conf.credentials)
+    query = Query(client, "Facility", order=True)
+    res1 = client.search(query)
+    res2 = client.assertedSearch(str(query), assertmax=None)
+    assert cache.misses == 1
+    assert cache.hits == 1
+    assert [o.id for o in res1] == [o.id for o in res2]
+    assert res1[0] is not res2[0]
+    clone = client.clone()
+    assert clone.search(query)[0].client is clone
+    assert cache.hits == 2
+
+def test_searchCache_invalidate():
+    """The cache is invalidated when objects are created or deleted.
+    """
+    conf = getConfig()
+    cache = SearchCache()
+    client = icat.Client(conf.url, searchCache=cache, **conf.client_kwargs)
+    client.login(conf.auth, conf.credentials)
+    facility = client.assertedSearch("Facility [name='ESNF']")[0]
+    query = Query(client, "DatasetType", attribute="name", 
+                  conditions={"facility.name": "= 'ESNF'"})
+    names = client.search(query)
+    assert "cache_test" not in names
+    dstype = client.new("datasetType", name="cache_test", facility=facility)
+    dstype.create()
+    try:
+        assert "cache_test" in client.search(query)
+    finally:
+        client.delete(dstype)
+    assert client.search(query) == names
+    assert cache.hits == 0
+
+
+# ======================= test identity map ========================
+
+def test_identityMap():
+    """Each object is represented by one single entity object.
+    """
+    conf = getConfig()
+    client = icat.Client(conf.url, identityMap=True, **conf.client_kwargs)
+    client.login(conf.auth, conf.credentials)
+    query = Query(client, "Dataset", order=True, 
+                  conditions={"investigation.name": "= '12100409-ST'"}, 
+                  includes=["investigation.facility"])
+    datasets = client.search(query)
+    assert len(datasets) > 1
+    investigations = [ ds.investigation for ds in datasets ]
+    facilities = [ i.facility.instance for i in investigations ]
+    assert all(i is investigations[0] for i in investigations)
+    assert all(f is facilities[0] for f in facilities)
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    assert investigation is datasets[0].investigation
+    # The facility has not been included in the last search, it is
+    # still present from the first one.
+    assert investigation.facility.name == "ESNF"
+
+
+# ===================== test compact entities ======================
+
+def test_compactEntities():
+    """Entity objects keep their attributes in compact records, which
+    are converted when passed to the server.
+    """
+    conf = getConfig()
+    client = icat.Client(conf.url, compactEntities=True, 
+                         **conf.client_kwargs)
+    client.login(conf.auth, conf.credentials)
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    assert isinstance(investigation.instance, CompactRecord)
+    keyword = client.new("keyword", name="compact_test", 
+                         investigation=investigation)
+    assert isinstance(keyword.instance, CompactRecord)
+    keyword.create()
+    try:
+        keyword.name = "compact_test_2"
+        keyword.update()
+        query = Query(client, "Keyword", conditions={
+            "name": "LIKE 'compact_test%'"
+        }, includes=["investigation"])
+        res = client.assertedSearch(query)[0]
+        assert res.id == keyword.id
+        assert res.name == "compact_test_2"
+        assert res.investigation.name == "12100409-ST"
+    finally:
+        client.delete(keyword)
+
+def test_lazyLoad():
+    """Relations not included in a search are loaded for all objects
+    in the result at once.
+    """
+    conf = getConfig()
+    client = icat.Client(conf.url, lazyLoad=True, **conf.client_kwargs)
+    client.login(conf.auth, conf.credentials)
+    datasets = client.search("SELECT o FROM Dataset o ORDER BY o.id")
+    assert len(datasets) > 1
+    assert not hasattr(datasets[0].instance, 'investigation')
+    investigations = [ ds.investigation for ds in datasets ]
+    assert all(hasattr(ds.instance, 'investigation') for ds in datasets)
+    query = "SELECT o FROM Dataset o INCLUDE o.investigation ORDER BY o.id"
+    expected = client.search(query)
+    assert ([ i.name for i in investigations ] == 
+            [ ds.investigation.name for ds in expected ])
+    assert all(ds.getModifiedAttrs() == frozenset() for ds in datasets)
+    facilities = set(i.facility.name for i in investigations)
+    assert facilities == set([ ds.investigation.facility.name 
+                               for ds in expected ])
+    datafiles = [ len(ds.datafiles) for ds in datasets ]
+    assert sum(datafiles) == len(client.search("Datafile"))
+
+def test_includeAdvisor():
+    """Record the access to related objects and report the paths
+    that should have been included.
+    """
+    conf = getConfig()
+    advisor = IncludeAdvisor()
+    client = icat.Client(conf.url, includeAdvisor=advisor, 
+                         **conf.client_kwargs)
+    client.login(conf.auth, conf.credentials)
+    query = Query(client, "Dataset", includes={"investigation"})
+    datasets = client.search(query)
+    for ds in datasets:
+        assert ds.investigation.name
+        client.get("Investigation INCLUDE 1", ds.investigation.id)
+    advice = advisor.advise()
+    assert set(a.path for a in advice) == set(["investigation.facility", 
+                                               "investigation.type"])
+    for a in advice:
+        assert a.entity == "Dataset"
+        assert a.includes == frozenset(["investigation"])
+        assert a.roundTrips == len(datasets)
+        assert a.uncovered == 0
+    assert advisor.unusedIncludes() == {}
+
+
 # ==================== test searchUniqueKey() ======================
 
 @pytest.mark.parametrize(("key", "attrs"), [
@@ -236,6 +664,38 @@ def test_searchUniqueKey_objindex_preset(client):
     obj = client.searchUniqueKey(dskey, objindex=objindex)
     assert obj == ds
 
+# ==================== test searchUniqueKeys() =====================
+
+def test_searchUniqueKeys(client):
+    """Search the datafiles of an investigation by their unique keys.
+    The result must be the same as with searchUniqueKey().
+    """
+    query = Query(client, "Datafile", 
+                  conditions={"dataset.investigation.name": "= '12100409-ST'"},
+                  includes=["dataset.investigation.facility"])
+    datafiles = client.search(query)
+    assert len(datafiles) > 1
+    keyindex = {}
+    keys = [ df.getUniqueKey(keyindex) for df in datafiles ]
+    objindex = {}
+    objs = client.searchUniqueKeys(keys + keys[:1], objindex=objindex)
+    assert len(objs) == len(keys) + 1
+    assert objs[-1] == objs[0]
+    for k, df, obj in zip(keys, datafiles, objs):
+        assert obj.BeanName == "Datafile"
+        assert obj.id == df.id
+        assert objindex[k] == obj
+        assert client.searchUniqueKey(k).id == obj.id
+    dskey = datafiles[0].dataset.getUniqueKey(keyindex)
+    assert objindex[dskey].id == datafiles[0].dataset.id
+
+def test_searchUniqueKeys_notfound(client):
+    """A key that is not found raises an error.
+    """
+    keys = [ "Facility_name-ESNF", "Facility_name-FOO" ]
+    with pytest.raises(icat.exception.SearchResultError):
+        client.searchUniqueKeys(keys)
+
 # ==================== test searchMatching() =======================
 # searchMatching() is pretty much straight forward.  There are not
 # too much features that could be tested.
@@ -294,3 +754,274 @@ def test_searchMatching_include(client):
     assert obj.name == "e208945"
     assert len(obj.datafiles) > 0
 
+def test_searchMatching_date(client):
+    """Search a shift, having dates in its uniqueness constraint.
+
+    The dates may either be time zone aware datetimes as returned
+    from the server or strings as read from a dump file.
+    """
+    shift = client.assertedSearch("SELECT o FROM Shift o "
+                                  "JOIN o.investigation AS i "
+                                  "WHERE i.name = '08100122-EF' "
+                                  "INCLUDE o.investigation")[0]
+    assert shift.startDate.tzinfo is not None
+    obj = client.new("shift", investigation=shift.investigation, 
+                     startDate=shift.startDate, endDate=shift.endDate)
+    obj = client.searchMatching(obj)
+    assert obj.id == shift.id
+    obj = client.new("shift", investigation=shift.investigation, 
+                     startDate=shift.startDate.isoformat(), 
+                     endDate=shift.endDate.isoformat())
+    obj = client.searchMatching(obj)
+    assert obj.id == shift.id
+
+# ================== test searchMatchingMany() =====================
+
+def test_searchMatchingMany(client):
+    """Search the matching objects for a list of datafiles, including
+    one that does not exist.  The result must be the same as with
+    searchMatching().
+    """
+    query = Query(client, "Datafile", 
+                  conditions={"dataset.investigation.name": "= '12100409-ST'"},
+                  includes=["dataset"])
+    datafiles = client.search(query)
+    assert len(datafiles) > 1
+    objs = [ client.new("datafile", name=df.name, dataset=df.dataset) 
+             for df in datafiles ]
+    newdf = client.new("datafile", name="nonexistent.dat", 
+                       dataset=datafiles[0].dataset)
+    objs.append(newdf)
+    res = client.searchMatchingMany(objs, includes=["dataset"])
+    assert len(res) == len(objs)
+    assert res[newdf] is None
+    for obj, df in zip(objs, datafiles):
+        match = res[obj]
+        assert match.BeanName == "Datafile"
+        assert match.id == df.id
+        assert match.dataset.id == df.dataset.id
+        assert client.searchMatching(obj).id == match.id
+
+def test_searchMatchingMany_mixed(client):
+    """Search matching objects of different types at once.
+    """
+    facility = client.new("facility", name="ESNF")
+    objs = [ facility, client.new("facility", name="FOO") ]
+    res = client.searchMatchingMany(objs)
+    assert res[objs[0]].name == "ESNF"
+    assert res[objs[1]] is None
+    facility = res[objs[0]]
+    investigation = client.new("investigation", 
+                               name="12100409-ST", visitId="1.1-P",
+                               facility=facility)
+    res = client.searchMatchingMany([investigation, facility])
+    assert res[investigation].name == "12100409-ST"
+    assert res[facility].id == facility.id
+
+def test_searchMatchingMany_date(client):
+    """Search matching shifts, having dates in their uniqueness
+    constraint, given as time zone aware datetimes or as strings.
+    """
+    shift = client.assertedSearch("SELECT o FROM Shift o "
+                                  "JOIN o.investigation AS i "
+                                  "WHERE i.name = '08100122-EF' "
+                                  "INCLUDE o.investigation")[0]
+    objs = [ client.new("shift", investigation=shift.investigation, 
+                        startDate=shift.startDate, endDate=shift.endDate), 
+             client.new("shift", investigation=shift.investigation, 
+                        startDate=shift.startDate.isoformat(), 
+                        endDate=shift.endDate.isoformat()) ]
+    res = client.searchMatchingMany(objs)
+    assert [ res[o].id for o in objs ] == [shift.id, shift.id]
+
+# =========== test createMany() and deleteMany() in batches ===========
+
+@pytest.mark.parametrize(("batchsize", "maxbytes", "workers"), [
+    (3, None, 1),
+    (3, None, 3),
+    (None, 400, 2),
+])
+def test_createMany_batch(client, batchsize, maxbytes, workers):
+    """Create and delete objects in batches.
+    """
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    names = [ "batch_test_%02d" % i for i in range(10) ]
+    keywords = [ client.new("keyword", name=n, investigation=investigation) 
+                 for n in names ]
+    ids = client.createMany(keywords, batchsize=batchsize, 
+                            maxbytes=maxbytes, workers=workers)
+    try:
+        assert len(ids) == len(names)
+        for i, n in zip(ids, names):
+            assert client.get("Keyword", i).name == n
+    finally:
+        for k, i in zip(keywords, ids):
+            k.id = i
+        client.deleteMany(keywords, batchsize=batchsize, 
+                          maxbytes=maxbytes, workers=workers)
+    query = "SELECT k FROM Keyword k WHERE k.name LIKE 'batch_test_%'"
+    assert client.search(query) == []
+
+def test_createMany_batch_error(client):
+    """A failing batch is reported in the exception and the objects
+    created in the other batches are available from it.
+    """
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    names = [ "batch_test_%02d" % i for i in range(10) ]
+    # Add a duplicate to the third batch.
+    names.insert(7, names[6])
+    keywords = [ client.new("keyword", name=n, investigation=investigation) 
+                 for n in names ]
+    with pytest.raises(icat.exception.BatchCallError) as exc_info:
+        client.createMany(keywords, batchsize=3)
+    err = exc_info.value
+    try:
+        assert err.batch == 2
+        assert (err.start, err.end) == (6, 9)
+        assert isinstance(err.error, icat.exception.ICATError)
+        assert err.result[:6] == [ k.id for k in 
+                                   client.search("SELECT k FROM Keyword k "
+                                                 "WHERE k.name LIKE "
+                                                 "'batch_test_%' "
+                                                 "ORDER BY k.name") ]
+        assert err.result[6:] == [None] * 5
+    finally:
+        query = "SELECT k FROM Keyword k WHERE k.name LIKE 'batch_test_%'"
+        client.deleteMany(client.search(query))
+
+# ======================= test update() ===========================
+
+def test_update_modified(client):
+    """Only modified objects are updated, the related objects are not
+    sent to the server.
+    """
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    keyword = client.new("keyword", name="update_test", 
+                         investigation=investigation)
+    keyword.create()
+    try:
+        query = Query(client, "Keyword", 
+                      conditions={"name": "= 'update_test'"}, 
+                      includes=["investigation.facility"])
+        kw = client.assertedSearch(query)[0]
+        assert kw.getModifiedAttrs() == frozenset()
+        stats = client.updateStats
+        updates, skipped, saved = (stats.updates, stats.skipped, 
+                                   stats.bytesSaved)
+        kw.update()
+        assert stats.updates == updates
+        assert stats.skipped == skipped + 1
+        kw.name = "update_test_2"
+        assert kw.getModifiedAttrs() == frozenset(["name"])
+        kw.update()
+        assert stats.updates == updates + 1
+        assert stats.bytesSaved > saved
+        assert kw.getModifiedAttrs() == frozenset()
+        res = client.get("Keyword INCLUDE Investigation", kw.id)
+        assert res.name == "update_test_2"
+        assert res.investigation.id == investigation.id
+    finally:
+        client.delete(keyword)
+
+# ================ test updateMany() ================
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_updateMany(client, workers):
+    """Update several objects concurrently.
+    """
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    names = [ "update_test_%02d" % i for i in range(8) ]
+    keywords = [ client.new("keyword", name=n, investigation=investigation) 
+                 for n in names ]
+    for k, i in zip(keywords, client.createMany(keywords)):
+        k.id = i
+    try:
+        for k in keywords:
+            k.name = k.name.replace("update_test", "update_done")
+        client.updateMany(keywords, workers=workers)
+        for k in keywords:
+            assert client.get("Keyword", k.id).name == k.name
+    finally:
+        client.deleteMany(keywords)
+
+def test_updateMany_error(client):
+    """Failing updates are reported per object, all other updates
+    are done.
+    """
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    names = [ "update_test_%02d" % i for i in range(8) ]
+    keywords = [ client.new("keyword", name=n, investigation=investigation) 
+                 for n in names ]
+    for k, i in zip(keywords, client.createMany(keywords)):
+        k.id = i
+    try:
+        for k in keywords:
+            k.name = k.name.replace("update_test", "update_done")
+        # Renaming to the name of another existing keyword must fail.
+        keywords[2].name = names[0]
+        keywords[5].name = names[0]
+        with pytest.raises(icat.exception.BatchCallError) as exc_info:
+            client.updateMany(keywords, workers=4)
+        err = exc_info.value
+        assert [ f[1] for f in err.failed ] == [2, 5]
+        assert err.index == 2
+        assert isinstance(err.error, icat.exception.ICATError)
+        for i, k in enumerate(keywords):
+            if i not in (2, 5):
+                assert client.get("Keyword", k.id).name == k.name
+    finally:
+        client.deleteMany(keywords)
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_updateMany_unitOfWork(client, workers):
+    """updateMany() sends the updates right away, even if a unit of
+    work is active.
+    """
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    names = [ "update_test_%02d" % i for i in range(4) ]
+    keywords = [ client.new("keyword", name=n, investigation=investigation) 
+                 for n in names ]
+    for k, i in zip(keywords, client.createMany(keywords)):
+        k.id = i
+    try:
+        with client.unitOfWork() as uow:
+            for k in keywords:
+                k.name = k.name.replace("update_test", "update_done")
+            client.updateMany(keywords, workers=workers)
+            assert len(uow) == 0
+            for k in keywords:
+                assert client.get("Keyword", k.id).name == k.name
+    finally:
+        client.deleteMany(keywords)
+
+def test_unitOfWork(client):
+    """Create a dataset with datafiles, update and delete them in
+    units of work.
+    """
+    investigation = client.assertedSearch("Investigation [name='12100409-ST']")[0]
+    dstype = client.assertedSearch("DatasetType [name='raw']")[0]
+    dataset = client.new("dataset", name="unitofwork_test", 
+                         investigation=investigation, type=dstype, 
+                         complete=False)
+    datafiles = [ client.new("datafile", name="uow_%02d.dat" % i, 
+                             dataset=dataset) for i in range(4) ]
+    with client.unitOfWork() as uow:
+        for df in datafiles:
+            assert df.create() is None
+        dataset.create()
+        assert len(uow) == 5
+        assert dataset.id is None
+    try:
+        assert dataset.id is not None
+        assert all(df.id is not None for df in datafiles)
+        query = "Datafile <-> Dataset [id=%d]" % dataset.id
+        assert len(client.search(query)) == 4
+        with client.unitOfWork():
+            dataset.complete = True
+            dataset.update()
+            datafiles[0].delete()
+            datafiles[1].delete()
+        assert client.get("Dataset", dataset.id).complete is True
+        assert len(client.search(query)) == 2
+    finally:
+        client.delete(dataset)
@@ -7,7 +7,7 @@ import pytest
 import icat
 import icat.config
 from icat.query import Query
-from conftest import getConfig
+from conftest import getConfig, icat_version, require_icat_version
 
 
 @pytest.fixture(scope="module")
@@ -341,3 +341,149 @@ def test_query_attribute_datafile_name(client):
     assert len(res) == 4
     for n in res:
         assert not isinstance(n, icat.entity.Entity)
+
+@pytest.mark.dependency(depends=['get_investigation'])
+def test_query_attributes_multiple(client):
+    """Query multiple attributes, including attributes of related
+    objects that need to be joined.
+    """
+    require_icat_version("4.11.0", "need multiple attributes in SELECT")
+    query = Query(client, "Datafile", 
+                  attribute=["id", "name", "dataset.name"], 
+                  order=["name"], 
+                  conditions={ "dataset.investigation.id":
+                               "= %d" % investigation.id })
+    print(str(query))
+    assert str(query).startswith("SELECT o.id, o.name, ds.name FROM Datafile o")
+    assert " JOIN o.dataset AS ds " in str(query)
+    res = client.search(query)
+    assert len(res) == 4
+    names = []
+    for r in res:
+        assert isinstance(r, tuple)
+        assert len(r) == 3
+        df = client.get("Datafile", r[0])
+        assert df.name == r[1]
+        names.append(r[1])
+    assert names == sorted(names)
+
+def test_query_attributes_multiple_old_server(client):
+    """Multiple attributes are not supported by older ICAT servers.
+    """
+    if icat_version >= "4.11.0":
+        pytest.skip("ICAT server supports multiple attributes")
+    with pytest.raises(icat.VersionMethodError):
+        Query(client, "Datafile", attribute=["id", "name"])
+
+@pytest.mark.dependency(depends=['get_investigation'])
+def test_query_aggregate_count(client):
+    """Count the datafiles of an investigation on the server.
+    """
+    conditions = { "dataset.investigation.id": "= %d" % investigation.id }
+    query = Query(client, "Datafile", order=True, conditions=conditions, 
+                  aggregate="COUNT")
+    print(str(query))
+    assert str(query).startswith("SELECT COUNT(o) FROM Datafile o")
+    assert "ORDER BY" not in str(query)
+    res = client.search(query)
+    assert res == [4]
+
+@pytest.mark.dependency(depends=['get_investigation'])
+def test_query_aggregate_fileSize(client):
+    """Compute the total, the minimum and the maximum of the file size
+    of the datafiles in an investigation on the server.
+    """
+    conditions = { "dataset.investigation.id": "= %d" % investigation.id }
+    query = Query(client, "Datafile", attribute="fileSize", 
+                  conditions=conditions)
+    sizes = [ s for s in client.search(query) if s is not None ]
+    for fct, val in [("SUM", sum(sizes)), ("MIN", min(sizes)), 
+                     ("MAX", max(sizes))]:
+        query = Query(client, "Datafile", attribute="fileSize", 
+                      conditions=conditions, aggregate=fct)
+        print(str(query))
+        assert str(query).startswith("SELECT %s(o.fileSize) FROM" % fct)
+        res = client.search(query)
+        assert len(res) == 1
+        assert res[0] == val
+
+@pytest.mark.dependency(depends=['get_investigation'])
+def test_query_aggregate_distinct(client):
+    """Query the distinct names of the datasets having datafiles in an
+    investigation, both as list and as count.
+    """
+    conditions = { "dataset.investigation.id": "= %d" % investigation.id }
+    query = Query(client, "Datafile", attribute="dataset.name", 
+                  conditions=conditions)
+    names = client.search(query)
+    query = Query(client, "Datafile", attribute="dataset.name", 
+                  conditions=conditions, aggregate="DISTINCT")
+    print(str(query))
+    res = client.search(query)
+    assert sorted(res) == sorted(set(names))
+    query = Query(client, "Datafile", attribute="dataset.name", 
+                  conditions=conditions, aggregate="COUNT:DISTINCT")
+    print(str(query))
+    res = client.search(query)
+    assert res == [len(set(names))]
+
+def test_query_aggregate_invalid(client):
+    """Invalid aggregate functions are rejected.
+    """
+    with pytest.raises(ValueError):
+        Query(client, "Datafile", aggregate="SUM")
+    with pytest.raises(ValueError):
+        Query(client, "Datafile", attribute="fileSize", aggregate="MEDIAN")
+    with pytest.raises(ValueError):
+        Query(client, "Datafile", attribute="fileSize", 
+              aggregate="DISTINCT:SUM")
+
+def test_query_rendered_cache(client):
+    """The string representation is cached and the cache is
+    invalidated when the query is modified.
+    """
+    query = Query(client, "Datafile", conditions={"name": "= 'e208945.nxs'"})
+    qstr = str(query)
+    assert str(query) is qstr
+    query.addConditions({"dataset.name": "= 'e208945'"})
+    assert str(query) != qstr
+    assert "dataset.name = 'e208945'" in str(query)
+    query.addIncludes(["dataset"])
+    assert "INCLUDE" in str(query)
+    query.setLimit((0, 1))
+    assert "LIMIT 0, 1" in str(query)
+    query.setOrder(["name"])
+    assert "ORDER BY o.name" in str(query)
+    res = client.search(query)
+    assert len(res) == 1
+    assert res[0].name == "e208945.nxs"
+    assert res[0].dataset.name == "e208945"
+
+def test_query_prepare(client):
+    """Prepare a query template and bind values to it.
+    """
+    query = Query(client, "Datafile", order=["name"], 
+                  conditions={"dataset.investigation.name": "= :inv", 
+                              "dataset.name": "= :ds"})
+    template = query.prepare(inv="string", ds="string")
+    print(str(template))
+    res = template.search(dict(inv="12100409-ST", ds="e208945"))
+    assert len(res) > 0
+    assert "e208945.nxs" in [ df.name for df in res ]
+    res = list(template.searchChunked(dict(inv="12100409-ST", ds="e208945"), 
+                                      chunksize=1))
+    assert "e208945.nxs" in [ df.name for df in res ]
+    res = template.search(dict(inv="12100409-ST", ds="no such' dataset"))
+    assert res == []
+
+def test_query_prepare_non_ascii(client):
+    """Prepare a query template having non-ascii characters.
+    """
+    fullName = b'Rudolph Beck-D\xc3\xbclmen'.decode('utf8')
+    query = Query(client, "User", 
+                  conditions={ "fullName": "= '%s'" % fullName, 
+                               "name": "= :name" })
+    template = query.prepare(name="string")
+    res = template.search(dict(name="rbeck"))
+    assert len(res) == 1
+    assert res[0].fullName == fullName